@@ -66,6 +66,8 @@
   let assessmentHeightInput;
   let assessmentHeightEstimateBtn;
   let assessmentHeightEstimateHint;
+  // Source of an estimated height that has not been confirmed; sent back on save.
+  let assessmentHeightDraftSource = '';
   let assessmentCrownWidthInput;
   let assessmentCrownAreaInput;
   let assessmentCrownAreaHint;
@@ -1591,7 +1593,7 @@
 
   function buildHeightEstimateUrl(recordId) {
     if (!recordId) return '';
-    return '/tracker/api/work-records/' + encodeURIComponent(recordId) + '/height-estimate/';
+    return '/tracker/api/work-records/' + encodeURIComponent(recordId) + '/height-estimate/?method=crown';
   }
 
   function setHeightEstimateLoading(isLoading) {
@@ -1603,11 +1605,20 @@
   }
 
   function clearHeightEstimateHint() {
+    assessmentHeightDraftSource = '';
     if (!assessmentHeightEstimateHint) return;
     assessmentHeightEstimateHint.classList.add('d-none');
     assessmentHeightEstimateHint.textContent = 'Automatický odhad z DMP OK / DMR 5G';
   }
 
+  function showHeightDraftHint(source) {
+    assessmentHeightDraftSource = source || '';
+    if (!assessmentHeightEstimateHint || !assessmentHeightDraftSource) return;
+    assessmentHeightEstimateHint.textContent =
+      'Návrh k potvrzení (' + assessmentHeightDraftSource + ') – úpravou hodnoty výšku potvrdíte';
+    assessmentHeightEstimateHint.classList.remove('d-none');
+  }
+
   function showHeightEstimateError(message) {
     if (!assessmentMessage) return;
     assessmentMessage.textContent = message || 'Odhad výšky z ČÚZK se nepodařilo načíst.';
@@ -1643,10 +1654,7 @@
           assessmentHeightInput.value = String(Math.ceil(estimatedHeight));
           updateCrownAreaHintFromInputs();
         }
-        if (assessmentHeightEstimateHint) {
-          assessmentHeightEstimateHint.textContent = 'Automatický odhad z DMP OK / DMR 5G';
-          assessmentHeightEstimateHint.classList.remove('d-none');
-        }
+        showHeightDraftHint(data.source || 'Automatický odhad z DMP OK / DMR 5G');
         if (assessmentMessage) {
           assessmentMessage.textContent = '';
           assessmentMessage.className = 'mt-2 small';
@@ -1752,6 +1760,9 @@
             assessmentHeightInput.value = data.height_m;
           }
           clearHeightEstimateHint();
+          if (data.height_m_is_draft) {
+            showHeightDraftHint(data.height_m_source);
+          }
           if (assessmentCrownWidthInput && data.crown_width_m != null) {
             assessmentCrownWidthInput.value = data.crown_width_m;
           }
@@ -1867,6 +1878,8 @@
             : '',
         height_m:
           assessmentHeightInput && assessmentHeightInput.value ? assessmentHeightInput.value : null,
+        height_m_source:
+          assessmentHeightInput && assessmentHeightInput.value ? assessmentHeightDraftSource : '',
         crown_width_m:
           assessmentCrownWidthInput && assessmentCrownWidthInput.value
             ? assessmentCrownWidthInput.value
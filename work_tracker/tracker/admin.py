@@ -31,6 +31,7 @@ class TreeAssessmentInline(admin.StackedInline):
         "stem_diameters_cm_list",
         "stem_circumferences_cm_list",
         "height_m",
+        "height_m_source",
         "crown_width_m",
         "crown_area_m2",
         "physiological_age",
@@ -52,8 +53,8 @@ class ProjectMembershipInline(admin.TabularInline):
 
 @admin.register(Project)
 class ProjectAdmin(admin.ModelAdmin):
-    list_display = ("name", "is_closed")
-    list_filter = ("is_closed",)
+    list_display = ("name", "is_closed", "price_list_version")
+    list_filter = ("is_closed", "price_list_version")
     search_fields = ("name", "description")
     inlines = [ProjectMembershipInline]
     # Volitelné: aby šel projekt vybírat v jiných adminech přes autocomplete
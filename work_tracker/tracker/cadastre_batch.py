@@ -0,0 +1,172 @@
+from __future__ import annotations
+
+import io
+import logging
+import math
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlencode
+
+from django.db import connection
+
+from .cadastre_cache import get_cached_cadastre, store_cadastre_result
+from .models import CUZK_CP_WFS_ENDPOINT, CUZK_CP_WFS_TYPENAME, _http_get
+from .services.cuzk import wgs84_to_sjtsk_many
+from .services.parcels import (
+    ParcelIndex,
+    WfsExceptionReport,
+    WfsUnexpectedResponse,
+    iter_gml_parcels,
+    lookup_parcel_sjtsk,
+)
+
+logger = logging.getLogger(__name__)
+
+# Points are grouped into S-JTSK cells of this size; one bbox request serves a cell.
+CADASTRE_BATCH_CLUSTER_M = 300.0
+CADASTRE_BATCH_MARGIN_M = 2.0
+# Smaller groups are cheaper as GetFeatureByPoint requests.
+CADASTRE_BATCH_MIN_POINTS = 3
+CADASTRE_BATCH_PAGE_SIZE = 500
+CADASTRE_BATCH_MAX_PAGES = 20
+SJTSK_SRS = "urn:ogc:def:crs:EPSG::5514"
+
+
+def _build_bbox_page_url(bbox: tuple[float, float, float, float], start_index: int) -> str:
+    minx, miny, maxx, maxy = bbox
+    params = {
+        "SERVICE": "WFS",
+        "REQUEST": "GetFeature",
+        "VERSION": "2.0.0",
+        "TYPENAMES": CUZK_CP_WFS_TYPENAME,
+        "SRSNAME": SJTSK_SRS,
+        "BBOX": f"{minx},{miny},{maxx},{maxy},{SJTSK_SRS}",
+        "COUNT": CADASTRE_BATCH_PAGE_SIZE,
+        "STARTINDEX": start_index,
+    }
+    return f"{CUZK_CP_WFS_ENDPOINT}?{urlencode(params)}"
+
+
+def fetch_parcels_in_bbox(bbox: tuple[float, float, float, float]) -> list[dict]:
+    """All CadastralParcel polygons intersecting an S-JTSK bbox, paged with COUNT/STARTINDEX."""
+    parcels = []
+    for page in range(CADASTRE_BATCH_MAX_PAGES):
+        url = _build_bbox_page_url(bbox, page * CADASTRE_BATCH_PAGE_SIZE)
+        status, content_type, payload = _http_get(url, timeout_s=10, retries=1)
+        try:
+            page_parcels = list(
+                iter_gml_parcels(io.BytesIO(payload), root_tags=("FeatureCollection",))
+            )
+        except (WfsExceptionReport, WfsUnexpectedResponse) as err:
+            logger.warning(
+                "cad_lookup %s url=%s status=%s content_type=%s preview=%s",
+                "service exception" if isinstance(err, WfsExceptionReport) else "unexpected response",
+                url,
+                status,
+                content_type,
+                payload[:500].decode("utf-8", errors="replace"),
+            )
+            raise
+        parcels.extend(page_parcels)
+        if len(page_parcels) < CADASTRE_BATCH_PAGE_SIZE:
+            break
+    return parcels
+
+
+def _cluster_bbox(coords: list[tuple[float, float]]) -> tuple[float, float, float, float]:
+    xs = [x for x, _ in coords]
+    ys = [y for _, y in coords]
+    return (
+        min(xs) - CADASTRE_BATCH_MARGIN_M,
+        min(ys) - CADASTRE_BATCH_MARGIN_M,
+        max(xs) + CADASTRE_BATCH_MARGIN_M,
+        max(ys) + CADASTRE_BATCH_MARGIN_M,
+    )
+
+
+def cad_lookup_batch(
+    points: dict, concurrency: int = 4, throttle=None, sjtsk: dict | None = None
+) -> dict:
+    """
+    Look up parcels for many points: {key: (lon, lat)} -> {key: result or Exception}.
+    `sjtsk` optionally maps keys to already known S-JTSK (x, y), which skips projecting them.
+    The local index and persistent cache answer first. Dense groups of the remaining
+    points share one bbox request and are matched locally by point-in-polygon; the
+    rest (and any bbox misses) fall back to `_cad_lookup_by_point`. `throttle` is
+    called before every ČÚZK request.
+    """
+    from .models import _cad_lookup_by_point
+
+    results = {}
+    known = {key: sjtsk[key] for key in points if sjtsk and sjtsk.get(key) is not None}
+    keys = [key for key in points if key not in known]
+    xs, ys, _ = wgs84_to_sjtsk_many(
+        [points[key][0] for key in keys], [points[key][1] for key in keys]
+    )
+    projected = {**known, **dict(zip(keys, zip(xs, ys)))}
+    for key, (x, y) in projected.items():
+        local_fields = lookup_parcel_sjtsk(x, y)
+        if local_fields:
+            results[key] = {**local_fields, "cad_lookup_status": "ok"}
+            continue
+        cached = get_cached_cadastre(x, y)
+        if cached is not None:
+            results[key] = cached
+
+    clusters = defaultdict(list)
+    for key in points:
+        if key in results:
+            continue
+        x, y = projected[key]
+        cell = (math.floor(x / CADASTRE_BATCH_CLUSTER_M), math.floor(y / CADASTRE_BATCH_CLUSTER_M))
+        clusters[cell].append(key)
+
+    def fetch(keys):
+        if throttle:
+            throttle()
+        return fetch_parcels_in_bbox(_cluster_bbox([projected[key] for key in keys]))
+
+    def point_lookup(key):
+        if throttle:
+            throttle()
+        try:
+            if key in known:
+                return _cad_lookup_by_point(*points[key], sjtsk=known[key])
+            return _cad_lookup_by_point(*points[key])
+        finally:
+            # The point lookup reads/writes the cadastre cache from a pool thread.
+            if threading.current_thread() is not threading.main_thread():
+                connection.close()
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+        fetches = []
+        lookups = []
+        for keys in clusters.values():
+            if len(keys) >= CADASTRE_BATCH_MIN_POINTS:
+                fetches.append((keys, pool.submit(fetch, keys)))
+            else:
+                lookups.extend((key, pool.submit(point_lookup, key)) for key in keys)
+
+        for keys, future in fetches:
+            try:
+                parcels = future.result()
+            except Exception as err:
+                logger.warning("cad_lookup bbox batch failed points=%s error=%s", len(keys), err)
+                parcels = []
+            index = ParcelIndex(parcels) if parcels else None
+            for key in keys:
+                fields = index.lookup(*projected[key]) if index else None
+                if not fields:
+                    lookups.append((key, pool.submit(point_lookup, key)))
+                    continue
+                result = {**fields, "cad_lookup_status": "ok"}
+                store_cadastre_result(*projected[key], result)
+                results[key] = result
+
+        for key, future in lookups:
+            try:
+                results[key] = future.result()
+            except Exception as err:
+                results[key] = err
+    return results
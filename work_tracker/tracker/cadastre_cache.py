@@ -0,0 +1,56 @@
+from __future__ import annotations
+
+import math
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .models import CadastreLookupCache
+
+# Results are shared per 1 x 1 m S-JTSK cell; parcels are never that small.
+CADASTRE_CACHE_CELL_M = 1.0
+CADASTRE_CACHE_TTL = timedelta(days=90)
+# Negative answers expire sooner so newly registered parcels show up.
+CADASTRE_CACHE_NOT_FOUND_TTL = timedelta(days=7)
+CACHEABLE_STATUSES = {"ok": CADASTRE_CACHE_TTL, "not_found": CADASTRE_CACHE_NOT_FOUND_TTL}
+
+
+def cadastre_cell(x: float, y: float) -> tuple[int, int]:
+    return math.floor(x / CADASTRE_CACHE_CELL_M), math.floor(y / CADASTRE_CACHE_CELL_M)
+
+
+def get_cached_cadastre(x: float, y: float) -> dict | None:
+    """Unexpired lookup result for the S-JTSK point, or None on a miss."""
+    cell_x, cell_y = cadastre_cell(x, y)
+    result = (
+        CadastreLookupCache.objects.filter(
+            cell_x=cell_x,
+            cell_y=cell_y,
+            expires_at__gt=timezone.now(),
+        )
+        .values_list("result", flat=True)
+        .first()
+    )
+    return dict(result) if result is not None else None
+
+
+def store_cadastre_result(x: float, y: float, result: dict) -> None:
+    """Remember `ok` and `not_found` answers; errors are never cached."""
+    ttl = CACHEABLE_STATUSES.get(result.get("cad_lookup_status"))
+    if ttl is None:
+        return
+    cell_x, cell_y = cadastre_cell(x, y)
+    CadastreLookupCache.objects.update_or_create(
+        cell_x=cell_x,
+        cell_y=cell_y,
+        defaults={
+            "status": result["cad_lookup_status"],
+            "result": result,
+            "expires_at": timezone.now() + ttl,
+        },
+    )
+
+
+def purge_expired_cadastre_cache() -> int:
+    deleted, _ = CadastreLookupCache.objects.filter(expires_at__lte=timezone.now()).delete()
+    return deleted
@@ -0,0 +1,150 @@
+from __future__ import annotations
+
+import logging
+from collections import Counter
+from datetime import timedelta
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .models import CadastreLookupJob, WorkRecord, get_workrecord_lonlat, get_workrecord_sjtsk
+
+logger = logging.getLogger(__name__)
+
+CADASTRE_JOB_MAX_ATTEMPTS = 5
+# Retry delay doubles per attempt: 1, 2, 4, 8 minutes.
+CADASTRE_JOB_RETRY_BASE = timedelta(minutes=1)
+# A running job whose worker died is handed out again after this long.
+CADASTRE_JOB_STALE_AFTER = timedelta(minutes=10)
+
+
+def enqueue_cadastre_lookup(tree: WorkRecord) -> None:
+    """Queue (or re-queue) the parcel lookup for a tree and mark it as pending."""
+    now = timezone.now()
+    CadastreLookupJob.objects.update_or_create(
+        work_record=tree,
+        defaults={
+            "status": CadastreLookupJob.Status.PENDING,
+            "attempts": 0,
+            "available_at": now,
+            "locked_at": None,
+            "last_error": "",
+        },
+    )
+    WorkRecord.objects.filter(pk=tree.pk).update(cad_lookup_status="pending")
+    tree.cad_lookup_status = "pending"
+
+
+def claim_cadastre_jobs(limit: int) -> list[CadastreLookupJob]:
+    """
+    Lock up to `limit` due jobs for this worker. Each job is claimed with a conditional
+    UPDATE, so concurrent workers never process the same job twice.
+    """
+    now = timezone.now()
+    due = (
+        CadastreLookupJob.objects.filter(
+            Q(status=CadastreLookupJob.Status.PENDING, available_at__lte=now)
+            | Q(status=CadastreLookupJob.Status.RUNNING, locked_at__lt=now - CADASTRE_JOB_STALE_AFTER)
+        )
+        .order_by("available_at", "pk")
+        .values_list("pk", "status", "locked_at")[: limit * 2]
+    )
+    claimed_ids = []
+    for job_id, status, locked_at in due:
+        claimed = CadastreLookupJob.objects.filter(
+            pk=job_id, status=status, locked_at=locked_at
+        ).update(
+            status=CadastreLookupJob.Status.RUNNING,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            claimed_ids.append(job_id)
+        if len(claimed_ids) >= limit:
+            break
+    return list(
+        CadastreLookupJob.objects.filter(pk__in=claimed_ids)
+        .select_related("work_record")
+        .order_by("available_at", "pk")
+    )
+
+
+def _complete(job: CadastreLookupJob, result) -> None:
+    from .models import _apply_cadastre_result
+
+    if result is not None:
+        _apply_cadastre_result(job.work_record, result)
+    CadastreLookupJob.objects.filter(pk=job.pk).update(
+        status=CadastreLookupJob.Status.DONE,
+        locked_at=None,
+        last_error="",
+        updated_at=timezone.now(),
+    )
+
+
+def _fail(job: CadastreLookupJob, err: Exception) -> str:
+    from .models import _mark_cadastre_lookup_error
+
+    now = timezone.now()
+    if job.attempts >= CADASTRE_JOB_MAX_ATTEMPTS:
+        _mark_cadastre_lookup_error(job.work_record)
+        status = CadastreLookupJob.Status.FAILED
+        available_at = now
+    else:
+        status = CadastreLookupJob.Status.PENDING
+        available_at = now + CADASTRE_JOB_RETRY_BASE * (2 ** (job.attempts - 1))
+    CadastreLookupJob.objects.filter(pk=job.pk).update(
+        status=status,
+        available_at=available_at,
+        locked_at=None,
+        last_error=str(err)[:1000],
+        updated_at=now,
+    )
+    return status
+
+
+def run_cadastre_jobs(limit: int = 100, concurrency: int = 4) -> Counter:
+    """
+    Process one batch of due jobs. Their points go through `cad_lookup_batch`, so trees
+    clustered together share one bbox WFS request; requests run on a thread pool of
+    `concurrency` workers while tree and job updates stay on the calling thread.
+    Returns outcome counts.
+    """
+    from .cadastre_batch import cad_lookup_batch
+
+    jobs = claim_cadastre_jobs(limit)
+    outcomes = Counter()
+    if not jobs:
+        return outcomes
+    points = {}
+    sjtsk = {}
+    # Trees that gained a parcel or lost their coordinates since enqueueing still need a
+    # terminal status instead of the "pending" set at enqueue time.
+    skipped = {}
+    for job in jobs:
+        tree = job.work_record
+        if tree.parcel_number:
+            skipped[job.pk] = {"cad_lookup_status": "ok"}
+            continue
+        lonlat = get_workrecord_lonlat(tree)
+        if not lonlat:
+            skipped[job.pk] = {"cad_lookup_status": "error"}
+            continue
+        points[job.pk] = lonlat
+        sjtsk[job.pk] = get_workrecord_sjtsk(tree)
+    results = cad_lookup_batch(points, concurrency=concurrency, sjtsk=sjtsk) if points else {}
+    results.update(skipped)
+    for job in jobs:
+        result = results.get(job.pk)
+        if isinstance(result, Exception):
+            logger.warning(
+                "cad_lookup job failed tree_id=%s attempt=%s error=%s",
+                job.work_record_id,
+                job.attempts,
+                result,
+            )
+            outcomes[_fail(job, result)] += 1
+            continue
+        _complete(job, result)
+        outcomes[CadastreLookupJob.Status.DONE] += 1
+    return outcomes
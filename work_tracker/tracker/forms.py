@@ -24,7 +24,7 @@ User = get_user_model()
 class ProjectEditForm(forms.ModelForm):
     class Meta:
         model = Project
-        fields = ['name', 'description', 'is_closed']
+        fields = ['name', 'description', 'is_closed', 'price_list_version']
 
 
 class AddMemberForm(forms.Form):
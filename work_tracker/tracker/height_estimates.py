@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import math
+import time
+from collections import Counter
+from datetime import timedelta
+
+from django.utils import timezone
+
+from .map_changes import refresh_trees_after_bulk_write
+from .models import (
+    TreeAssessment,
+    TreeHeightEstimate,
+    WorkRecord,
+    get_workrecord_lonlat,
+    get_workrecord_sjtsk,
+)
+from .pricing import latest_tree_assessments
+from .services.cuzk import (
+    CUZK_HEIGHT_SOURCE,
+    estimate_tree_heights_from_cuzk,
+    wgs84_to_sjtsk_for_height_estimate,
+    wgs84_to_sjtsk_many,
+)
+
+# Estimates outside this range are crown gaps or bad data, not tree heights.
+ESTIMATE_MIN_HEIGHT_M = 1.0
+ESTIMATE_MAX_HEIGHT_M = 100.0
+# Stored single-tree estimates are reused while the tree stays in the same S-JTSK cell.
+HEIGHT_ESTIMATE_CELL_M = 1.0
+HEIGHT_ESTIMATE_TTL = timedelta(days=365)
+
+
+def estimate_heights_for_trees(
+    work_records,
+    create_missing: bool = False,
+    dry_run: bool = False,
+) -> Counter:
+    """
+    Estimate heights for trees with coordinates in one batch of getSamples requests and
+    write them as drafts (height_m_source set) into each tree's latest assessment.
+    Measured heights (height_m set, empty source) are never overwritten; trees without
+    an assessment get a new one only with `create_missing`. Returns outcome counts.
+    """
+    trees = [
+        tree
+        for tree in work_records.exclude(
+            vegetation_type__in=[WorkRecord.VegetationType.SHRUB, WorkRecord.VegetationType.HEDGE]
+        ).only("pk", "latitude", "longitude", "sjtsk_x", "sjtsk_y")
+        if get_workrecord_lonlat(tree)
+    ]
+    outcomes = Counter()
+    if not trees:
+        return outcomes
+    latest = latest_tree_assessments([tree.pk for tree in trees])
+
+    pending = []
+    for tree in trees:
+        assessment = latest.get(tree.pk)
+        if assessment is None and not create_missing:
+            outcomes["no_assessment"] += 1
+        elif assessment and assessment.height_m is not None and not assessment.height_m_source:
+            outcomes["measured"] += 1
+        else:
+            pending.append(tree)
+    if not pending:
+        return outcomes
+
+    points = [get_workrecord_sjtsk(tree) for tree in pending]
+    unprojected = [i for i, point in enumerate(points) if point is None]
+    if unprojected:
+        lonlats = [get_workrecord_lonlat(pending[i]) for i in unprojected]
+        xs, ys, _ = wgs84_to_sjtsk_many([lon for lon, _ in lonlats], [lat for _, lat in lonlats])
+        for i, x, y in zip(unprojected, xs, ys):
+            points[i] = (x, y)
+    estimates = estimate_tree_heights_from_cuzk(points)
+
+    to_update = []
+    to_create = []
+    for tree, estimate in zip(pending, estimates):
+        height_m = estimate["estimated_height_m"] if estimate else None
+        if height_m is None or not ESTIMATE_MIN_HEIGHT_M <= height_m <= ESTIMATE_MAX_HEIGHT_M:
+            outcomes["no_estimate"] += 1
+            continue
+        height_m = round(height_m, 1)
+        assessment = latest.get(tree.pk)
+        if assessment is None:
+            assessment = TreeAssessment(work_record_id=tree.pk)
+            to_create.append(assessment)
+        else:
+            to_update.append(assessment)
+        assessment.height_m = height_m
+        assessment.height_m_source = CUZK_HEIGHT_SOURCE
+        assessment.crown_area_m2 = assessment._compute_crown_area_m2()
+    outcomes["updated"] += len(to_update)
+    outcomes["created"] += len(to_create)
+    if dry_run or not (to_update or to_create):
+        return outcomes
+
+    TreeAssessment.objects.bulk_update(
+        to_update, ["height_m", "height_m_source", "crown_area_m2"], batch_size=500
+    )
+    TreeAssessment.objects.bulk_create(to_create, batch_size=500)
+    refresh_trees_after_bulk_write(
+        [assessment.work_record_id for assessment in to_update + to_create]
+    )
+    return outcomes
+
+
+def _height_estimate_cell(x: float, y: float) -> tuple[int, int]:
+    return math.floor(x / HEIGHT_ESTIMATE_CELL_M), math.floor(y / HEIGHT_ESTIMATE_CELL_M)
+
+
+def cached_tree_height_estimate(work_record: WorkRecord, method: str, estimate) -> dict:
+    """
+    Stored estimate for the tree when it was computed by `method` for the tree's current
+    S-JTSK cell; otherwise run `estimate(lat=..., lon=..., sjtsk=(x, y))` and store its result.
+    Adds `cached` and `estimated_at` to the returned result.
+    """
+    start = time.perf_counter()
+    lon, lat = get_workrecord_lonlat(work_record)
+    sjtsk = get_workrecord_sjtsk(work_record)
+    x, y = sjtsk or wgs84_to_sjtsk_for_height_estimate(lon, lat)[:2]
+    cell_x, cell_y = _height_estimate_cell(x, y)
+    stored = TreeHeightEstimate.objects.filter(
+        work_record=work_record,
+        method=method,
+        cell_x=cell_x,
+        cell_y=cell_y,
+        estimated_at__gt=timezone.now() - HEIGHT_ESTIMATE_TTL,
+    ).first()
+    if stored is not None:
+        result = dict(stored.result)
+        result["duration_ms"] = int(round((time.perf_counter() - start) * 1000))
+        result["duration_ms_breakdown"] = {}
+        result["cached"] = True
+        result["estimated_at"] = stored.estimated_at.isoformat()
+        return result
+
+    result = estimate(lat=lat, lon=lon, sjtsk=(x, y))
+    stored, _ = TreeHeightEstimate.objects.update_or_create(
+        work_record=work_record,
+        method=method,
+        defaults={
+            "cell_x": cell_x,
+            "cell_y": cell_y,
+            "dmr_m": result["dmr_m"],
+            "dmp_m": result["dmp_m"],
+            "estimated_height_m": result["estimated_height_m"],
+            "transform_method": result.get("transform_method") or "",
+            "result": result,
+        },
+    )
+    result = dict(result)
+    result["cached"] = False
+    result["estimated_at"] = stored.estimated_at.isoformat()
+    return result
+
+
+def invalidate_tree_height_estimates(tree_id: int) -> None:
+    TreeHeightEstimate.objects.filter(work_record_id=tree_id).delete()
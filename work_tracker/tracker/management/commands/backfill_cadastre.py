@@ -0,0 +1,195 @@
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+from django.utils import timezone
+
+from tracker.cadastre_batch import cad_lookup_batch
+from tracker.models import Project, WorkRecord, _set_cadastre_fields, get_workrecord_sjtsk
+from tracker.services.cuzk_client import get_cuzk_client
+
+DEFAULT_STATUSES = ("error", "not_found", "null")
+
+
+class RateLimiter:
+    """Spaces calls at least 1/rate seconds apart across all threads."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self.lock = threading.Lock()
+        self.next_at = time.monotonic()
+
+    def wait(self) -> None:
+        if not self.interval:
+            return
+        with self.lock:
+            now = time.monotonic()
+            delay = self.next_at - now
+            self.next_at = max(now, self.next_at) + self.interval
+        if delay > 0:
+            time.sleep(delay)
+
+
+def _cadastre_requests(client) -> int:
+    """HTTP requests (retries included) the shared client has sent to the cadastre WFS."""
+    return client.metrics().get("cadastre", {}).get("calls", 0)
+
+
+class Command(BaseCommand):
+    help = (
+        "Look up cadastral parcels for trees with missing/failed lookups in bulk "
+        "(deduplicated coordinates, bounded concurrency, resumable)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--status",
+            action="append",
+            choices=["error", "not_found", "pending", "null"],
+            help="cad_lookup_status values to retry (repeatable; default error, not_found, null).",
+        )
+        parser.add_argument("--project-id", type=int, help="Only trees linked to this project.")
+        parser.add_argument("--workers", type=int, default=4, help="Parallel WFS requests.")
+        parser.add_argument(
+            "--rate",
+            type=float,
+            default=5.0,
+            help="Maximum WFS requests per second across workers (0 = unlimited).",
+        )
+        parser.add_argument("--batch-size", type=int, default=200)
+        parser.add_argument(
+            "--precision",
+            type=int,
+            default=6,
+            help="Decimal places used to deduplicate coordinates.",
+        )
+        parser.add_argument("--limit", type=int, default=0, help="Stop after this many trees.")
+        parser.add_argument(
+            "--checkpoint",
+            default="",
+            help="File storing the last processed tree id; an existing file resumes the run.",
+        )
+
+    def handle(self, *args, **options):
+        workers = options["workers"]
+        batch_size = options["batch_size"]
+        if workers <= 0:
+            raise CommandError("--workers must be greater than 0")
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be greater than 0")
+
+        statuses = options["status"] or list(DEFAULT_STATUSES)
+        status_filter = Q(cad_lookup_status__in=[s for s in statuses if s != "null"])
+        if "null" in statuses:
+            status_filter |= Q(cad_lookup_status__isnull=True) | Q(cad_lookup_status="")
+        trees = WorkRecord.objects.filter(
+            status_filter,
+            Q(parcel_number__isnull=True) | Q(parcel_number=""),
+            latitude__isnull=False,
+            longitude__isnull=False,
+        )
+        project_id = options.get("project_id")
+        if project_id:
+            if not Project.objects.filter(pk=project_id).exists():
+                raise CommandError(f"Project {project_id} does not exist.")
+            trees = trees.filter(projects__id=project_id).distinct()
+
+        checkpoint = Path(options["checkpoint"]) if options["checkpoint"] else None
+        last_id = 0
+        if checkpoint and checkpoint.exists():
+            last_id = int(checkpoint.read_text().strip() or 0)
+            self.stdout.write(f"Resuming after tree id {last_id}.")
+
+        limiter = RateLimiter(options["rate"])
+        precision = options["precision"]
+        limit = options["limit"]
+
+        processed = 0
+        requests_sent = 0
+        client = get_cuzk_client()
+        requests_before = _cadastre_requests(client)
+        start = time.perf_counter()
+        while not limit or processed < limit:
+            size = min(batch_size, limit - processed) if limit else batch_size
+            batch = list(
+                trees.filter(pk__gt=last_id)
+                .order_by("pk")
+                .only(
+                    "pk",
+                    "latitude",
+                    "longitude",
+                    "sjtsk_x",
+                    "sjtsk_y",
+                    "parcel_number",
+                    "cadastral_area_code",
+                    "cadastral_area_name",
+                    "municipality_code",
+                    "municipality_name",
+                    "lv_number",
+                    "cad_lookup_status",
+                    "cad_lookup_at",
+                )[:size]
+            )
+            if not batch:
+                if checkpoint and checkpoint.exists():
+                    checkpoint.unlink()
+                break
+
+            by_coords = defaultdict(list)
+            sjtsk = {}
+            for tree in batch:
+                key = (round(tree.longitude, precision), round(tree.latitude, precision))
+                by_coords[key].append(tree)
+                # Stored S-JTSK coordinates skip re-projection; trees without them are
+                # projected from the rounded lon/lat.
+                if sjtsk.get(key) is None:
+                    sjtsk[key] = get_workrecord_sjtsk(tree)
+            results = cad_lookup_batch(
+                dict(zip(by_coords, by_coords)),
+                concurrency=workers,
+                throttle=limiter.wait,
+                sjtsk=sjtsk,
+            )
+            # Local index and cache hits send nothing, and a bbox page can serve many
+            # coordinates, so count what actually went over the wire.
+            requests_sent = _cadastre_requests(client) - requests_before
+
+            fields = set()
+            now = timezone.now()
+            for coords, group in by_coords.items():
+                result = results[coords]
+                if isinstance(result, Exception):
+                    result = {"cad_lookup_status": "error"}
+                for tree in group:
+                    fields.update(_set_cadastre_fields(tree, result))
+                    tree.cad_lookup_at = now
+            fields.add("cad_lookup_at")
+            WorkRecord.objects.bulk_update(batch, sorted(fields))
+
+            processed += len(batch)
+            last_id = batch[-1].pk
+            if checkpoint:
+                checkpoint.parent.mkdir(parents=True, exist_ok=True)
+                checkpoint.write_text(str(last_id))
+            duration_s = time.perf_counter() - start
+            self.stdout.write(
+                f"{processed} trees, {requests_sent} WFS requests, "
+                f"{processed / duration_s:.1f} trees/s, last id {last_id}"
+            )
+
+        duration_s = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Backfilled cadastre for {processed} trees with {requests_sent} WFS requests "
+                f"in {duration_s:.2f}s."
+            )
+        )
+        stats = client.metrics().get("cadastre")
+        if stats:
+            self.stdout.write(
+                f"ČÚZK cadastre: {stats['calls']} requests, {stats['errors']} errors, "
+                f"avg {stats['avg_ms']} ms, max {stats['max_ms']} ms."
+            )
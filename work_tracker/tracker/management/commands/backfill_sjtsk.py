@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.models import Project, WorkRecord
+from tracker.services.cuzk import CuzkHeightError, wgs84_to_sjtsk_many
+
+
+class Command(BaseCommand):
+    help = "Fill WorkRecord.sjtsk_x/sjtsk_y (EPSG:5514) for trees with coordinates."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project-id", type=int, help="Only trees linked to this project.")
+        parser.add_argument("--batch-size", type=int, default=5000)
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute trees that already have S-JTSK coordinates.",
+        )
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be greater than 0")
+
+        trees = WorkRecord.objects.filter(latitude__isnull=False, longitude__isnull=False)
+        if not options["all"]:
+            trees = trees.filter(sjtsk_x__isnull=True)
+        project_id = options.get("project_id")
+        if project_id:
+            if not Project.objects.filter(pk=project_id).exists():
+                raise CommandError(f"Project {project_id} does not exist.")
+            trees = trees.filter(projects__id=project_id).distinct()
+
+        updated = 0
+        last_id = 0
+        start = time.perf_counter()
+        while True:
+            batch = list(
+                trees.filter(pk__gt=last_id)
+                .order_by("pk")
+                .only("pk", "latitude", "longitude", "sjtsk_x", "sjtsk_y")[:batch_size]
+            )
+            if not batch:
+                break
+            last_id = batch[-1].pk
+            try:
+                xs, ys, _ = wgs84_to_sjtsk_many(
+                    [tree.longitude for tree in batch], [tree.latitude for tree in batch]
+                )
+            except CuzkHeightError as exc:
+                raise CommandError(f"S-JTSK transform failed near tree id {last_id}: {exc}") from exc
+            for tree, x, y in zip(batch, xs, ys):
+                tree.sjtsk_x, tree.sjtsk_y = x, y
+            WorkRecord.objects.bulk_update(batch, ["sjtsk_x", "sjtsk_y"])
+            updated += len(batch)
+
+        duration_s = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Stored S-JTSK coordinates for {updated} trees in {duration_s:.2f}s.")
+        )
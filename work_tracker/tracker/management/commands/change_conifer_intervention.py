@@ -6,8 +6,8 @@ from django.core.management.base import BaseCommand, CommandError
 from django.db import transaction
 from django.utils import timezone
 
+from tracker.map_changes import refresh_trees_after_bulk_write
 from tracker.models import InterventionType, TreeIntervention
-from tracker.pricing import apply_intervention_estimate
 
 
 CONIFER_GENERA = (
@@ -214,11 +214,14 @@ class Command(BaseCommand):
         backup_path = self._write_backup(backup_dir, project_id, from_type, to_type, interventions)
         self.stdout.write(f"CSV backup written: {backup_path}")
 
+        now = timezone.now()
         with transaction.atomic():
             for intervention in interventions:
                 intervention.intervention_type = to_type
-                intervention.save(update_fields=["intervention_type", "updated_at"])
-                apply_intervention_estimate(intervention)
+                intervention.updated_at = now
+            TreeIntervention.objects.bulk_update(interventions, ["intervention_type", "updated_at"])
+            # Reprices the changed rows and refreshes map summaries in one pass.
+            refresh_trees_after_bulk_write({intervention.tree_id for intervention in interventions})
 
         self.stdout.write(self.style.SUCCESS(f"Changed interventions: {len(interventions)}"))
 
@@ -0,0 +1,72 @@
+import time
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.height_estimates import estimate_heights_for_trees
+from tracker.models import Project, WorkRecord
+from tracker.services.cuzk import CuzkHeightError
+
+
+class Command(BaseCommand):
+    help = (
+        "Estimate tree heights for a whole project from ČÚZK DMP OK - DMR 5G getSamples "
+        "and store them as draft TreeAssessment.height_m values (measured heights are kept)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project-id", type=int, required=True)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Trees per batch; each batch costs one getSamples request per 500 points and service.",
+        )
+        parser.add_argument(
+            "--create-missing",
+            action="store_true",
+            help="Create an assessment for trees that have none.",
+        )
+        parser.add_argument("--dry-run", action="store_true", help="Estimate without saving.")
+
+    def handle(self, *args, **options):
+        project_id = options["project_id"]
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be greater than 0")
+        if not Project.objects.filter(pk=project_id).exists():
+            raise CommandError(f"Project {project_id} does not exist.")
+
+        tree_ids = list(
+            WorkRecord.objects.filter(
+                projects__id=project_id,
+                latitude__isnull=False,
+                longitude__isnull=False,
+            )
+            .distinct()
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+        outcomes = Counter()
+        start = time.perf_counter()
+        for offset in range(0, len(tree_ids), batch_size):
+            batch_ids = tree_ids[offset : offset + batch_size]
+            try:
+                outcomes += estimate_heights_for_trees(
+                    WorkRecord.objects.filter(pk__in=batch_ids),
+                    create_missing=options["create_missing"],
+                    dry_run=options["dry_run"],
+                )
+            except CuzkHeightError as exc:
+                raise CommandError(f"ČÚZK height sampling failed: {exc}") from exc
+            self.stdout.write(f"{offset + len(batch_ids)}/{len(tree_ids)} trees processed")
+
+        duration_s = time.perf_counter() - start
+        prefix = "Dry run: " if options["dry_run"] else ""
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{prefix}{outcomes['updated']} heights updated, {outcomes['created']} assessments "
+                f"created, {outcomes['measured']} measured kept, {outcomes['no_estimate']} without "
+                f"estimate, {outcomes['no_assessment']} without assessment in {duration_s:.2f}s."
+            )
+        )
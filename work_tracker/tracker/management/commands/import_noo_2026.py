@@ -4,6 +4,7 @@ import unicodedata
 from django.core.management.base import BaseCommand
 
 from tracker.models import PriceListItem, PriceListVersion
+from tracker.pricing import invalidate_price_list_index
 
 
 ITEM_CODE_RE = re.compile(r"^ZE41[a-z]+$", re.IGNORECASE)
@@ -174,6 +175,10 @@ class Command(BaseCommand):
                 )
                 examples.append(f"{item_code} | {operation_type} | {band_label} | {price}")
 
+        # Bumping imported_at makes other processes reload their price list index.
+        version.save(update_fields=["imported_at"])
+        invalidate_price_list_index()
+
         self.stdout.write(self.style.SUCCESS(f"Imported ZE41 items: {imported}"))
         self.stdout.write(self.style.SUCCESS(f"With band: {with_band}"))
         self.stdout.write(self.style.SUCCESS(f"Combos: {combo_count}"))
@@ -0,0 +1,84 @@
+import gzip
+import time
+import zipfile
+from pathlib import Path
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.services.parcels import (
+    ParcelIndex,
+    ParcelIndexError,
+    default_parcel_index_path,
+    iter_gml_parcels,
+    load_parcel_index,
+)
+
+GML_SUFFIXES = (".xml", ".gml")
+
+
+def _iter_sources(path: Path):
+    """Yield (name, file object) for GML files, also inside .zip archives and .gz files."""
+    if path.is_dir():
+        for child in sorted(path.iterdir()):
+            yield from _iter_sources(child)
+        return
+    name = path.name.lower()
+    if name.endswith(".zip"):
+        with zipfile.ZipFile(path) as archive:
+            for member in archive.namelist():
+                if member.lower().endswith(GML_SUFFIXES):
+                    with archive.open(member) as fh:
+                        yield f"{path.name}:{member}", fh
+    elif name.endswith(".gz"):
+        with gzip.open(path, "rb") as fh:
+            yield path.name, fh
+    elif name.endswith(GML_SUFFIXES):
+        with open(path, "rb") as fh:
+            yield path.name, fh
+
+
+class Command(BaseCommand):
+    help = "Build the local cadastral parcel index from INSPIRE CP GML dumps (ČÚZK)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="GML files, .zip/.gz archives or directories.")
+        parser.add_argument("--output", default="", help="Index file (default PARCEL_INDEX_PATH).")
+        parser.add_argument(
+            "--merge",
+            action="store_true",
+            help="Keep parcels of the existing index that are not in the new dumps.",
+        )
+
+    def handle(self, *args, **options):
+        output = Path(options["output"]) if options["output"] else default_parcel_index_path()
+        start = time.perf_counter()
+
+        parcels = {}
+        for raw_path in options["paths"]:
+            path = Path(raw_path)
+            if not path.exists():
+                raise CommandError(f"{path} does not exist.")
+            for name, fh in _iter_sources(path):
+                count = 0
+                try:
+                    for parcel in iter_gml_parcels(fh):
+                        parcels[parcel["fields"]["parcel_number"]] = parcel
+                        count += 1
+                except (ParcelIndexError, SyntaxError, ValueError) as err:
+                    raise CommandError(f"{name}: {err}") from err
+                self.stdout.write(f"{name}: {count} parcels")
+
+        if options["merge"]:
+            existing = load_parcel_index(output)
+            if existing is not None:
+                for parcel in existing.iter_parcels():
+                    parcels.setdefault(parcel["fields"]["parcel_number"], parcel)
+
+        if not parcels:
+            raise CommandError("No parcels found.")
+        index = ParcelIndex(list(parcels.values()))
+        index.save(output)
+        duration_s = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Indexed {len(index)} parcels into {output} in {duration_s:.2f}s.")
+        )
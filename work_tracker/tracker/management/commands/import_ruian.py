@@ -1,12 +1,9 @@
 import csv
 import shutil
-import time
 import zipfile
 from pathlib import Path
 from typing import TextIO
 from urllib.parse import urlparse
-from urllib.request import Request, urlopen
-from urllib.error import HTTPError, URLError
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
@@ -18,6 +15,7 @@ from tracker.models import (
     RuianImportMeta,
     RuianMunicipality,
 )
+from tracker.services.cuzk_client import get_cuzk_client
 
 
 DEFAULT_OBEC_URL = "https://services.cuzk.gov.cz/sestavy/cis/UI_OBEC.zip"
@@ -73,31 +71,14 @@ def _open_csv_with_fallback(path: Path) -> tuple[TextIO, str]:
 
 
 def _download_zip(url: str, dest_path: Path) -> None:
-    delays = [1, 2, 4]
-    last_err = None
-    for attempt, delay in enumerate(delays, start=1):
-        try:
-            req = Request(url, headers={"User-Agent": "work_tracker/1.0"})
-            with urlopen(req, timeout=60) as resp:
-                content_type = resp.headers.get("Content-Type", "")
-                if "text/html" in content_type.lower():
-                    raise ValueError("download returned HTML, wrong URL")
-                data = resp.read()
-            dest_path.write_bytes(data)
-            if not zipfile.is_zipfile(dest_path):
-                raise ValueError("downloaded file is not a ZIP archive")
-            return
-        except HTTPError as err:
-            last_err = err
-            if err.code != 500 or attempt == len(delays):
-                raise
-        except (URLError, ValueError) as err:
-            last_err = err
-            if attempt == len(delays):
-                raise
-        time.sleep(delay)
-    if last_err:
-        raise last_err
+    # Retries with backoff on connection errors and 5xx responses happen in the client.
+    response = get_cuzk_client().get(url, timeout_s=60, retries=3, service="ruian")
+    content_type = response.headers.get("Content-Type", "")
+    if "text/html" in content_type.lower():
+        raise ValueError("download returned HTML, wrong URL")
+    dest_path.write_bytes(response.content)
+    if not zipfile.is_zipfile(dest_path):
+        raise ValueError("downloaded file is not a ZIP archive")
 
 
 class Command(BaseCommand):
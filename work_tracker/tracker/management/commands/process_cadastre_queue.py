@@ -0,0 +1,61 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.cadastre_cache import purge_expired_cadastre_cache
+from tracker.cadastre_queue import run_cadastre_jobs
+
+
+class Command(BaseCommand):
+    help = "Process queued ČÚZK cadastre lookups for newly created trees."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=100, help="Jobs claimed per batch.")
+        parser.add_argument(
+            "--concurrency",
+            type=int,
+            default=4,
+            help="Parallel WFS requests per batch.",
+        )
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new jobs instead of exiting after one batch.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5.0,
+            help="Seconds to wait between polls when the queue is empty (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+        concurrency = options["concurrency"]
+        if limit <= 0:
+            raise CommandError("--limit must be greater than 0")
+        if concurrency <= 0:
+            raise CommandError("--concurrency must be greater than 0")
+
+        purged = purge_expired_cadastre_cache()
+        if purged:
+            self.stdout.write(f"Purged {purged} expired cadastre cache entries.")
+
+        while True:
+            start = time.perf_counter()
+            outcomes = run_cadastre_jobs(limit=limit, concurrency=concurrency)
+            processed = sum(outcomes.values())
+            if processed:
+                duration_s = time.perf_counter() - start
+                summary = ", ".join(f"{status}={count}" for status, count in sorted(outcomes.items()))
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Processed {processed} cadastre lookups in {duration_s:.2f}s ({summary})."
+                    )
+                )
+            if not options["loop"]:
+                if not processed:
+                    self.stdout.write("No cadastre lookups due.")
+                return
+            if processed < limit:
+                time.sleep(options["sleep"])
@@ -0,0 +1,47 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.project_pricing import run_project_reprice_jobs
+
+
+class Command(BaseCommand):
+    help = "Reprice interventions of projects whose pinned price list changed."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--limit", type=int, default=10, help="Projects claimed per batch.")
+        parser.add_argument(
+            "--loop",
+            action="store_true",
+            help="Keep polling for new jobs instead of exiting after one batch.",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=30.0,
+            help="Seconds to wait between polls when the queue is empty (with --loop).",
+        )
+
+    def handle(self, *args, **options):
+        limit = options["limit"]
+        if limit <= 0:
+            raise CommandError("--limit must be greater than 0")
+
+        while True:
+            start = time.perf_counter()
+            outcomes = run_project_reprice_jobs(limit=limit)
+            processed = sum(outcomes.values())
+            if processed:
+                duration_s = time.perf_counter() - start
+                summary = ", ".join(f"{status}={count}" for status, count in sorted(outcomes.items()))
+                self.stdout.write(
+                    self.style.SUCCESS(
+                        f"Repriced {processed} projects in {duration_s:.2f}s ({summary})."
+                    )
+                )
+            if not options["loop"]:
+                if not processed:
+                    self.stdout.write("No project repricing due.")
+                return
+            if processed < limit:
+                time.sleep(options["sleep"])
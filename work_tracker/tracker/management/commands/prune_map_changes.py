@@ -0,0 +1,30 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.map_changes import MAP_CHANGE_RETENTION, map_change_horizon, prune_map_changes
+
+
+class Command(BaseCommand):
+    help = "Delete map change log rows older than the retention window (delta sync history)."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=MAP_CHANGE_RETENTION.days,
+            help="Keep changes from this many most recent days.",
+        )
+
+    def handle(self, *args, **options):
+        days = options["days"]
+        if days <= 0:
+            raise CommandError("--days must be greater than 0")
+
+        deleted = prune_map_changes(timedelta(days=days))
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Deleted {deleted} map changes; clients need a full reload below "
+                f"revision {map_change_horizon()}."
+            )
+        )
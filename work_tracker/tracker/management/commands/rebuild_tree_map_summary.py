@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from tracker.map_summary import rebuild_tree_map_summaries
+from tracker.models import Project, WorkRecord
+
+
+class Command(BaseCommand):
+    help = "Rebuild the denormalised TreeMapSummary rows used by the map feed and project stats."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--project-id",
+            type=int,
+            help="Only rebuild summaries for trees linked to this project.",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        project_id = options.get("project_id")
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be greater than 0")
+
+        work_records = WorkRecord.objects.all()
+        if project_id:
+            if not Project.objects.filter(pk=project_id).exists():
+                raise CommandError(f"Project {project_id} does not exist.")
+            work_records = work_records.filter(projects__id=project_id)
+
+        start = time.perf_counter()
+        written = rebuild_tree_map_summaries(work_records, batch_size=batch_size)
+        duration_s = time.perf_counter() - start
+        self.stdout.write(
+            self.style.SUCCESS(f"Rebuilt {written} tree map summaries in {duration_s:.2f}s.")
+        )
@@ -0,0 +1,66 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Q
+
+from tracker.models import PriceListVersion, Project, ProjectTree, TreeIntervention
+from tracker.pricing import NOO_PRICE_LIST_CODE, recalculate_prices
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalculate estimated intervention prices in batches (one bulk update per batch), "
+        "each tree against the price list pinned by its project."
+    )
+
+    def create_parser(self, prog_name, subcommand, **kwargs):
+        # --version names a price list here and replaces Django's own --version.
+        return super().create_parser(prog_name, subcommand, conflict_handler="resolve", **kwargs)
+
+    def add_arguments(self, parser):
+        parser.add_argument("--project", type=int, help="Only interventions of this project's trees.")
+        parser.add_argument(
+            "--version",
+            help=(
+                "Only projects priced by this price list version code "
+                f"(projects without a pin use {NOO_PRICE_LIST_CODE})."
+            ),
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        if batch_size <= 0:
+            raise CommandError("--batch-size must be greater than 0")
+        projects = Project.objects.all()
+        version_code = options.get("version")
+        if version_code:
+            if not PriceListVersion.objects.filter(code=version_code).exists():
+                raise CommandError(f"Price list version {version_code!r} does not exist.")
+            pinned = Q(price_list_version__code=version_code)
+            if version_code == NOO_PRICE_LIST_CODE:
+                pinned |= Q(price_list_version__isnull=True)
+            projects = projects.filter(pinned)
+        project_id = options.get("project")
+        if project_id:
+            if not Project.objects.filter(pk=project_id).exists():
+                raise CommandError(f"Project {project_id} does not exist.")
+            projects = projects.filter(pk=project_id)
+
+        interventions = TreeIntervention.objects.all()
+        if version_code or project_id:
+            interventions = interventions.filter(
+                tree__in=ProjectTree.objects.filter(project__in=projects).values("tree_id")
+            )
+
+        start = time.perf_counter()
+        total = interventions.count()
+        changed = recalculate_prices(interventions, batch_size=batch_size)
+        duration_s = time.perf_counter() - start
+        rate = total / duration_s if duration_s else 0.0
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Recalculated {total} interventions: {changed} changed "
+                f"in {duration_s:.2f}s ({rate:.0f} interventions/s)."
+            )
+        )
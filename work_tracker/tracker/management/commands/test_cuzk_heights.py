@@ -4,11 +4,12 @@ import time
 import requests
 from django.core.management.base import BaseCommand, CommandError
 
-from tracker.models import WorkRecord
+from tracker.models import WorkRecord, get_workrecord_sjtsk
 from tracker.services.cuzk import (
     CuzkHeightError,
     DMP1G_IMAGE_SERVER,
     DMR5G_IMAGE_SERVER,
+    circle_grid_points,
     estimate_tree_height_from_cuzk,
     wgs84_to_sjtsk,
 )
@@ -149,7 +150,9 @@ class Command(BaseCommand):
             return
 
         try:
-            result = estimate_tree_height_from_cuzk(lat=lat, lon=lon)
+            result = estimate_tree_height_from_cuzk(
+                lat=lat, lon=lon, sjtsk=get_workrecord_sjtsk(record)
+            )
         except CuzkHeightError as exc:
             self._write_row(
                 record.id,
@@ -647,14 +650,7 @@ class Command(BaseCommand):
         if step_m <= 0:
             raise CommandError("--step-m must be greater than 0")
 
-        points = []
-        steps = int(radius_m // step_m)
-        offsets = [round(i * step_m, 6) for i in range(-steps, steps + 1)]
-        for dx in offsets:
-            for dy in offsets:
-                if dx * dx + dy * dy <= radius_m * radius_m + 1e-9:
-                    points.append([sjtsk_x + dx, sjtsk_y + dy])
-        return points
+        return [list(point) for point in circle_grid_points(sjtsk_x, sjtsk_y, radius_m, step_m)]
 
     def _get_samples_diagnostic(self, service_name: str, image_server_url: str, points: list[list[float]]) -> dict:
         url = f"{image_server_url.rstrip('/')}/getSamples"
@@ -0,0 +1,161 @@
+from __future__ import annotations
+
+import hashlib
+from datetime import timedelta
+
+from django.db.models import Count, F, Max, Min
+from django.utils import timezone
+
+from .models import Project, ProjectMapChange, ProjectTree, TreeIntervention, WorkRecord
+
+# Bump when the map feed payload format changes so clients drop cached responses.
+MAP_FEED_FORMAT_VERSION = 1
+# How long a hole among recent ProjectMapChange ids holds the delta-sync cursor back.
+MAP_CHANGE_SETTLE_WINDOW = timedelta(minutes=5)
+# prune_map_changes drops older log rows; clients with an older cursor must resync fully.
+MAP_CHANGE_RETENTION = timedelta(days=30)
+# WorkRecord fields no map payload reads (cadastre lookup results, derived S-JTSK
+# coordinates); saves limited to them leave map revisions and the change log alone.
+MAP_IGNORED_TREE_FIELDS = frozenset(
+    {
+        "parcel_number",
+        "cadastral_area_code",
+        "cadastral_area_name",
+        "municipality_code",
+        "municipality_name",
+        "lv_number",
+        "cad_lookup_status",
+        "cad_lookup_at",
+        "sjtsk_x",
+        "sjtsk_y",
+    }
+)
+
+
+def tree_project_ids(tree_id, legacy_project_id=None) -> set[int]:
+    """Projects whose map shows the tree: Project.trees links plus the legacy FK."""
+    project_ids = set()
+    if tree_id:
+        project_ids.update(
+            ProjectTree.objects.filter(tree_id=tree_id).values_list("project_id", flat=True)
+        )
+    if legacy_project_id:
+        project_ids.add(legacy_project_id)
+    return project_ids
+
+
+def bump_map_revision(project_ids, tree_ids=()) -> None:
+    """Advance the map revision of the projects and log the touched trees for delta sync."""
+    project_ids = {pk for pk in (project_ids or ()) if pk}
+    if not project_ids:
+        return
+    Project.objects.filter(pk__in=project_ids).update(
+        map_revision=F("map_revision") + 1,
+        map_revised_at=timezone.now(),
+    )
+    tree_ids = {pk for pk in (tree_ids or ()) if pk}
+    if tree_ids:
+        ProjectMapChange.objects.bulk_create(
+            [
+                ProjectMapChange(project_id=project_id, tree_id=tree_id)
+                for project_id in sorted(project_ids)
+                for tree_id in sorted(tree_ids)
+            ]
+        )
+
+
+def refresh_trees_after_bulk_write(tree_ids) -> None:
+    """
+    Effects of the tree detail post_save signals for rows written with bulk_create or
+    bulk_update: reprice the trees' interventions, refresh their projects' price totals,
+    rebuild their map summaries and bump the map revision of their projects, once per batch.
+    """
+    from .map_summary import rebuild_tree_map_summaries
+    from .pricing import recalculate_prices
+    from .project_pricing import refresh_tree_project_price_totals
+
+    tree_ids = list(tree_ids)
+    recalculate_prices(TreeIntervention.objects.filter(tree_id__in=tree_ids), refresh_totals=False)
+    # Also when no price changed: a bulk write can move interventions between categories.
+    refresh_tree_project_price_totals(tree_ids)
+    rebuild_tree_map_summaries(WorkRecord.objects.filter(pk__in=tree_ids))
+    project_ids = set(
+        ProjectTree.objects.filter(tree_id__in=tree_ids).values_list("project_id", flat=True)
+    )
+    project_ids.update(
+        WorkRecord.objects.filter(pk__in=tree_ids).values_list("project_id", flat=True)
+    )
+    bump_map_revision(project_ids, tree_ids)
+
+
+def latest_map_change_id() -> int:
+    """
+    Current delta-sync cursor (0 when nothing has been logged yet).
+
+    Ids are allocated at insert but become visible at commit, so a hole among recent ids
+    may be a transaction still in flight. The cursor stops below the first such hole until
+    it fills or MAP_CHANGE_SETTLE_WINDOW passes (rolled-back ids never fill), so a late
+    commit is never behind a cursor a client already holds.
+    """
+    changes = ProjectMapChange.objects.all()
+    first_recent = changes.filter(
+        created_at__gte=timezone.now() - MAP_CHANGE_SETTLE_WINDOW
+    ).aggregate(first=Min("id"))["first"]
+    if first_recent is None:
+        return changes.aggregate(latest=Max("id"))["latest"] or 0
+    cursor = changes.filter(id__lt=first_recent).aggregate(latest=Max("id"))["latest"] or 0
+    recent = changes.filter(id__gt=cursor).aggregate(count=Count("id"), latest=Max("id"))
+    if recent["count"] == recent["latest"] - cursor:
+        return recent["latest"]
+    for change_id in changes.filter(id__gt=cursor).order_by("id").values_list("id", flat=True):
+        if change_id != cursor + 1:
+            break
+        cursor = change_id
+    return cursor
+
+
+def map_change_horizon() -> int:
+    """Oldest `since` cursor the change log can still answer; older ones need a full load."""
+    oldest = ProjectMapChange.objects.aggregate(oldest=Min("id"))["oldest"]
+    return oldest - 1 if oldest else 0
+
+
+def prune_map_changes(retention: timedelta = MAP_CHANGE_RETENTION) -> int:
+    """
+    Delete change log rows older than `retention`, except the newest of them: it anchors
+    latest_map_change_id below recent ids, so the gap left by pruning is not mistaken
+    for uncommitted changes. Returns the deleted row count.
+    """
+    changes = ProjectMapChange.objects.all()
+    anchor = changes.filter(created_at__lt=timezone.now() - retention).aggregate(
+        anchor=Max("id")
+    )["anchor"]
+    if not anchor:
+        return 0
+    deleted, _ = changes.filter(id__lt=anchor).delete()
+    return deleted
+
+
+def map_changed_tree_ids(projects, since: int, until: int | None = None):
+    """
+    Queryset of ids of trees touched on the given projects' maps after the `since` cursor,
+    up to `until` (the cursor returned with the same response).
+    """
+    changes = ProjectMapChange.objects.filter(project__in=projects, id__gt=since)
+    if until is not None:
+        changes = changes.filter(id__lte=until)
+    return changes.values_list("tree_id", flat=True).distinct()
+
+
+def map_feed_state(projects) -> tuple[str, object]:
+    """
+    Return (etag, last_modified) for a map feed scoped to the given projects queryset.
+    Only the Project table is read, so conditional requests never touch tree tables.
+    """
+    rows = list(projects.order_by("pk").values_list("pk", "map_revision", "map_revised_at"))
+    fingerprint = ";".join(f"{pk}:{revision}" for pk, revision, _ in rows)
+    digest = hashlib.sha1(
+        f"v{MAP_FEED_FORMAT_VERSION}|{fingerprint}".encode("utf-8")
+    ).hexdigest()
+    last_modified = max((revised_at for _, _, revised_at in rows if revised_at), default=None)
+    return f'"{digest[:32]}"', last_modified
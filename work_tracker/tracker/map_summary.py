@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+from collections import defaultdict
+
+from django.db.models import Count, Exists, OuterRef, Subquery
+
+from .models import (
+    PhotoDocumentation,
+    ShrubAssessment,
+    TreeAssessment,
+    TreeIntervention,
+    TreeMapSummary,
+    WorkRecord,
+)
+
+REMOVAL_CATEGORY = "Kácení"
+
+ANNOTATED_FIELDS = [
+    "crown_width_m",
+    "mistletoe_level",
+    "access_obstacle_level",
+    "shrub_width_m",
+    "has_tree_assessment",
+    "has_shrub_assessment",
+    "photo_count",
+    "has_interventions",
+    "has_active_intervention",
+    "has_approved_intervention",
+    "has_done_intervention",
+    "has_removal_intervention",
+    "has_proposed_removal_intervention",
+]
+
+SUMMARY_UPDATE_FIELDS = [
+    *ANNOTATED_FIELDS,
+    "intervention_type_codes",
+    "intervention_statuses",
+    "updated_at",
+]
+
+
+def _summary_annotations() -> dict:
+    latest_assessment = TreeAssessment.objects.filter(work_record=OuterRef("pk")).order_by(
+        "-assessed_at",
+        "-id",
+    )
+    latest_shrub = ShrubAssessment.objects.filter(work_record=OuterRef("pk")).order_by(
+        "-assessed_at",
+        "-id",
+    )
+    interventions = TreeIntervention.objects.filter(tree=OuterRef("pk"))
+    photo_count = (
+        PhotoDocumentation.objects.filter(work_record=OuterRef("pk"))
+        .order_by()
+        .values("work_record")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+    return {
+        "summary_crown_width_m": Subquery(latest_assessment.values("crown_width_m")[:1]),
+        "summary_mistletoe_level": Subquery(latest_assessment.values("mistletoe_level")[:1]),
+        "summary_access_obstacle_level": Subquery(
+            latest_assessment.values("access_obstacle_level")[:1]
+        ),
+        "summary_shrub_width_m": Subquery(latest_shrub.values("width_m")[:1]),
+        "summary_has_tree_assessment": Exists(
+            TreeAssessment.objects.filter(work_record=OuterRef("pk"))
+        ),
+        "summary_has_shrub_assessment": Exists(
+            ShrubAssessment.objects.filter(work_record=OuterRef("pk"))
+        ),
+        "summary_photo_count": Subquery(photo_count[:1]),
+        "summary_has_interventions": Exists(interventions),
+        "summary_has_active_intervention": Exists(interventions.exclude(status="completed")),
+        "summary_has_approved_intervention": Exists(interventions.filter(status="completed")),
+        "summary_has_done_intervention": Exists(interventions.filter(status="done_pending_owner")),
+        "summary_has_removal_intervention": Exists(
+            interventions.filter(intervention_type__category__iexact=REMOVAL_CATEGORY).exclude(
+                status="completed"
+            )
+        ),
+        "summary_has_proposed_removal_intervention": Exists(
+            interventions.filter(
+                status="proposed",
+                intervention_type__category=REMOVAL_CATEGORY,
+            )
+        ),
+    }
+
+
+def _interventions_by_tree(tree_ids) -> tuple[dict, dict]:
+    codes_by_tree = defaultdict(set)
+    statuses_by_tree = defaultdict(set)
+    rows = TreeIntervention.objects.filter(tree_id__in=tree_ids).values_list(
+        "tree_id",
+        "intervention_type__code",
+        "status",
+    )
+    for tree_id, code, status in rows:
+        code = (code or "").strip()
+        status = (status or "").strip()
+        if code:
+            codes_by_tree[tree_id].add(code)
+        if status:
+            statuses_by_tree[tree_id].add(status)
+    return codes_by_tree, statuses_by_tree
+
+
+def _build_summaries(tree_ids) -> list[TreeMapSummary]:
+    codes_by_tree, statuses_by_tree = _interventions_by_tree(tree_ids)
+    rows = (
+        WorkRecord.objects.filter(pk__in=tree_ids)
+        .order_by()
+        .annotate(**_summary_annotations())
+        .values("pk", *(f"summary_{name}" for name in ANNOTATED_FIELDS))
+    )
+    summaries = []
+    for row in rows:
+        values = {name: row[f"summary_{name}"] for name in ANNOTATED_FIELDS}
+        values["photo_count"] = values["photo_count"] or 0
+        summaries.append(
+            TreeMapSummary(
+                work_record_id=row["pk"],
+                intervention_type_codes=sorted(codes_by_tree.get(row["pk"], ())),
+                intervention_statuses=sorted(statuses_by_tree.get(row["pk"], ())),
+                **values,
+            )
+        )
+    return summaries
+
+
+def _store_summaries(summaries: list[TreeMapSummary]) -> None:
+    if not summaries:
+        return
+    TreeMapSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=["work_record"],
+        update_fields=SUMMARY_UPDATE_FIELDS,
+    )
+
+
+def refresh_tree_map_summary(tree_id) -> None:
+    """Recompute the map summary row for one WorkRecord (no-op if it no longer exists)."""
+    if not tree_id:
+        return
+    summaries = _build_summaries([tree_id])
+    if not summaries:
+        TreeMapSummary.objects.filter(work_record_id=tree_id).delete()
+        return
+    _store_summaries(summaries)
+
+
+def rebuild_tree_map_summaries(work_records=None, batch_size: int = 500) -> int:
+    """Recompute summaries for the given WorkRecord queryset (default: all). Returns row count."""
+    if work_records is None:
+        work_records = WorkRecord.objects.all()
+    tree_ids = list(work_records.order_by("pk").values_list("pk", flat=True))
+    written = 0
+    for start in range(0, len(tree_ids), batch_size):
+        summaries = _build_summaries(tree_ids[start : start + batch_size])
+        _store_summaries(summaries)
+        written += len(summaries)
+    return written
@@ -0,0 +1,40 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:52
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0045_alter_projectmembership_role'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TreeMapSummary',
+            fields=[
+                ('work_record', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='map_summary', serialize=False, to='tracker.workrecord')),
+                ('crown_width_m', models.DecimalField(blank=True, decimal_places=2, max_digits=6, null=True)),
+                ('mistletoe_level', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('access_obstacle_level', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('shrub_width_m', models.FloatField(blank=True, null=True)),
+                ('has_tree_assessment', models.BooleanField(default=False)),
+                ('has_shrub_assessment', models.BooleanField(default=False)),
+                ('photo_count', models.PositiveIntegerField(default=0)),
+                ('has_interventions', models.BooleanField(default=False)),
+                ('has_active_intervention', models.BooleanField(default=False)),
+                ('has_approved_intervention', models.BooleanField(default=False)),
+                ('has_done_intervention', models.BooleanField(default=False)),
+                ('has_removal_intervention', models.BooleanField(default=False)),
+                ('has_proposed_removal_intervention', models.BooleanField(default=False)),
+                ('intervention_type_codes', models.JSONField(blank=True, default=list)),
+                ('intervention_statuses', models.JSONField(blank=True, default=list)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Mapový souhrn stromu',
+                'verbose_name_plural': 'Mapové souhrny stromů',
+            },
+        ),
+    ]
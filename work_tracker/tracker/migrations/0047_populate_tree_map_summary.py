@@ -0,0 +1,109 @@
+from collections import defaultdict
+
+from django.db import migrations
+from django.db.models import Count, Exists, OuterRef, Subquery
+
+BATCH_SIZE = 500
+
+
+def populate_tree_map_summary(apps, schema_editor):
+    WorkRecord = apps.get_model("tracker", "WorkRecord")
+    TreeAssessment = apps.get_model("tracker", "TreeAssessment")
+    ShrubAssessment = apps.get_model("tracker", "ShrubAssessment")
+    TreeIntervention = apps.get_model("tracker", "TreeIntervention")
+    PhotoDocumentation = apps.get_model("tracker", "PhotoDocumentation")
+    TreeMapSummary = apps.get_model("tracker", "TreeMapSummary")
+
+    latest_assessment = TreeAssessment.objects.filter(work_record=OuterRef("pk")).order_by(
+        "-assessed_at", "-id"
+    )
+    latest_shrub = ShrubAssessment.objects.filter(work_record=OuterRef("pk")).order_by(
+        "-assessed_at", "-id"
+    )
+    interventions = TreeIntervention.objects.filter(tree=OuterRef("pk"))
+    photo_count = (
+        PhotoDocumentation.objects.filter(work_record=OuterRef("pk"))
+        .order_by()
+        .values("work_record")
+        .annotate(total=Count("id"))
+        .values("total")
+    )
+
+    tree_ids = list(WorkRecord.objects.order_by("pk").values_list("pk", flat=True))
+    for start in range(0, len(tree_ids), BATCH_SIZE):
+        batch = tree_ids[start : start + BATCH_SIZE]
+        codes_by_tree = defaultdict(set)
+        statuses_by_tree = defaultdict(set)
+        for tree_id, code, status in TreeIntervention.objects.filter(tree_id__in=batch).values_list(
+            "tree_id", "intervention_type__code", "status"
+        ):
+            if code and code.strip():
+                codes_by_tree[tree_id].add(code.strip())
+            if status and status.strip():
+                statuses_by_tree[tree_id].add(status.strip())
+
+        rows = (
+            WorkRecord.objects.filter(pk__in=batch)
+            .order_by()
+            .annotate(
+                s_crown_width_m=Subquery(latest_assessment.values("crown_width_m")[:1]),
+                s_mistletoe_level=Subquery(latest_assessment.values("mistletoe_level")[:1]),
+                s_access_obstacle_level=Subquery(
+                    latest_assessment.values("access_obstacle_level")[:1]
+                ),
+                s_shrub_width_m=Subquery(latest_shrub.values("width_m")[:1]),
+                s_has_tree_assessment=Exists(
+                    TreeAssessment.objects.filter(work_record=OuterRef("pk"))
+                ),
+                s_has_shrub_assessment=Exists(
+                    ShrubAssessment.objects.filter(work_record=OuterRef("pk"))
+                ),
+                s_photo_count=Subquery(photo_count[:1]),
+                s_has_interventions=Exists(interventions),
+                s_has_active_intervention=Exists(interventions.exclude(status="completed")),
+                s_has_approved_intervention=Exists(interventions.filter(status="completed")),
+                s_has_done_intervention=Exists(interventions.filter(status="done_pending_owner")),
+                s_has_removal_intervention=Exists(
+                    interventions.filter(intervention_type__category__iexact="Kácení").exclude(
+                        status="completed"
+                    )
+                ),
+                s_has_proposed_removal_intervention=Exists(
+                    interventions.filter(status="proposed", intervention_type__category="Kácení")
+                ),
+            )
+        )
+        summaries = []
+        for row in rows:
+            summaries.append(
+                TreeMapSummary(
+                    work_record_id=row.pk,
+                    crown_width_m=row.s_crown_width_m,
+                    mistletoe_level=row.s_mistletoe_level,
+                    access_obstacle_level=row.s_access_obstacle_level,
+                    shrub_width_m=row.s_shrub_width_m,
+                    has_tree_assessment=row.s_has_tree_assessment,
+                    has_shrub_assessment=row.s_has_shrub_assessment,
+                    photo_count=row.s_photo_count or 0,
+                    has_interventions=row.s_has_interventions,
+                    has_active_intervention=row.s_has_active_intervention,
+                    has_approved_intervention=row.s_has_approved_intervention,
+                    has_done_intervention=row.s_has_done_intervention,
+                    has_removal_intervention=row.s_has_removal_intervention,
+                    has_proposed_removal_intervention=row.s_has_proposed_removal_intervention,
+                    intervention_type_codes=sorted(codes_by_tree.get(row.pk, ())),
+                    intervention_statuses=sorted(statuses_by_tree.get(row.pk, ())),
+                )
+            )
+        TreeMapSummary.objects.bulk_create(summaries, ignore_conflicts=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0046_treemapsummary"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_tree_map_summary, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0047_populate_tree_map_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='map_revised_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='map_revision',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:57
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0048_project_map_revision'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProjectMapChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tree_id', models.PositiveIntegerField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='map_changes', to='tracker.project')),
+            ],
+            options={
+                'verbose_name': 'Změna mapy projektu',
+                'verbose_name_plural': 'Změny mapy projektu',
+                'indexes': [models.Index(fields=['project', 'id'], name='tracker_pro_project_ecbde1_idx')],
+            },
+        ),
+    ]
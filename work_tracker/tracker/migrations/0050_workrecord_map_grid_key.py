@@ -0,0 +1,26 @@
+# Generated by Django 4.2.23 on 2026-10-17 05:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0049_projectmapchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workrecord',
+            name='map_grid_key',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='workrecord',
+            index=models.Index(fields=['map_grid_key'], name='tracker_wor_map_gri_ddc140_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='workrecord',
+            index=models.Index(fields=['project', 'map_grid_key'], name='tracker_wor_project_26b973_idx'),
+        ),
+    ]
@@ -0,0 +1,31 @@
+from django.db import migrations
+
+from tracker.spatial_grid import grid_key
+
+BATCH_SIZE = 500
+
+
+def populate_map_grid_key(apps, schema_editor):
+    WorkRecord = apps.get_model("tracker", "WorkRecord")
+
+    rows = WorkRecord.objects.filter(latitude__isnull=False, longitude__isnull=False).order_by("pk")
+    batch = []
+    for record in rows.only("pk", "latitude", "longitude").iterator(chunk_size=BATCH_SIZE):
+        record.map_grid_key = grid_key(record.latitude, record.longitude)
+        batch.append(record)
+        if len(batch) >= BATCH_SIZE:
+            WorkRecord.objects.bulk_update(batch, ["map_grid_key"])
+            batch = []
+    if batch:
+        WorkRecord.objects.bulk_update(batch, ["map_grid_key"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0050_workrecord_map_grid_key"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_map_grid_key, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0051_populate_workrecord_map_grid_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CadastreLookupJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Čeká'), ('running', 'Zpracovává se'), ('done', 'Hotovo'), ('failed', 'Selhalo')], default='pending', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('work_record', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='cadastre_job', to='tracker.workrecord')),
+            ],
+            options={
+                'verbose_name': 'Dotaz na katastr',
+                'verbose_name_plural': 'Fronta dotazů na katastr',
+                'indexes': [models.Index(fields=['status', 'available_at'], name='tracker_cad_status_b13dd3_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0052_cadastrelookupjob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CadastreLookupCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('status', models.CharField(max_length=16)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'verbose_name': 'Uložený výsledek katastru',
+                'verbose_name_plural': 'Uložené výsledky katastru',
+                'indexes': [models.Index(fields=['expires_at'], name='tracker_cad_expires_db3547_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='cadastrelookupcache',
+            constraint=models.UniqueConstraint(fields=('cell_x', 'cell_y'), name='unique_cadastre_cache_cell'),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0053_cadastrelookupcache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='treeassessment',
+            name='height_m_source',
+            field=models.CharField(blank=True, default='', help_text='Prázdné = změřeno; jinak zdroj automatického odhadu (návrh k potvrzení).', max_length=64, verbose_name='Zdroj výšky'),
+        ),
+    ]
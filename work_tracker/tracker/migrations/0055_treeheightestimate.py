@@ -0,0 +1,38 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:20
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0054_treeassessment_height_m_source'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TreeHeightEstimate',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('method', models.CharField(max_length=16)),
+                ('cell_x', models.IntegerField()),
+                ('cell_y', models.IntegerField()),
+                ('dmr_m', models.FloatField()),
+                ('dmp_m', models.FloatField()),
+                ('estimated_height_m', models.FloatField()),
+                ('transform_method', models.CharField(blank=True, default='', max_length=32)),
+                ('result', models.JSONField(blank=True, default=dict)),
+                ('estimated_at', models.DateTimeField(auto_now=True)),
+                ('work_record', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='height_estimates', to='tracker.workrecord')),
+            ],
+            options={
+                'verbose_name': 'Odhad výšky z ČÚZK',
+                'verbose_name_plural': 'Odhady výšky z ČÚZK',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='treeheightestimate',
+            constraint=models.UniqueConstraint(fields=('work_record', 'method'), name='unique_tree_height_estimate_method'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:24
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0055_treeheightestimate'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workrecord',
+            name='sjtsk_x',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='workrecord',
+            name='sjtsk_y',
+            field=models.FloatField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='workrecord',
+            index=models.Index(fields=['sjtsk_x', 'sjtsk_y'], name='tracker_wor_sjtsk_x_d6caf4_idx'),
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:32
+
+from django.db import migrations, models
+import django.db.models.deletion
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0056_workrecord_sjtsk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='project',
+            name='price_list_version',
+            field=models.ForeignKey(blank=True, help_text='Prázdné = výchozí ceník NOO 2026.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='projects', to='tracker.pricelistversion', verbose_name='Ceník'),
+        ),
+        migrations.CreateModel(
+            name='ProjectPriceTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('proposed', 'Navrženo'), ('done_pending_owner', 'Hotovo – čeká na potvrzení'), ('completed', 'Potvrzeno')], max_length=32)),
+                ('category', models.CharField(blank=True, max_length=100)),
+                ('intervention_count', models.PositiveIntegerField(default=0)),
+                ('priced_count', models.PositiveIntegerField(default=0)),
+                ('total_czk', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='price_totals', to='tracker.project')),
+            ],
+            options={
+                'verbose_name': 'Součet cen projektu',
+                'verbose_name_plural': 'Součty cen projektů',
+            },
+        ),
+        migrations.CreateModel(
+            name='ProjectRepriceJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'Čeká'), ('running', 'Zpracovává se'), ('done', 'Hotovo'), ('failed', 'Selhalo')], default='pending', max_length=16)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('available_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('locked_at', models.DateTimeField(blank=True, null=True)),
+                ('last_error', models.TextField(blank=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='reprice_job', to='tracker.project')),
+            ],
+            options={
+                'verbose_name': 'Přecenění projektu',
+                'verbose_name_plural': 'Fronta přecenění projektů',
+                'indexes': [models.Index(fields=['status', 'available_at'], name='tracker_pro_status_2960f3_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='projectpricetotal',
+            constraint=models.UniqueConstraint(fields=('project', 'status', 'category'), name='unique_project_price_total'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+from django.db import migrations
+from django.db.models import Count, Sum
+
+
+def populate_project_price_totals(apps, schema_editor):
+    ProjectTree = apps.get_model("tracker", "ProjectTree")
+    ProjectPriceTotal = apps.get_model("tracker", "ProjectPriceTotal")
+
+    rows = (
+        ProjectTree.objects.values(
+            "project_id",
+            "tree__interventions__status",
+            "tree__interventions__intervention_type__category",
+        )
+        .annotate(
+            intervention_count=Count("tree__interventions"),
+            priced_count=Count("tree__interventions__estimated_price_czk"),
+            total_czk=Sum("tree__interventions__estimated_price_czk"),
+        )
+        .order_by()
+    )
+    ProjectPriceTotal.objects.bulk_create(
+        [
+            ProjectPriceTotal(
+                project_id=row["project_id"],
+                status=row["tree__interventions__status"],
+                category=row["tree__interventions__intervention_type__category"] or "",
+                intervention_count=row["intervention_count"],
+                priced_count=row["priced_count"],
+                total_czk=row["total_czk"] or 0,
+            )
+            for row in rows
+            if row["tree__interventions__status"] is not None
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("tracker", "0057_project_price_list_version_and_totals"),
+    ]
+
+    operations = [
+        migrations.RunPython(populate_project_price_totals, migrations.RunPython.noop),
+    ]
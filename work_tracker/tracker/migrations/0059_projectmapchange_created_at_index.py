@@ -0,0 +1,17 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0058_populate_project_price_totals'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='projectmapchange',
+            index=models.Index(fields=['created_at'], name='tracker_pro_created_4f26c7_idx'),
+        ),
+    ]
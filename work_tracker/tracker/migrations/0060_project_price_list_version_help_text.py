@@ -0,0 +1,19 @@
+# Generated by Django 4.2.23 on 2026-10-17 06:50
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('tracker', '0059_projectmapchange_created_at_index'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='project',
+            name='price_list_version',
+            field=models.ForeignKey(blank=True, help_text='Prázdné = výchozí ceník NOO 2026. Strom sdílený více projekty se oceňuje ceníkem prvního z nich, který má ceník nastaven (i v souhrnech ostatních projektů); projekty se společnými stromy proto nemohou mít různé ceníky.', null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='projects', to='tracker.pricelistversion', verbose_name='Ceník'),
+        ),
+    ]
@@ -4,18 +4,20 @@ import re
 import string
 from datetime import date
 from decimal import Decimal, ROUND_HALF_UP
-from functools import lru_cache
 from urllib.error import URLError
 from urllib.parse import urlencode
-from urllib.request import urlopen
 
+from django.core.exceptions import ValidationError
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models, transaction
-from django.db.models.signals import post_save
+from django.db.models import QuerySet
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
 from django.dispatch import receiver
 from django.utils import timezone
 from django.conf import settings
 
+from .spatial_grid import grid_key
+
 # models module for ArboMap tracker app
 logger = logging.getLogger(__name__)
 
@@ -128,10 +130,67 @@ class Project(models.Model):
     name = models.CharField(max_length=200, verbose_name="Název projektu")
     description = models.TextField(verbose_name="Popis projektu", blank=True)
     is_closed = models.BooleanField(default=False, verbose_name="Uzavřený projekt")
+    map_revision = models.PositiveBigIntegerField(default=0, editable=False)
+    map_revised_at = models.DateTimeField(null=True, blank=True, editable=False)
+    price_list_version = models.ForeignKey(
+        "PriceListVersion",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="projects",
+        verbose_name="Ceník",
+        help_text=(
+            "Prázdné = výchozí ceník NOO 2026. Strom sdílený více projekty se oceňuje "
+            "ceníkem prvního z nich, který má ceník nastaven (i v souhrnech ostatních "
+            "projektů); projekty se společnými stromy proto nemohou mít různé ceníky."
+        ),
+    )
 
     def __str__(self):
         return self.name
 
+    def clean(self):
+        super().clean()
+        if not self.pk or not self.price_list_version_id:
+            return
+        from .project_pricing import price_list_conflicts
+
+        # A shared tree has one price, so two pins on it would price one project's trees
+        # (and totals) from the other project's list.
+        conflicts = list(
+            price_list_conflicts(self, self.price_list_version_id)
+            .order_by("name")
+            .values_list("name", flat=True)[:5]
+        )
+        if conflicts:
+            raise ValidationError(
+                {
+                    "price_list_version": (
+                        "Projekt sdílí stromy s projekty s jiným ceníkem: "
+                        f"{', '.join(conflicts)}."
+                    )
+                }
+            )
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        pin_changed = False
+        if update_fields is None or "price_list_version" in update_fields:
+            previous = None
+            if self.pk:
+                previous = (
+                    Project.objects.filter(pk=self.pk)
+                    .values_list("price_list_version_id", flat=True)
+                    .first()
+                )
+            pin_changed = previous != self.price_list_version_id
+        super().save(*args, **kwargs)
+        if pin_changed:
+            from .project_pricing import enqueue_project_reprice
+
+            # Repricing a whole project runs in `process_reprice_queue`, not in this request.
+            enqueue_project_reprice(self)
+
     trees = models.ManyToManyField(
         "WorkRecord",
         through="ProjectTree",
@@ -233,6 +292,11 @@ class WorkRecord(models.Model):
         blank=True,
         verbose_name="Osa živého plotu (GeoJSON LineString)",
     )
+    # Z-order key of (latitude, longitude), see tracker.spatial_grid; maintained in save().
+    map_grid_key = models.BigIntegerField(null=True, blank=True, editable=False)
+    # EPSG:5514 projection of (latitude, longitude); maintained in save().
+    sjtsk_x = models.FloatField(null=True, blank=True, editable=False)
+    sjtsk_y = models.FloatField(null=True, blank=True, editable=False)
     parcel_number = models.CharField(max_length=64, blank=True, null=True)
     cadastral_area_code = models.CharField(max_length=32, blank=True, null=True)
     cadastral_area_name = models.CharField(max_length=128, blank=True, null=True)
@@ -254,6 +318,20 @@ class WorkRecord(models.Model):
                 name="unique_passport_no_per_project_type",
             )
         ]
+        indexes = [
+            models.Index(fields=["map_grid_key"]),
+            models.Index(fields=["project", "map_grid_key"]),
+            models.Index(fields=["sjtsk_x", "sjtsk_y"]),
+        ]
+
+    def save(self, *args, **kwargs):
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or ({"latitude", "longitude"} & set(update_fields)):
+            self.map_grid_key = grid_key(self.latitude, self.longitude)
+            self.sjtsk_x, self.sjtsk_y = workrecord_sjtsk_from_lonlat(self)
+        if update_fields is not None and ({"latitude", "longitude"} & set(update_fields)):
+            kwargs["update_fields"] = {*update_fields, "map_grid_key", "sjtsk_x", "sjtsk_y"}
+        super().save(*args, **kwargs)
 
     def generate_internal_code(self) -> str | None:
         """
@@ -548,6 +626,14 @@ class TreeAssessment(models.Model):
         help_text="Výška stromu v metrech.",
     )
 
+    height_m_source = models.CharField(
+        max_length=64,
+        blank=True,
+        default="",
+        verbose_name="Zdroj výšky",
+        help_text="Prázdné = změřeno; jinak zdroj automatického odhadu (návrh k potvrzení).",
+    )
+
     crown_width_m = models.DecimalField(
         max_digits=6,
         decimal_places=2,
@@ -637,6 +723,17 @@ class TreeAssessment(models.Model):
             return ""
         return f"{info['code']} – {info['label']} ({info['range']} objemu koruny)"
 
+    @property
+    def is_height_draft(self):
+        return self.height_m is not None and bool(self.height_m_source)
+
+    def get_height_source_label(self):
+        if self.height_m is None:
+            return ""
+        if not self.height_m_source:
+            return "změřeno"
+        return f"návrh k potvrzení – {self.height_m_source}"
+
     def get_mistletoe_multiplier(self):
         level = self.mistletoe_level
         if level in (None, "", 0):
@@ -1080,6 +1177,248 @@ class TreeIntervention(models.Model):
         return " · ".join(parts)
 
 
+class TreeMapSummary(models.Model):
+    """
+    Denormalised per-tree map state (latest assessment values, intervention flags).
+    Kept up to date by signals in this module; rebuild with `rebuild_tree_map_summary`.
+    """
+
+    work_record = models.OneToOneField(
+        "WorkRecord",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="map_summary",
+    )
+    crown_width_m = models.DecimalField(max_digits=6, decimal_places=2, null=True, blank=True)
+    mistletoe_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    access_obstacle_level = models.PositiveSmallIntegerField(null=True, blank=True)
+    shrub_width_m = models.FloatField(null=True, blank=True)
+    has_tree_assessment = models.BooleanField(default=False)
+    has_shrub_assessment = models.BooleanField(default=False)
+    photo_count = models.PositiveIntegerField(default=0)
+    has_interventions = models.BooleanField(default=False)
+    has_active_intervention = models.BooleanField(default=False)
+    has_approved_intervention = models.BooleanField(default=False)
+    has_done_intervention = models.BooleanField(default=False)
+    has_removal_intervention = models.BooleanField(default=False)
+    has_proposed_removal_intervention = models.BooleanField(default=False)
+    intervention_type_codes = models.JSONField(default=list, blank=True)
+    intervention_statuses = models.JSONField(default=list, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Mapový souhrn stromu"
+        verbose_name_plural = "Mapové souhrny stromů"
+
+    def __str__(self):
+        return f"Mapový souhrn pro WorkRecord #{self.work_record_id}"
+
+
+class ProjectMapChange(models.Model):
+    """
+    Log of trees touched on a project map. The id is the cursor clients pass as
+    `workrecords_geojson?since=`; tree_id is kept after the tree itself is deleted.
+    Rows past MAP_CHANGE_RETENTION are removed by prune_map_changes.
+    """
+
+    project = models.ForeignKey(
+        "Project",
+        on_delete=models.CASCADE,
+        related_name="map_changes",
+    )
+    tree_id = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "Změna mapy projektu"
+        verbose_name_plural = "Změny mapy projektu"
+        indexes = [
+            models.Index(fields=["project", "id"]),
+            models.Index(fields=["created_at"]),
+        ]
+
+    def __str__(self):
+        return f"Změna #{self.pk} projektu {self.project_id} (strom {self.tree_id})"
+
+
+class CadastreLookupJob(models.Model):
+    """
+    Queued ČÚZK parcel lookup for a tree. Enqueued on create and processed by
+    `process_cadastre_queue` (see tracker.cadastre_queue), so creation never waits on WFS.
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Čeká"
+        RUNNING = "running", "Zpracovává se"
+        DONE = "done", "Hotovo"
+        FAILED = "failed", "Selhalo"
+
+    work_record = models.OneToOneField(
+        "WorkRecord",
+        on_delete=models.CASCADE,
+        related_name="cadastre_job",
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Dotaz na katastr"
+        verbose_name_plural = "Fronta dotazů na katastr"
+        indexes = [
+            models.Index(fields=["status", "available_at"]),
+        ]
+
+    def __str__(self):
+        return f"Katastr pro WorkRecord #{self.work_record_id} ({self.status})"
+
+
+class ProjectRepriceJob(models.Model):
+    """
+    Queued repricing of all interventions of a project, enqueued when the project's pinned
+    price list changes and processed by `process_reprice_queue` (see tracker.project_pricing).
+    """
+
+    class Status(models.TextChoices):
+        PENDING = "pending", "Čeká"
+        RUNNING = "running", "Zpracovává se"
+        DONE = "done", "Hotovo"
+        FAILED = "failed", "Selhalo"
+
+    project = models.OneToOneField(
+        "Project",
+        on_delete=models.CASCADE,
+        related_name="reprice_job",
+    )
+    status = models.CharField(
+        max_length=16,
+        choices=Status.choices,
+        default=Status.PENDING,
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    available_at = models.DateTimeField(default=timezone.now)
+    locked_at = models.DateTimeField(null=True, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Přecenění projektu"
+        verbose_name_plural = "Fronta přecenění projektů"
+        indexes = [
+            models.Index(fields=["status", "available_at"]),
+        ]
+
+    def __str__(self):
+        return f"Přecenění projektu #{self.project_id} ({self.status})"
+
+
+class ProjectPriceTotal(models.Model):
+    """
+    Materialised sum of estimated intervention prices of a project's trees per intervention
+    status and category. Writes move the rows by deltas; batch jobs rebuild whole projects
+    (tracker.project_pricing).
+    """
+
+    project = models.ForeignKey(
+        "Project",
+        on_delete=models.CASCADE,
+        related_name="price_totals",
+    )
+    status = models.CharField(max_length=32, choices=INTERVENTION_STATUS_CHOICES)
+    category = models.CharField(max_length=100, blank=True)
+    intervention_count = models.PositiveIntegerField(default=0)
+    priced_count = models.PositiveIntegerField(default=0)
+    total_czk = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Součet cen projektu"
+        verbose_name_plural = "Součty cen projektů"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["project", "status", "category"],
+                name="unique_project_price_total",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.project_id} / {self.status} / {self.category}: {self.total_czk} Kč"
+
+
+class CadastreLookupCache(models.Model):
+    """
+    Persistent ČÚZK parcel lookup results per S-JTSK grid cell, shared by all workers.
+    Both `ok` and `not_found` answers are stored, each with its own expiry.
+    """
+
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    status = models.CharField(max_length=16)
+    result = models.JSONField(default=dict, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        verbose_name = "Uložený výsledek katastru"
+        verbose_name_plural = "Uložené výsledky katastru"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["cell_x", "cell_y"],
+                name="unique_cadastre_cache_cell",
+            )
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"]),
+        ]
+
+    def __str__(self):
+        return f"Katastr [{self.cell_x}, {self.cell_y}] ({self.status})"
+
+
+class TreeHeightEstimate(models.Model):
+    """
+    Last ČÚZK height estimate per tree and method, tied to the rounded S-JTSK cell it was
+    computed for; a moved tree no longer matches its cell and is estimated again.
+    """
+
+    work_record = models.ForeignKey(
+        "WorkRecord",
+        on_delete=models.CASCADE,
+        related_name="height_estimates",
+    )
+    method = models.CharField(max_length=16)
+    cell_x = models.IntegerField()
+    cell_y = models.IntegerField()
+    dmr_m = models.FloatField()
+    dmp_m = models.FloatField()
+    estimated_height_m = models.FloatField()
+    transform_method = models.CharField(max_length=32, blank=True, default="")
+    result = models.JSONField(default=dict, blank=True)
+    estimated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "Odhad výšky z ČÚZK"
+        verbose_name_plural = "Odhady výšky z ČÚZK"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["work_record", "method"],
+                name="unique_tree_height_estimate_method",
+            )
+        ]
+
+    def __str__(self):
+        return f"Odhad výšky #{self.work_record_id} ({self.method}): {self.estimated_height_m} m"
+
+
 def get_workrecord_lonlat(record: "WorkRecord"):
     if record.latitude is None or record.longitude is None:
         return None
@@ -1089,6 +1428,26 @@ def get_workrecord_lonlat(record: "WorkRecord"):
         return None
 
 
+def workrecord_sjtsk_from_lonlat(record: "WorkRecord") -> tuple[float | None, float | None]:
+    from .services.cuzk import CuzkHeightError, wgs84_to_sjtsk_with_fallback
+
+    lonlat = get_workrecord_lonlat(record)
+    if not lonlat:
+        return None, None
+    try:
+        x, y, _ = wgs84_to_sjtsk_with_fallback(*lonlat)
+    except CuzkHeightError:
+        return None, None
+    return x, y
+
+
+def get_workrecord_sjtsk(record: "WorkRecord"):
+    """Stored S-JTSK (x, y) of the tree, or None when it has no (projectable) location."""
+    if record.sjtsk_x is None or record.sjtsk_y is None:
+        return None
+    return record.sjtsk_x, record.sjtsk_y
+
+
 CUZK_CP_WFS_ENDPOINT = "https://services.cuzk.gov.cz/wfs/inspire-cp-wfs.asp"
 # TODO: Verify typename + available fields from GetCapabilities:
 # https://services.cuzk.gov.cz/wfs/inspire-cp-wfs.asp?service=WFS&request=GetCapabilities
@@ -1102,59 +1461,27 @@ def _debug_log(message: str, **extra):
 
 
 def _http_get(url: str, timeout_s: int = 3, retries: int = 1) -> tuple[int, str | None, bytes]:
-    last_err = None
-    for attempt in range(retries + 1):
-        try:
-            with urlopen(url, timeout=timeout_s) as resp:
-                status = resp.getcode()
-                content_type = resp.headers.get("Content-Type")
-                return status, content_type, resp.read()
-        except URLError as err:
-            last_err = err
-            _debug_log("cad_lookup http error", url=url, attempt=attempt, error=str(err))
-            if attempt >= retries:
-                raise
-    if last_err:
-        raise last_err
-    raise URLError("cad_lookup http error")
-
-
-def _build_wfs_url(bbox: tuple[float, float, float, float], version: str) -> str:
-    minx, miny, maxx, maxy = bbox
-    count = 1
-    params = {
-        "SERVICE": "WFS",
-        "REQUEST": "GetFeature",
-        "VERSION": version,
-        "TYPENAMES": CUZK_CP_WFS_TYPENAME,
-        "SRSNAME": "EPSG:4326",
-        "BBOX": f"{minx},{miny},{maxx},{maxy},EPSG:4326",
-    }
-    if version == "2.0.0":
-        params["COUNT"] = count
-    else:
-        params["MAXFEATURES"] = count
-    return f"{CUZK_CP_WFS_ENDPOINT}?{urlencode(params)}"
+    """GET through the shared ČÚZK client (keep-alive pool, backoff, circuit breaker)."""
+    import requests
 
+    from .services.cuzk_client import get_cuzk_client
 
-def _log_cad_response(url: str, status: int, content_type: str | None, payload: bytes) -> None:
-    text = payload.decode("utf-8", errors="replace")
-    root_tag = None
     try:
-        from xml.etree import ElementTree as ET
-
-        root = ET.fromstring(payload)
-        root_tag = root.tag.split("}")[-1]
-    except Exception:
-        root = None
-
-    is_exception = root_tag in ("ServiceExceptionReport", "ExceptionReport")
-    is_feature_collection = root_tag == "FeatureCollection"
-
-    if is_exception:
-        preview = text[:500]
+        resp = get_cuzk_client().get(url, timeout_s=timeout_s, retries=retries, service="cadastre")
+    except requests.RequestException as exc:
+        _debug_log("cad_lookup http error", url=url, error=str(exc))
+        raise URLError(str(exc)) from exc
+    return resp.status_code, resp.headers.get("Content-Type"), resp.content
+
+
+def _log_cad_response(
+    url: str, status: int, content_type: str | None, payload: bytes, scan: dict
+) -> None:
+    if scan["exception"] or scan["root"] != "FeatureCollection":
+        preview = payload[:500].decode("utf-8", errors="replace")
         logger.warning(
-            "cad_lookup service exception url=%s status=%s content_type=%s preview=%s",
+            "cad_lookup %s url=%s status=%s content_type=%s preview=%s",
+            "service exception" if scan["exception"] else "unexpected response",
             url,
             status,
             content_type,
@@ -1162,7 +1489,7 @@ def _log_cad_response(url: str, status: int, content_type: str | None, payload:
         )
         return
 
-    if is_feature_collection and settings.DEBUG:
+    if scan["root"] == "FeatureCollection" and settings.DEBUG:
         logger.debug(
             "cad_lookup ok url=%s status=%s content_type=%s preview=%s",
             url,
@@ -1263,53 +1590,45 @@ def _extract_parcel_fields_from_props(props: dict) -> dict:
     return {key: value for key, value in result.items() if value}
 
 
-def _parse_wfs_payload(payload: bytes) -> tuple[dict, bool]:
-    try:
-        from xml.etree import ElementTree as ET
+def _parse_wfs_payload(
+    url: str, status: int, content_type: str | None, payload: bytes
+) -> tuple[dict, bool]:
+    """
+    Scan the response once and return the first parcel's fields. Service exception reports
+    raise WfsExceptionReport and anything else that is not a FeatureCollection (HTML error
+    pages, empty or truncated bodies) raises WfsUnexpectedResponse, so both are retried
+    rather than cached as not_found.
+    """
+    from .services.parcels import WfsExceptionReport, WfsUnexpectedResponse, scan_wfs_response
 
-        root = ET.fromstring(payload)
-    except Exception:
-        return {}, False
-
-    features = []
-    for elem in root.iter():
-        if elem.tag.split("}")[-1].lower() == "cadastralparcel":
-            features.append(elem)
-    if not features:
-        return {}, False
-
-    feature = features[0]
-    local_id = None
-    namespace = None
-    national_ref = None
-
-    for elem in feature.iter():
-        tag = elem.tag.split("}")[-1]
-        text = elem.text.strip() if elem.text else ""
-        if not text:
-            continue
-        tag_lower = tag.lower()
-        if tag_lower == "localid" and local_id is None:
-            local_id = text
-        elif tag_lower == "namespace" and namespace is None:
-            namespace = text
-        if "nationalcadastralreference" in tag_lower and national_ref is None:
-            national_ref = text
-
-    parcel_number = national_ref or local_id
-    fields = {
-        "parcel_number": parcel_number,
-        "inspire_local_id": local_id,
-        "inspire_namespace": namespace,
-        "national_cadastral_reference": national_ref,
-    }
-    return {key: value for key, value in fields.items() if value}, True
+    scan = scan_wfs_response(payload)
+    _log_cad_response(url, status, content_type, payload, scan)
+    if scan["exception"]:
+        raise WfsExceptionReport(scan["root"])
+    if scan["root"] != "FeatureCollection":
+        raise WfsUnexpectedResponse(f"{status} {content_type} root={scan['root']}")
+    return scan["fields"], scan["found"]
 
 
-def _cad_lookup_by_point(lon: float, lat: float) -> dict:
+def _cad_lookup_by_point(lon: float, lat: float, sjtsk: tuple[float, float] | None = None) -> dict:
     from .services.cuzk import wgs84_to_sjtsk_with_fallback
+    from .services.parcels import lookup_parcel_sjtsk
 
-    x, y, transform_method = wgs84_to_sjtsk_with_fallback(lon, lat)
+    from .cadastre_cache import get_cached_cadastre, store_cadastre_result
+
+    if sjtsk is not None:
+        (x, y), transform_method = sjtsk, "stored"
+    else:
+        x, y, transform_method = wgs84_to_sjtsk_with_fallback(lon, lat)
+    local_fields = lookup_parcel_sjtsk(x, y)
+    if local_fields:
+        _debug_log("cad_lookup local hit", lon=lon, lat=lat, sjtsk_x=x, sjtsk_y=y)
+        local_fields["cad_lookup_status"] = "ok"
+        return local_fields
+    cached = get_cached_cadastre(x, y)
+    if cached is not None:
+        _debug_log("cad_lookup cache hit", lon=lon, lat=lat, sjtsk_x=x, sjtsk_y=y)
+        return cached
     point = (
         "<gml:Point xmlns:gml='http://www.opengis.net/gml/3.2' "
         "srsName='urn:ogc:def:crs:EPSG::5514'>"
@@ -1346,78 +1665,25 @@ def _cad_lookup_by_point(lon: float, lat: float) -> dict:
         content_type=content_type,
         size=len(payload),
     )
-    _log_cad_response(url, status, content_type, payload)
-    fields, found = _parse_wfs_payload(payload)
-    if found:
-        fields["cad_lookup_status"] = "ok"
-        return fields
-    return {"cad_lookup_status": "not_found"}
+    fields, found = _parse_wfs_payload(url, status, content_type, payload)
+    result = {**fields, "cad_lookup_status": "ok"} if found else {"cad_lookup_status": "not_found"}
+    store_cadastre_result(x, y, result)
+    return result
 
 
-@lru_cache(maxsize=2048)
-def _cached_cad_lookup(lon_round: float, lat_round: float) -> dict:
-    lon = float(lon_round)
-    lat = float(lat_round)
-    delta = 0.000001
-    bbox = (lon - delta, lat - delta, lon + delta, lat + delta)
-
-    url = _build_wfs_url(bbox, "2.0.0")
-    _debug_log("cad_lookup request", url=url, version="2.0.0", bbox=bbox)
-    try:
-        status, content_type, payload = _http_get(url, timeout_s=3, retries=1)
-        _debug_log(
-            "cad_lookup response",
-            url=url,
-            version="2.0.0",
-            status=status,
-            content_type=content_type,
-            size=len(payload),
-        )
-        _log_cad_response(url, status, content_type, payload)
-        fields, found = _parse_wfs_payload(payload)
-        if found:
-            fields["cad_lookup_status"] = "ok"
-            return fields
-    except Exception as err:
-        _debug_log("cad_lookup wfs 2.0.0 failed", error=str(err))
-
-    url = _build_wfs_url(bbox, "1.1.0")
-    _debug_log("cad_lookup request", url=url, version="1.1.0", bbox=bbox)
-    status, content_type, payload = _http_get(url, timeout_s=3, retries=1)
-    _debug_log(
-        "cad_lookup response",
-        url=url,
-        version="1.1.0",
-        status=status,
-        content_type=content_type,
-        size=len(payload),
-    )
-    _log_cad_response(url, status, content_type, payload)
-    fields, found = _parse_wfs_payload(payload)
-    if found:
-        fields["cad_lookup_status"] = "ok"
-        return fields
+def _mark_cadastre_lookup_error(tree: "WorkRecord") -> None:
+    tree.cad_lookup_status = "error"
+    tree.cad_lookup_at = timezone.now()
+    tree.save(update_fields=["cad_lookup_status", "cad_lookup_at"])
 
-    return {"cad_lookup_status": "not_found"}
 
+def _apply_cadastre_result(tree: "WorkRecord", result: dict) -> None:
+    update_fields = _set_cadastre_fields(tree, result)
+    tree.save(update_fields=update_fields)
 
-def _assign_cadastre_attributes(tree: "WorkRecord") -> None:
-    if tree.parcel_number:
-        return
-    lonlat = get_workrecord_lonlat(tree)
-    if not lonlat:
-        _debug_log("cad_lookup skipped (missing coords)", tree_id=tree.pk)
-        return
-    lon, lat = lonlat
-    try:
-        result = _cad_lookup_by_point(lon, lat)
-    except Exception as err:
-        _debug_log("cad_lookup error", tree_id=tree.pk, error=str(err))
-        tree.cad_lookup_status = "error"
-        tree.cad_lookup_at = timezone.now()
-        tree.save(update_fields=["cad_lookup_status", "cad_lookup_at"])
-        return
 
+def _set_cadastre_fields(tree: "WorkRecord", result: dict) -> list[str]:
+    """Copy a lookup result onto the tree (without saving); returns the changed fields."""
     update_fields = []
     for key in (
         "parcel_number",
@@ -1473,8 +1739,8 @@ def _assign_cadastre_attributes(tree: "WorkRecord") -> None:
     tree.cad_lookup_at = timezone.now()
     update_fields.append("cad_lookup_at")
 
-    # MVP without GeoDjango; later we can replace this with local parcel polygons + spatial joins.
-    tree.save(update_fields=list(dict.fromkeys(update_fields)))
+    # Without GeoDjango: covered areas come from the local parcel index (import_parcels).
+    return list(dict.fromkeys(update_fields))
 
 
 def _add_tree_to_system_dataset(tree: "WorkRecord") -> None:
@@ -1501,11 +1767,12 @@ def _assign_cadastre_on_create(sender, instance, created, **kwargs):
         return
     if os.getenv("ARBOMAP_DISABLE_CADASTRE_LOOKUP") == "1":
         return
-    try:
-        _assign_cadastre_attributes(instance)
-    except Exception:
-        # Do not block creation if cadastral lookup fails.
-        pass
+    if instance.parcel_number or not get_workrecord_lonlat(instance):
+        return
+    from .cadastre_queue import enqueue_cadastre_lookup
+
+    # The WFS call runs in `process_cadastre_queue`, never inside the creating request.
+    enqueue_cadastre_lookup(instance)
 
 
 @receiver(post_save, sender=TreeIntervention)
@@ -1517,8 +1784,217 @@ def _estimate_intervention_price_on_save(sender, instance, **kwargs):
 
 @receiver(post_save, sender=TreeAssessment)
 def _recalculate_intervention_prices_on_assessment(sender, instance, **kwargs):
-    from .pricing import apply_intervention_estimate
+    from .pricing import recalculate_prices
+
+    recalculate_prices(TreeIntervention.objects.filter(tree_id=instance.work_record_id))
+
+
+@receiver(post_save, sender=PriceListVersion)
+@receiver(post_delete, sender=PriceListVersion)
+@receiver(post_save, sender=PriceListItem)
+@receiver(post_delete, sender=PriceListItem)
+def _invalidate_price_list_index(sender, instance, **kwargs):
+    from .pricing import invalidate_price_list_index
 
-    interventions = instance.work_record.interventions.all()
-    for intervention in interventions:
-        apply_intervention_estimate(intervention)
+    invalidate_price_list_index()
+
+
+def _deleted_via_cascade(sender, origin) -> bool:
+    # Rows removed as part of deleting their WorkRecord must not recreate its summary.
+    if origin is None:
+        return False
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    return origin_model is not sender
+
+
+@receiver(post_save, sender=WorkRecord)
+def _create_tree_map_summary(sender, instance, created, **kwargs):
+    if not created:
+        return
+    from .map_summary import refresh_tree_map_summary
+
+    refresh_tree_map_summary(instance.pk)
+
+
+@receiver(post_save, sender=TreeIntervention)
+@receiver(post_save, sender=TreeAssessment)
+@receiver(post_save, sender=ShrubAssessment)
+@receiver(post_save, sender=PhotoDocumentation)
+def _refresh_tree_map_summary_on_save(sender, instance, **kwargs):
+    from .map_summary import refresh_tree_map_summary
+
+    refresh_tree_map_summary(_summary_tree_id(instance))
+
+
+@receiver(post_delete, sender=TreeIntervention)
+@receiver(post_delete, sender=TreeAssessment)
+@receiver(post_delete, sender=ShrubAssessment)
+@receiver(post_delete, sender=PhotoDocumentation)
+def _refresh_tree_map_summary_on_delete(sender, instance, origin=None, **kwargs):
+    if _deleted_via_cascade(sender, origin):
+        return
+    from .map_summary import refresh_tree_map_summary
+
+    refresh_tree_map_summary(_summary_tree_id(instance))
+
+
+def _summary_tree_id(instance):
+    if isinstance(instance, TreeIntervention):
+        return instance.tree_id
+    return instance.work_record_id
+
+
+@receiver(post_save, sender=WorkRecord)
+@receiver(post_delete, sender=WorkRecord)
+def _bump_map_revision_on_tree_change(sender, instance, update_fields=None, **kwargs):
+    from .map_changes import MAP_IGNORED_TREE_FIELDS, bump_map_revision, tree_project_ids
+
+    if update_fields is not None and set(update_fields) <= MAP_IGNORED_TREE_FIELDS:
+        return
+    bump_map_revision(tree_project_ids(instance.pk, instance.project_id), [instance.pk])
+
+
+@receiver(post_save, sender=TreeIntervention)
+@receiver(post_save, sender=TreeAssessment)
+@receiver(post_save, sender=ShrubAssessment)
+@receiver(post_delete, sender=TreeIntervention)
+@receiver(post_delete, sender=TreeAssessment)
+@receiver(post_delete, sender=ShrubAssessment)
+def _bump_map_revision_on_tree_detail_change(sender, instance, **kwargs):
+    from .map_changes import bump_map_revision, tree_project_ids
+
+    tree_id = _summary_tree_id(instance)
+    bump_map_revision(tree_project_ids(tree_id), [tree_id])
+
+
+@receiver(post_save, sender=ProjectTree)
+@receiver(post_delete, sender=ProjectTree)
+def _bump_map_revision_on_membership_change(sender, instance, **kwargs):
+    from .map_changes import bump_map_revision
+
+    bump_map_revision([instance.project_id], [instance.tree_id])
+
+
+@receiver(m2m_changed, sender=Project.trees.through)
+def _bump_map_revision_on_trees_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    # add() bulk-creates ProjectTree rows without signals; remove() and clear() delete
+    # them with signals, so the membership receiver above already logs those.
+    if action != "post_add" or not pk_set:
+        return
+    from .map_changes import bump_map_revision
+
+    if reverse:
+        bump_map_revision(pk_set, [instance.pk])
+    else:
+        bump_map_revision([instance.pk], pk_set)
+
+
+@receiver(m2m_changed, sender=Project.trees.through)
+def _check_price_lists_on_trees_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    if action != "pre_add" or not pk_set:
+        return
+    from .project_pricing import check_tree_link_price_lists
+
+    if reverse:
+        check_tree_link_price_lists(pk_set, [instance.pk])
+    else:
+        check_tree_link_price_lists([instance.pk], pk_set)
+
+
+@receiver(pre_save, sender=ProjectTree)
+def _check_price_lists_on_membership(sender, instance, **kwargs):
+    if not instance._state.adding:
+        return
+    from .project_pricing import check_tree_link_price_lists
+
+    check_tree_link_price_lists([instance.project_id], [instance.tree_id])
+
+
+@receiver(pre_save, sender=WorkRecord)
+def _check_price_lists_on_project_fk(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or instance.project_id is None:
+        return
+    if update_fields is not None and "project" not in update_fields:
+        return
+    stored_project_id = (
+        WorkRecord.objects.filter(pk=instance.pk).values_list("project_id", flat=True).first()
+    )
+    if stored_project_id == instance.project_id:
+        return
+    from .project_pricing import check_tree_link_price_lists
+
+    check_tree_link_price_lists([instance.project_id], [instance.pk])
+
+
+@receiver(pre_save, sender=TreeIntervention)
+@receiver(pre_delete, sender=TreeIntervention)
+def _snapshot_intervention_price_total(sender, instance, origin=None, **kwargs):
+    if _deleted_via_cascade(sender, origin):
+        return
+    from .project_pricing import intervention_price_snapshot
+
+    instance._price_total_before = (
+        intervention_price_snapshot(instance.pk) if instance.pk else None
+    )
+
+
+@receiver(post_save, sender=TreeIntervention)
+@receiver(post_delete, sender=TreeIntervention)
+def _update_project_price_totals_on_intervention(sender, instance, origin=None, **kwargs):
+    # Registered after the pricing receiver, so the saved row already carries its new price.
+    if _deleted_via_cascade(sender, origin):
+        # Deleting the tree removes its memberships, which subtract its interventions.
+        return
+    from .project_pricing import apply_price_total_changes, intervention_price_snapshot
+
+    after = None if kwargs.get("signal") is post_delete else intervention_price_snapshot(instance.pk)
+    apply_price_total_changes(
+        removed=[getattr(instance, "_price_total_before", None)], added=[after]
+    )
+
+
+def _membership_deleted_with_project(origin) -> bool:
+    origin_model = origin.model if isinstance(origin, QuerySet) else type(origin)
+    # The project's totals are deleted along with it.
+    return origin is not None and origin_model is Project
+
+
+@receiver(pre_delete, sender=ProjectTree)
+def _snapshot_membership_price_totals(sender, instance, origin=None, **kwargs):
+    # Taken before the delete starts: a cascade from the tree removes its interventions too.
+    if _membership_deleted_with_project(origin):
+        return
+    from .project_pricing import tree_price_snapshots
+
+    instance._price_total_snapshots = tree_price_snapshots([instance.tree_id])
+
+
+@receiver(post_save, sender=ProjectTree)
+@receiver(post_delete, sender=ProjectTree)
+def _update_project_price_totals_on_membership(sender, instance, created=False, origin=None, **kwargs):
+    from .project_pricing import apply_price_total_changes, tree_price_snapshots
+
+    if kwargs.get("signal") is post_save:
+        if created:
+            apply_price_total_changes(
+                added=tree_price_snapshots([instance.tree_id]), project_ids=[instance.project_id]
+            )
+    elif not _membership_deleted_with_project(origin):
+        apply_price_total_changes(
+            removed=getattr(instance, "_price_total_snapshots", ()),
+            project_ids=[instance.project_id],
+        )
+
+
+@receiver(m2m_changed, sender=Project.trees.through)
+def _update_project_price_totals_on_trees_m2m(sender, instance, action, reverse, pk_set, **kwargs):
+    # add() bulk-creates ProjectTree rows without signals; remove() and clear() delete
+    # them one by one, so the ProjectTree receivers above already cover those.
+    if action != "post_add" or not pk_set:
+        return
+    from .project_pricing import apply_price_total_changes, tree_price_snapshots
+
+    if reverse:
+        apply_price_total_changes(added=tree_price_snapshots([instance.pk]), project_ids=pk_set)
+    else:
+        apply_price_total_changes(added=tree_price_snapshots(pk_set), project_ids=[instance.pk])
@@ -1,11 +1,26 @@
 from __future__ import annotations
 
+import math
+import threading
+import time
+from bisect import bisect_left, bisect_right
+from collections import defaultdict
 from decimal import Decimal
 from typing import Any
 
-from django.db.models import Q
+from .models import (
+    PriceListItem,
+    PriceListVersion,
+    ProjectTree,
+    TreeAssessment,
+    TreeIntervention,
+    WorkRecord,
+)
 
-from .models import PriceListItem, PriceListVersion
+NOO_PRICE_LIST_CODE = "NOO_2026"
+NOO_ACTIVITY_CODE = "ZE41"
+# How often a process checks whether the loaded price list index is still current.
+PRICE_LIST_INDEX_CHECK_S = 30.0
 
 
 BASE_PRICE_BANDS = [
@@ -90,60 +105,135 @@ def _map_intervention_operation_type(intervention) -> tuple[str, str, str | None
     return "zdravotni", "fallback", code or name or None
 
 
-def _lookup_noo_base_price(area_m2: float | None, operation_type: str) -> tuple[int | None, dict]:
+class PriceListIndex:
+    """
+    Banded items of one price list version per (activity_code, operation_type), sorted by
+    band start. `reach[i]` is the highest band end among the first i + 1 bands, so the
+    first band containing an area is found with two bisects instead of a query.
+    """
+
+    def __init__(self, items):
+        grouped = defaultdict(list)
+        for item in items:
+            if item.is_combo or item.band_min_m2 is None:
+                continue
+            grouped[(item.activity_code, item.operation_type)].append(
+                (item.band_min_m2, item.pk, item.band_max_m2, int(item.price_czk), item.item_code)
+            )
+        self.bands = {}
+        for key, rows in grouped.items():
+            rows.sort()
+            reach = []
+            for row in rows:
+                band_max = math.inf if row[2] is None else row[2]
+                reach.append(max(reach[-1], band_max) if reach else band_max)
+            self.bands[key] = ([row[0] for row in rows], reach, rows)
+
+    def __len__(self):
+        return sum(len(rows) for _, _, rows in self.bands.values())
+
+    def lookup(self, activity_code: str, operation_type: str, area_m2: float) -> tuple | None:
+        """(band_min, band_max, price_czk, item_code) of the band covering `area_m2`, or None."""
+        entry = self.bands.get((activity_code, operation_type))
+        if entry is None:
+            return None
+        mins, reach, rows = entry
+        index = bisect_left(reach, area_m2)
+        if index >= bisect_right(mins, area_m2):
+            return None
+        band_min, _, band_max, price_czk, item_code = rows[index]
+        return band_min, band_max, price_czk, item_code
+
+
+_loaded_lock = threading.Lock()
+_loaded_price_indexes: dict[str, dict] = {}
+
+
+def load_price_list_index(code: str = NOO_PRICE_LIST_CODE) -> PriceListIndex | None:
+    """
+    Index of the price list version `code`, or None when it is not imported. The version
+    is checked at most every PRICE_LIST_INDEX_CHECK_S and reloaded when it was reimported.
+    """
+    with _loaded_lock:
+        loaded = _loaded_price_indexes.get(code)
+        now = time.monotonic()
+        if loaded and now - loaded["checked_at"] < PRICE_LIST_INDEX_CHECK_S:
+            return loaded["index"]
+        version = PriceListVersion.objects.filter(code=code).only("pk", "imported_at").first()
+        key = (version.pk, version.imported_at) if version else None
+        if not loaded or loaded["key"] != key:
+            index = PriceListIndex(version.items.all()) if version else None
+            loaded = _loaded_price_indexes[code] = {"key": key, "index": index}
+        loaded["checked_at"] = now
+        return loaded["index"]
+
+
+def invalidate_price_list_index() -> None:
+    with _loaded_lock:
+        _loaded_price_indexes.clear()
+
+
+def _lookup_noo_base_price(
+    area_m2: float | None, operation_type: str, index: PriceListIndex | None = None
+) -> tuple[int | None, dict]:
+    fallback = {
+        "base_price_source": "fallback",
+        "base_price_item_code": None,
+        "base_price_operation_type": operation_type,
+        "base_price_band": None,
+        "mapped_operation_type_source": None,
+        "mapped_operation_type_raw": None,
+    }
     if area_m2 is None:
-        return None, {
-            "base_price_source": "fallback",
-            "base_price_item_code": None,
-            "base_price_operation_type": operation_type,
-            "base_price_band": None,
-            "mapped_operation_type_source": None,
-            "mapped_operation_type_raw": None,
-        }
-    version = PriceListVersion.objects.filter(code="NOO_2026").first()
-    if not version:
-        return None, {
-            "base_price_source": "fallback",
-            "base_price_item_code": None,
-            "base_price_operation_type": operation_type,
-            "base_price_band": None,
-            "mapped_operation_type_source": None,
-            "mapped_operation_type_raw": None,
-        }
-    item = (
-        PriceListItem.objects.filter(
-            version=version,
-            activity_code="ZE41",
-            is_combo=False,
-            operation_type=operation_type,
-            band_min_m2__isnull=False,
-        )
-        .filter(Q(band_max_m2__isnull=True) | Q(band_max_m2__gte=area_m2))
-        .filter(band_min_m2__lte=area_m2)
-        .order_by("band_min_m2")
-        .first()
-    )
-    if not item:
-        return None, {
-            "base_price_source": "fallback",
-            "base_price_item_code": None,
-            "base_price_operation_type": operation_type,
-            "base_price_band": None,
-            "mapped_operation_type_source": None,
-            "mapped_operation_type_raw": None,
-        }
-    return int(item.price_czk), {
+        return None, fallback
+    if index is None:
+        index = load_price_list_index()
+    band = index.lookup(NOO_ACTIVITY_CODE, operation_type, area_m2) if index else None
+    if band is None:
+        return None, fallback
+    band_min, band_max, price_czk, item_code = band
+    return price_czk, {
         "base_price_source": "NOO_DB",
-        "base_price_item_code": item.item_code,
+        "base_price_item_code": item_code,
         "base_price_operation_type": operation_type,
-        "base_price_band": _format_band_label(item.band_min_m2, item.band_max_m2),
+        "base_price_band": _format_band_label(band_min, band_max),
         "mapped_operation_type_source": None,
         "mapped_operation_type_raw": None,
     }
 
 
+def tree_price_list_codes(tree_ids) -> dict[int, str]:
+    """
+    Price list code per tree id: the version pinned by the tree's own project, else by the
+    first (lowest id) linked project with a pin, else NOO_PRICE_LIST_CODE. Project.clean
+    rejects pins that differ on shared trees, so only unpinned projects follow another
+    project's list.
+    """
+    tree_ids = list(tree_ids)
+    codes = {}
+    for tree_id, code in (
+        ProjectTree.objects.filter(tree_id__in=tree_ids, project__price_list_version__isnull=False)
+        .order_by("project_id")
+        .values_list("tree_id", "project__price_list_version__code")
+    ):
+        codes.setdefault(tree_id, code)
+    codes.update(
+        WorkRecord.objects.filter(
+            pk__in=tree_ids, project__price_list_version__isnull=False
+        ).values_list("pk", "project__price_list_version__code")
+    )
+    return {tree_id: codes.get(tree_id, NOO_PRICE_LIST_CODE) for tree_id in tree_ids}
+
+
 def estimate_intervention_price(intervention) -> tuple[int | None, dict]:
     assessment = getattr(intervention.tree, "latest_assessment", None)
+    code = tree_price_list_codes([intervention.tree_id])[intervention.tree_id]
+    return _estimate_intervention_price(intervention, assessment, load_price_list_index(code))
+
+
+def _estimate_intervention_price(
+    intervention, assessment, index: PriceListIndex | None = None
+) -> tuple[int | None, dict]:
     if not assessment:
         return None, {
             "base_price_czk": None,
@@ -163,7 +253,7 @@ def estimate_intervention_price(intervention) -> tuple[int | None, dict]:
         if height is not None and width is not None:
             area_m2 = height * width
     operation_type, mapped_source, mapped_raw = _map_intervention_operation_type(intervention)
-    base_price, base_meta = _lookup_noo_base_price(area_m2, operation_type)
+    base_price, base_meta = _lookup_noo_base_price(area_m2, operation_type, index)
     base_meta["mapped_operation_type_source"] = mapped_source
     base_meta["mapped_operation_type_raw"] = mapped_raw
     if base_price is None:
@@ -198,6 +288,11 @@ def estimate_intervention_price(intervention) -> tuple[int | None, dict]:
         "notes": notes,
         **base_meta,
     }
+    if assessment.is_height_draft:
+        # The crown area comes from an estimated height that nobody has confirmed yet.
+        breakdown["height_m_source"] = assessment.height_m_source
+        if estimated is not None:
+            breakdown["notes"] = "Výška stromu je návrh k potvrzení."
     return estimated, breakdown
 
 
@@ -211,3 +306,74 @@ def apply_intervention_estimate(intervention) -> None:
         estimated_price_czk=estimated,
         estimated_price_breakdown=breakdown,
     )
+
+
+def latest_tree_assessments(tree_ids) -> dict[int, TreeAssessment]:
+    """Latest assessment per tree id (same order as WorkRecord.latest_assessment)."""
+    latest = {}
+    for assessment in TreeAssessment.objects.filter(work_record_id__in=tree_ids).order_by(
+        "work_record_id", "-assessed_at", "-id"
+    ):
+        latest.setdefault(assessment.work_record_id, assessment)
+    return latest
+
+
+def recalculate_prices(interventions, batch_size: int = 500, refresh_totals: bool = True) -> int:
+    """
+    Reprice a TreeIntervention queryset in batches: per batch one query for interventions
+    with their types, one for the trees' latest assessments, two for the trees' price list
+    pins and one bulk_update of the rows whose estimate changed. Bypasses post_save
+    signals but moves the project price totals by the changed prices, unless the caller
+    refreshes them itself (`refresh_totals=False`). Returns the changed row count.
+    """
+    from .project_pricing import apply_price_total_changes
+
+    ids = list(interventions.order_by("pk").values_list("pk", flat=True))
+    changed = 0
+    for start in range(0, len(ids), batch_size):
+        batch = list(
+            TreeIntervention.objects.filter(pk__in=ids[start : start + batch_size])
+            .select_related("intervention_type")
+            .order_by("pk")
+        )
+        tree_ids = {intervention.tree_id for intervention in batch}
+        latest = latest_tree_assessments(tree_ids)
+        codes = tree_price_list_codes(tree_ids)
+        to_update = []
+        old_prices = []
+        for intervention in batch:
+            estimated, breakdown = _estimate_intervention_price(
+                intervention,
+                latest.get(intervention.tree_id),
+                load_price_list_index(codes[intervention.tree_id]),
+            )
+            if (
+                intervention.estimated_price_czk == estimated
+                and intervention.estimated_price_breakdown == breakdown
+            ):
+                continue
+            old_prices.append(intervention.estimated_price_czk)
+            intervention.estimated_price_czk = estimated
+            intervention.estimated_price_breakdown = breakdown
+            to_update.append(intervention)
+        TreeIntervention.objects.bulk_update(
+            to_update, ["estimated_price_czk", "estimated_price_breakdown"]
+        )
+        changed += len(to_update)
+        if refresh_totals:
+            snapshots = [
+                (
+                    intervention.tree_id,
+                    intervention.status,
+                    intervention.intervention_type.category or "",
+                )
+                for intervention in to_update
+            ]
+            apply_price_total_changes(
+                removed=[key + (price,) for key, price in zip(snapshots, old_prices)],
+                added=[
+                    key + (intervention.estimated_price_czk,)
+                    for key, intervention in zip(snapshots, to_update)
+                ],
+            )
+    return changed
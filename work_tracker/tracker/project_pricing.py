@@ -0,0 +1,324 @@
+from __future__ import annotations
+
+import logging
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+from django.utils import timezone
+
+from .models import (
+    Project,
+    ProjectPriceTotal,
+    ProjectRepriceJob,
+    ProjectTree,
+    TreeIntervention,
+    WorkRecord,
+)
+from .pricing import recalculate_prices
+
+logger = logging.getLogger(__name__)
+
+REPRICE_JOB_MAX_ATTEMPTS = 3
+# Retry delay doubles per attempt: 1, 2 minutes.
+REPRICE_JOB_RETRY_BASE = timedelta(minutes=1)
+# A running job whose worker died is handed out again after this long.
+REPRICE_JOB_STALE_AFTER = timedelta(minutes=30)
+
+
+def project_interventions(project):
+    return TreeIntervention.objects.filter(tree__in=project.trees.all())
+
+
+def price_list_conflicts(project, price_list_version_id):
+    """
+    Other projects pinned to a different price list that share trees with `project`
+    (through Project.trees or the legacy WorkRecord.project FK). Unpinned projects never
+    conflict: their shared trees follow the pinned project, see tree_price_list_codes.
+    """
+    shared_trees = WorkRecord.objects.filter(Q(projects=project) | Q(project=project))
+    return (
+        Project.objects.filter(
+            Q(pk__in=ProjectTree.objects.filter(tree__in=shared_trees).values("project_id"))
+            | Q(pk__in=shared_trees.values("project_id"))
+        )
+        .exclude(pk=project.pk)
+        .exclude(price_list_version__isnull=True)
+        .exclude(price_list_version_id=price_list_version_id)
+    )
+
+
+def check_tree_link_price_lists(project_ids, tree_ids) -> None:
+    """
+    Raise ValidationError when linking the trees to the projects would put a tree into
+    projects pinned to different price lists (the rule Project.clean enforces for pins).
+    """
+    pinned = dict(
+        Project.objects.filter(pk__in=list(project_ids), price_list_version__isnull=False)
+        .values_list("pk", "price_list_version_id")
+    )
+    if not pinned:
+        return
+    versions = set(pinned.values())
+    tree_ids = list(tree_ids)
+    other_pins = Q(project__price_list_version__isnull=False) & ~Q(project_id__in=list(pinned))
+    existing = ProjectTree.objects.filter(other_pins, tree_id__in=tree_ids).values_list(
+        "project__name", "project__price_list_version_id"
+    )
+    legacy = WorkRecord.objects.filter(other_pins, pk__in=tree_ids).values_list(
+        "project__name", "project__price_list_version_id"
+    )
+    conflicts = sorted(
+        {name for name, version_id in [*existing, *legacy] if {version_id} != versions}
+    )
+    if len(versions) > 1 and not conflicts:
+        conflicts = sorted(
+            Project.objects.filter(pk__in=list(pinned)).values_list("name", flat=True)
+        )
+    if conflicts:
+        raise ValidationError(
+            "Strom nelze přidat: sdílel by se s projekty s jiným ceníkem: "
+            f"{', '.join(conflicts[:5])}."
+        )
+
+
+def refresh_project_price_totals(project_ids) -> None:
+    """
+    Rebuild the ProjectPriceTotal rows of the given projects with one grouped query. Single
+    writes move the totals by deltas (apply_price_total_changes); this is for batches.
+    """
+    project_ids = sorted({pk for pk in (project_ids or ()) if pk})
+    if not project_ids:
+        return
+    with transaction.atomic():
+        # Serialises concurrent refreshes of the same project (a no-op on SQLite).
+        list(Project.objects.select_for_update().filter(pk__in=project_ids).values_list("pk"))
+        rows = (
+            ProjectTree.objects.filter(project_id__in=project_ids)
+            .values(
+                "project_id",
+                "tree__interventions__status",
+                "tree__interventions__intervention_type__category",
+            )
+            .annotate(
+                intervention_count=Count("tree__interventions"),
+                priced_count=Count("tree__interventions__estimated_price_czk"),
+                total_czk=Sum("tree__interventions__estimated_price_czk"),
+            )
+            .order_by()
+        )
+        totals = [
+            ProjectPriceTotal(
+                project_id=row["project_id"],
+                status=row["tree__interventions__status"],
+                category=row["tree__interventions__intervention_type__category"] or "",
+                intervention_count=row["intervention_count"],
+                priced_count=row["priced_count"],
+                total_czk=row["total_czk"] or 0,
+            )
+            for row in rows
+            # Trees without interventions come back as a single row without a status.
+            if row["tree__interventions__status"] is not None
+        ]
+        ProjectPriceTotal.objects.filter(project_id__in=project_ids).delete()
+        ProjectPriceTotal.objects.bulk_create(totals)
+
+
+def refresh_tree_project_price_totals(tree_ids) -> None:
+    refresh_project_price_totals(
+        ProjectTree.objects.filter(tree_id__in=list(tree_ids)).values_list("project_id", flat=True)
+    )
+
+
+def intervention_price_snapshot(intervention_id):
+    """(tree_id, status, category, price) of a stored intervention, None if it does not exist."""
+    row = (
+        TreeIntervention.objects.filter(pk=intervention_id)
+        .values_list("tree_id", "status", "intervention_type__category", "estimated_price_czk")
+        .first()
+    )
+    if row is None:
+        return None
+    tree_id, status, category, price = row
+    return tree_id, status, category or "", price
+
+
+def tree_price_snapshots(tree_ids) -> list:
+    """Price snapshots of all interventions of the given trees."""
+    return [
+        (tree_id, status, category or "", price)
+        for tree_id, status, category, price in TreeIntervention.objects.filter(
+            tree_id__in=list(tree_ids)
+        ).values_list("tree_id", "status", "intervention_type__category", "estimated_price_czk")
+    ]
+
+
+def apply_price_total_changes(removed=(), added=(), project_ids=None) -> None:
+    """
+    Move ProjectPriceTotal rows by the difference between the `removed` and `added` price
+    snapshots instead of recomputing the projects. Each snapshot counts for every project
+    of its tree, or for `project_ids` when given (membership changes).
+    """
+    deltas = defaultdict(lambda: [0, 0, 0])
+    snapshots = [(snapshot, -1) for snapshot in removed if snapshot] + [
+        (snapshot, 1) for snapshot in added if snapshot
+    ]
+    if not snapshots:
+        return
+    if project_ids is None:
+        tree_projects = defaultdict(list)
+        for project_id, tree_id in ProjectTree.objects.filter(
+            tree_id__in={snapshot[0] for snapshot, _ in snapshots}
+        ).values_list("project_id", "tree_id"):
+            tree_projects[tree_id].append(project_id)
+    for (tree_id, status, category, price), sign in snapshots:
+        for project_id in tree_projects[tree_id] if project_ids is None else project_ids:
+            delta = deltas[(project_id, status, category)]
+            delta[0] += sign
+            delta[1] += sign if price is not None else 0
+            delta[2] += sign * (price or 0)
+    emptied = set()
+    out_of_sync = set()
+    for (project_id, status, category), (count, priced, total) in sorted(deltas.items()):
+        if not (count or priced or total) or project_id in out_of_sync:
+            continue
+        if not _add_to_price_total(project_id, status, category, count, priced, total):
+            out_of_sync.add(project_id)
+        elif count < 0:
+            emptied.add(project_id)
+    if emptied:
+        ProjectPriceTotal.objects.filter(project_id__in=emptied, intervention_count=0).delete()
+    if out_of_sync:
+        # Deltas need a row to apply to; rebuild projects whose totals lost one.
+        logger.warning("project price totals out of sync project_ids=%s", sorted(out_of_sync))
+        refresh_project_price_totals(out_of_sync)
+
+
+def _add_to_price_total(project_id, status, category, count, priced, total) -> bool:
+    rows = ProjectPriceTotal.objects.filter(project_id=project_id, status=status, category=category)
+    changes = {
+        "intervention_count": F("intervention_count") + count,
+        "priced_count": F("priced_count") + priced,
+        "total_czk": F("total_czk") + total,
+        "updated_at": timezone.now(),
+    }
+    if rows.update(**changes):
+        return True
+    if count <= 0:
+        return False
+    try:
+        with transaction.atomic():
+            ProjectPriceTotal.objects.create(
+                project_id=project_id,
+                status=status,
+                category=category,
+                intervention_count=count,
+                priced_count=priced,
+                total_czk=total,
+            )
+    except IntegrityError:
+        # A concurrent writer created the row first.
+        rows.update(**changes)
+    return True
+
+
+def project_price_totals(project) -> dict:
+    """
+    Materialised price totals of a project: `rows` per (status, category), sums per
+    status and the overall sum and counts. Reads ProjectPriceTotal only.
+    """
+    rows = list(project.price_totals.order_by("status", "category"))
+    by_status = Counter()
+    for row in rows:
+        by_status[row.status] += row.total_czk
+    return {
+        "rows": rows,
+        "by_status": dict(by_status),
+        "total_czk": sum(row.total_czk for row in rows),
+        "intervention_count": sum(row.intervention_count for row in rows),
+        "priced_count": sum(row.priced_count for row in rows),
+    }
+
+
+def enqueue_project_reprice(project: Project) -> None:
+    """Queue (or re-queue) repricing of all interventions of the project."""
+    ProjectRepriceJob.objects.update_or_create(
+        project=project,
+        defaults={
+            "status": ProjectRepriceJob.Status.PENDING,
+            "attempts": 0,
+            "available_at": timezone.now(),
+            "locked_at": None,
+            "last_error": "",
+        },
+    )
+
+
+def claim_project_reprice_jobs(limit: int) -> list[ProjectRepriceJob]:
+    """Lock up to `limit` due jobs for this worker with conditional UPDATEs."""
+    now = timezone.now()
+    due = (
+        ProjectRepriceJob.objects.filter(
+            Q(status=ProjectRepriceJob.Status.PENDING, available_at__lte=now)
+            | Q(status=ProjectRepriceJob.Status.RUNNING, locked_at__lt=now - REPRICE_JOB_STALE_AFTER)
+        )
+        .order_by("available_at", "pk")
+        .values_list("pk", "status", "locked_at")[: limit * 2]
+    )
+    claimed_ids = []
+    for job_id, status, locked_at in due:
+        claimed = ProjectRepriceJob.objects.filter(
+            pk=job_id, status=status, locked_at=locked_at
+        ).update(
+            status=ProjectRepriceJob.Status.RUNNING,
+            locked_at=now,
+            attempts=F("attempts") + 1,
+        )
+        if claimed:
+            claimed_ids.append(job_id)
+        if len(claimed_ids) >= limit:
+            break
+    return list(
+        ProjectRepriceJob.objects.filter(pk__in=claimed_ids)
+        .select_related("project")
+        .order_by("available_at", "pk")
+    )
+
+
+def _finish(job: ProjectRepriceJob, **fields) -> None:
+    # Matching locked_at keeps a job re-queued while it was running (the pin changed
+    # again) pending instead of marking it done.
+    ProjectRepriceJob.objects.filter(
+        pk=job.pk, status=ProjectRepriceJob.Status.RUNNING, locked_at=job.locked_at
+    ).update(locked_at=None, updated_at=timezone.now(), **fields)
+
+
+def run_project_reprice_jobs(limit: int = 10) -> Counter:
+    """Reprice the projects of one batch of due jobs. Returns outcome counts."""
+    outcomes = Counter()
+    for job in claim_project_reprice_jobs(limit):
+        try:
+            recalculate_prices(project_interventions(job.project), refresh_totals=False)
+        except Exception as err:
+            logger.warning(
+                "project reprice failed project_id=%s attempt=%s error=%s",
+                job.project_id,
+                job.attempts,
+                err,
+            )
+            if job.attempts >= REPRICE_JOB_MAX_ATTEMPTS:
+                status = ProjectRepriceJob.Status.FAILED
+                available_at = timezone.now()
+            else:
+                status = ProjectRepriceJob.Status.PENDING
+                available_at = timezone.now() + REPRICE_JOB_RETRY_BASE * (2 ** (job.attempts - 1))
+            _finish(job, status=status, available_at=available_at, last_error=str(err)[:1000])
+            outcomes[status] += 1
+            continue
+        # One rebuild per job, also when only membership or categories moved.
+        refresh_project_price_totals([job.project_id])
+        _finish(job, status=ProjectRepriceJob.Status.DONE, last_error="")
+        outcomes[ProjectRepriceJob.Status.DONE] += 1
+    return outcomes
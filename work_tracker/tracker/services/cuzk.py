@@ -1,9 +1,14 @@
 import json
 import logging
 import math
+import statistics
 import time
+from concurrent.futures import FIRST_EXCEPTION, ThreadPoolExecutor, wait
 
 import requests
+from django.core.cache import cache
+
+from .cuzk_client import get_cuzk_client
 
 logger = logging.getLogger(__name__)
 
@@ -12,17 +17,34 @@ DMP1G_IMAGE_SERVER = "https://ags.cuzk.gov.cz/arcgis2/rest/services/dmp1g/ImageS
 DMP_OK_IMAGE_SERVER = "https://ags.cuzk.gov.cz/arcgis2/rest/services/dmp_obrazova_korelace/ImageServer"
 CUZK_HEIGHT_SOURCE = "CUZK DMP OK - DMR 5G"
 DEFAULT_TIMEOUT_S = 5
+# Overall budget for one height estimate; the DMR and DMP requests run concurrently.
+HEIGHT_ESTIMATE_DEADLINE_S = 8
 _SJTKS_TRANSFORMER = None
+# Crown-aware estimate: grid around the tree, DMP percentile over the crown.
+CROWN_RADIUS_M = 3.0
+CROWN_STEP_M = 1.0
+CROWN_PERCENTILE = 90
+RASTER_SAMPLES_CACHE_TIMEOUT = 30 * 24 * 60 * 60
+# ImageServer getSamples caps the sample count per request (maxSampleCount).
+GET_SAMPLES_MAX_POINTS = 500
+_HEIGHT_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix="cuzk-height")
+# Bulk estimates run on their own small pool (one thread per raster) under an overall
+# deadline, so a long batch never holds the interactive pool above.
+HEIGHT_BATCH_DEADLINE_S = 120
+_HEIGHT_BATCH_EXECUTOR = ThreadPoolExecutor(max_workers=2, thread_name_prefix="cuzk-height-batch")
 
 
 class CuzkHeightError(Exception):
     pass
 
 
-def _http_get_json(url: str, params: dict, timeout_s: int = DEFAULT_TIMEOUT_S) -> dict:
+def _http_json(method: str, url: str, params: dict, timeout_s: float) -> dict:
+    client = get_cuzk_client()
     try:
-        response = requests.get(url, params=params, timeout=timeout_s)
-        response.raise_for_status()
+        if method == "POST":
+            response = client.post(url, data=params, timeout_s=timeout_s, service="height")
+        else:
+            response = client.get(url, params=params, timeout_s=timeout_s, service="height")
         return response.json()
     except requests.Timeout as exc:
         logger.warning("cuzk height request timeout url=%s", url)
@@ -35,99 +57,140 @@ def _http_get_json(url: str, params: dict, timeout_s: int = DEFAULT_TIMEOUT_S) -
         raise CuzkHeightError("ČÚZK vrátil neplatnou JSON odpověď.") from exc
 
 
-def wgs84_to_sjtsk(lon: float, lat: float) -> tuple[float, float]:
-    a_wgs = 6378137.0
-    f_wgs = 1 / 298.257223563
-    e2_wgs = 2 * f_wgs - f_wgs * f_wgs
-
-    lat_rad = math.radians(lat)
-    lon_rad = math.radians(lon)
-    sin_lat = math.sin(lat_rad)
-    cos_lat = math.cos(lat_rad)
-    sin_lon = math.sin(lon_rad)
-    cos_lon = math.cos(lon_rad)
-
-    n_wgs = a_wgs / math.sqrt(1 - e2_wgs * sin_lat * sin_lat)
-    x = n_wgs * cos_lat * cos_lon
-    y = n_wgs * cos_lat * sin_lon
-    z = n_wgs * (1 - e2_wgs) * sin_lat
+def _http_get_json(url: str, params: dict, timeout_s: int = DEFAULT_TIMEOUT_S) -> dict:
+    return _http_json("GET", url, params, timeout_s)
 
-    dx, dy, dz = 589.0, 76.0, 480.0
-    x -= dx
-    y -= dy
-    z -= dz
 
-    a = 6377397.155
-    f = 1 / 299.1528128
-    e2 = 2 * f - f * f
+def _http_post_json(url: str, params: dict, timeout_s: int = DEFAULT_TIMEOUT_S) -> dict:
+    return _http_json("POST", url, params, timeout_s)
 
-    p = math.sqrt(x * x + y * y)
-    lat_b = math.atan2(z, p * (1 - e2))
-    for _ in range(10):
-        sin_lat_b = math.sin(lat_b)
-        n_b = a / math.sqrt(1 - e2 * sin_lat_b * sin_lat_b)
-        lat_b = math.atan2(z + e2 * n_b * sin_lat_b, p)
-    lon_b = math.atan2(y, x)
 
+def _krovak_constants() -> dict:
+    """WGS84 -> Bessel datum shift and Křovák projection constants, computed once."""
+    f_wgs = 1 / 298.257223563
+    f_bessel = 1 / 299.1528128
     phi0 = 0.863937979737193
-    lam0 = 0.4334234309119251
-    k0 = 0.9999
     es = 0.006674372230614
     e = math.sqrt(es)
     s0 = 1.37008346281555
     uq = 1.04216856380474
+    k0 = 0.9999
 
     alpha = math.sqrt(1.0 + (es * math.cos(phi0) ** 4) / (1.0 - es))
     u0 = math.asin(math.sin(phi0) / alpha)
     g = ((1 + e * math.sin(phi0)) / (1 - e * math.sin(phi0))) ** (alpha * e / 2.0)
-    k = (
-        math.tan(u0 / 2.0 + math.pi / 4.0)
-        / (math.tan(phi0 / 2.0 + math.pi / 4.0) ** alpha)
-        * g
-    )
+    k = math.tan(u0 / 2.0 + math.pi / 4.0) / (math.tan(phi0 / 2.0 + math.pi / 4.0) ** alpha) * g
     n0 = math.sqrt(1 - es) / (1 - es * math.sin(phi0) ** 2)
     n = math.sin(s0)
     rho0 = k0 * n0 / math.tan(s0)
     ad = math.pi / 2.0 - uq
+    return {
+        "a_wgs": 6378137.0,
+        "e2_wgs": 2 * f_wgs - f_wgs * f_wgs,
+        "shift": (589.0, 76.0, 480.0),
+        "a": 6377397.155,
+        "e2": 2 * f_bessel - f_bessel * f_bessel,
+        "lam0": 0.4334234309119251,
+        "e": e,
+        "alpha": alpha,
+        "k": k,
+        "n": n,
+        "cos_ad": math.cos(ad),
+        "sin_ad": math.sin(ad),
+        "rho_s0": rho0 * (math.tan(s0 / 2.0 + math.pi / 4.0) ** n),
+    }
+
+
+_KROVAK = _krovak_constants()
+
+
+def wgs84_to_sjtsk(lon: float, lat: float) -> tuple[float, float]:
+    c = _KROVAK
+    lat_rad = math.radians(lat)
+    lon_rad = math.radians(lon)
+    sin_lat = math.sin(lat_rad)
+    cos_lat = math.cos(lat_rad)
 
+    n_wgs = c["a_wgs"] / math.sqrt(1 - c["e2_wgs"] * sin_lat * sin_lat)
+    dx, dy, dz = c["shift"]
+    x = n_wgs * cos_lat * math.cos(lon_rad) - dx
+    y = n_wgs * cos_lat * math.sin(lon_rad) - dy
+    z = n_wgs * (1 - c["e2_wgs"]) * sin_lat - dz
+
+    a, e2 = c["a"], c["e2"]
+    p = math.sqrt(x * x + y * y)
+    lat_b = math.atan2(z, p * (1 - e2))
+    for _ in range(10):
+        sin_lat_b = math.sin(lat_b)
+        n_b = a / math.sqrt(1 - e2 * sin_lat_b * sin_lat_b)
+        lat_b = math.atan2(z + e2 * n_b * sin_lat_b, p)
+    lon_b = math.atan2(y, x)
+
+    e, alpha = c["e"], c["alpha"]
     gfi = ((1 + e * math.sin(lat_b)) / (1 - e * math.sin(lat_b))) ** (alpha * e / 2.0)
     u = 2.0 * (
-        math.atan(k * (math.tan(lat_b / 2.0 + math.pi / 4.0) ** alpha) / gfi)
+        math.atan(c["k"] * (math.tan(lat_b / 2.0 + math.pi / 4.0) ** alpha) / gfi)
         - math.pi / 4.0
     )
-    deltav = -(lon_b - lam0) * alpha
-    s = math.asin(math.cos(ad) * math.sin(u) + math.sin(ad) * math.cos(u) * math.cos(deltav))
+    deltav = -(lon_b - c["lam0"]) * alpha
+    s = math.asin(c["cos_ad"] * math.sin(u) + c["sin_ad"] * math.cos(u) * math.cos(deltav))
     cos_s = math.cos(s)
     if abs(cos_s) < 1e-12:
         raise CuzkHeightError("Souřadnice se nepodařilo převést do S-JTSK.")
     d = math.asin(math.cos(u) * math.sin(deltav) / cos_s)
-    eps = n * d
-    rho = rho0 * (math.tan(s0 / 2.0 + math.pi / 4.0) ** n) / (
-        math.tan(s / 2.0 + math.pi / 4.0) ** n
-    )
-    xk = rho * math.cos(eps)
-    yk = rho * math.sin(eps)
-
-    xk, yk = yk, xk
-    xk = -xk
-    yk = -yk
-
-    xk *= a
-    yk *= a
-    return xk, yk
-
-
-def wgs84_to_sjtsk_pyproj(lon: float, lat: float) -> tuple[float, float]:
+    eps = c["n"] * d
+    rho = c["rho_s0"] / (math.tan(s / 2.0 + math.pi / 4.0) ** c["n"])
+    # Křovák axes: X points south and Y west; EPSG:5514 negates and swaps them.
+    return -rho * math.sin(eps) * a, -rho * math.cos(eps) * a
+
+
+def _wgs84_to_sjtsk_numpy(np, lons, lats):
+    c = _KROVAK
+    lat_rad = np.radians(np.asarray(lats, dtype=float))
+    lon_rad = np.radians(np.asarray(lons, dtype=float))
+    sin_lat = np.sin(lat_rad)
+    cos_lat = np.cos(lat_rad)
+
+    n_wgs = c["a_wgs"] / np.sqrt(1 - c["e2_wgs"] * sin_lat * sin_lat)
+    dx, dy, dz = c["shift"]
+    x = n_wgs * cos_lat * np.cos(lon_rad) - dx
+    y = n_wgs * cos_lat * np.sin(lon_rad) - dy
+    z = n_wgs * (1 - c["e2_wgs"]) * sin_lat - dz
+
+    a, e2 = c["a"], c["e2"]
+    p = np.sqrt(x * x + y * y)
+    lat_b = np.arctan2(z, p * (1 - e2))
+    for _ in range(10):
+        sin_lat_b = np.sin(lat_b)
+        n_b = a / np.sqrt(1 - e2 * sin_lat_b * sin_lat_b)
+        lat_b = np.arctan2(z + e2 * n_b * sin_lat_b, p)
+    lon_b = np.arctan2(y, x)
+
+    e, alpha = c["e"], c["alpha"]
+    gfi = ((1 + e * np.sin(lat_b)) / (1 - e * np.sin(lat_b))) ** (alpha * e / 2.0)
+    u = 2.0 * (np.arctan(c["k"] * (np.tan(lat_b / 2.0 + np.pi / 4.0) ** alpha) / gfi) - np.pi / 4.0)
+    deltav = -(lon_b - c["lam0"]) * alpha
+    s = np.arcsin(c["cos_ad"] * np.sin(u) + c["sin_ad"] * np.cos(u) * np.cos(deltav))
+    d = np.arcsin(np.cos(u) * np.sin(deltav) / np.cos(s))
+    eps = c["n"] * d
+    rho = c["rho_s0"] / (np.tan(s / 2.0 + np.pi / 4.0) ** c["n"])
+    return -rho * np.sin(eps) * a, -rho * np.cos(eps) * a
+
+
+def _sjtsk_transformer():
+    """Shared WGS84 -> S-JTSK pyproj transformer, created on first use."""
     global _SJTKS_TRANSFORMER
-    try:
-        from pyproj import Transformer
-    except ImportError as exc:
-        raise CuzkHeightError("pyproj není dostupný pro převod souřadnic.") from exc
-
     if _SJTKS_TRANSFORMER is None:
+        try:
+            from pyproj import Transformer
+        except ImportError as exc:
+            raise CuzkHeightError("pyproj není dostupný pro převod souřadnic.") from exc
         _SJTKS_TRANSFORMER = Transformer.from_crs("EPSG:4326", "EPSG:5514", always_xy=True)
+    return _SJTKS_TRANSFORMER
+
 
-    x, y = _SJTKS_TRANSFORMER.transform(lon, lat)
+def wgs84_to_sjtsk_pyproj(lon: float, lat: float) -> tuple[float, float]:
+    x, y = _sjtsk_transformer().transform(lon, lat)
     if not math.isfinite(x) or not math.isfinite(y):
         raise CuzkHeightError("Souřadnice se nepodařilo převést do S-JTSK pomocí pyproj.")
     return x, y
@@ -143,7 +206,44 @@ def wgs84_to_sjtsk_with_fallback(lon: float, lat: float) -> tuple[float, float,
         return x, y, "manual-fallback"
 
 
-def wgs84_to_sjtsk_for_height_estimate(lon: float, lat: float) -> tuple[float, float, str]:
+def wgs84_to_sjtsk_many(lons, lats) -> tuple[list[float], list[float], str]:
+    """
+    Batch WGS84 -> S-JTSK for sequences (or arrays) of lon/lat: one pyproj array call,
+    else the Křovák fallback. NumPy is not a requirement; the fallback is vectorised
+    with it when it happens to be installed and otherwise runs point by point.
+    """
+    if len(lons) != len(lats):
+        raise ValueError("lons and lats must have the same length")
+    if not len(lons):
+        return [], [], "pyproj"
+    try:
+        xs, ys = _sjtsk_transformer().transform(lons, lats)
+        xs, ys = list(xs), list(ys)
+        if all(math.isfinite(value) for value in xs) and all(math.isfinite(value) for value in ys):
+            return xs, ys, "pyproj"
+        logger.warning("pyproj batch transform returned non-finite values; using manual transform")
+    except Exception as exc:
+        # Array input can fail in pyproj (ProjError, TypeError, ValueError) where single
+        # points would not; the Křovák transform below handles either.
+        logger.warning("pyproj coordinate transform failed; falling back to manual transform: %s", exc)
+
+    try:
+        import numpy as np
+    except ImportError:
+        points = [wgs84_to_sjtsk(float(lon), float(lat)) for lon, lat in zip(lons, lats)]
+        return [x for x, _ in points], [y for _, y in points], "manual-fallback"
+    with np.errstate(all="ignore"):
+        xs, ys = _wgs84_to_sjtsk_numpy(np, lons, lats)
+    if not (np.isfinite(xs).all() and np.isfinite(ys).all()):
+        raise CuzkHeightError("Souřadnice se nepodařilo převést do S-JTSK.")
+    return xs.tolist(), ys.tolist(), "manual-fallback"
+
+
+def wgs84_to_sjtsk_for_height_estimate(
+    lon: float, lat: float, sjtsk: tuple[float, float] | None = None
+) -> tuple[float, float, str]:
+    if sjtsk is not None:
+        return sjtsk[0], sjtsk[1], "stored"
     return wgs84_to_sjtsk_with_fallback(lon, lat)
 
 
@@ -190,14 +290,98 @@ def get_image_server_pixel_value(
     return _parse_pixel_value(payload, service_label)
 
 
-def estimate_tree_height_from_cuzk(lat: float, lon: float) -> dict:
+def _parse_sample_values(payload: dict, count: int, service_label: str) -> list[float | None]:
+    if "error" in payload:
+        message = payload["error"].get("message") if isinstance(payload["error"], dict) else None
+        raise CuzkHeightError(f"ČÚZK {service_label} vrátil chybu: {message or 'neznámá chyba'}.")
+
+    values = [None] * count
+    for sample in payload.get("samples") or []:
+        if not isinstance(sample, dict):
+            continue
+        location_id = sample.get("locationId")
+        if not isinstance(location_id, int) or not 0 <= location_id < count:
+            continue
+        try:
+            value = float(sample.get("value"))
+        except (TypeError, ValueError):
+            continue
+        if math.isfinite(value):
+            values[location_id] = value
+    return values
+
+
+def get_image_server_samples(
+    image_server_url: str,
+    points: list[tuple[float, float]],
+    service_label: str,
+    timeout_s: int = DEFAULT_TIMEOUT_S,
+    deadline_at: float | None = None,
+) -> list[float | None]:
+    """
+    Raster values for S-JTSK points via multipoint getSamples, in input order (None for
+    NoData). Points are sent in chunks of GET_SAMPLES_MAX_POINTS, one POST per chunk;
+    with `deadline_at` (a time.perf_counter() value) no chunk starts after it and each
+    request timeout is capped to the time left.
+    """
+    samples_url = f"{image_server_url.rstrip('/')}/getSamples"
+    values = []
+    for start in range(0, len(points), GET_SAMPLES_MAX_POINTS):
+        if deadline_at is not None:
+            remaining_s = deadline_at - time.perf_counter()
+            if remaining_s <= 0:
+                raise CuzkHeightError("Dotaz na ČÚZK vypršel.")
+            timeout_s = min(timeout_s, remaining_s)
+        chunk = [[x, y] for x, y in points[start : start + GET_SAMPLES_MAX_POINTS]]
+        geometry = {"points": chunk, "spatialReference": {"wkid": 5514}}
+        params = {
+            "f": "json",
+            "geometry": json.dumps(geometry, separators=(",", ":")),
+            "geometryType": "esriGeometryMultipoint",
+            "returnFirstValueOnly": "true",
+            "returnGeometry": "false",
+        }
+        payload = _http_post_json(samples_url, params=params, timeout_s=timeout_s)
+        values.extend(_parse_sample_values(payload, len(chunk), service_label))
+    return values
+
+
+def _run_timed_parallel(
+    tasks: dict, start: float, deadline_s: float, executor: ThreadPoolExecutor = _HEIGHT_EXECUTOR
+) -> dict:
+    """Run {name: (fn, *args)} on the height pool; {name: (value, ms)} or raise on error/deadline."""
+    futures = {name: executor.submit(_timed_call, *task) for name, task in tasks.items()}
+    remaining_s = max(0.0, deadline_s - (time.perf_counter() - start))
+    done, not_done = wait(futures.values(), timeout=remaining_s, return_when=FIRST_EXCEPTION)
+    for future in done:
+        if future.exception() is not None:
+            for pending in not_done:
+                pending.cancel()
+            raise future.exception()
+    if not_done:
+        for future in not_done:
+            future.cancel()
+        logger.warning("cuzk height estimate deadline exceeded deadline_s=%s", deadline_s)
+        raise CuzkHeightError("Dotaz na ČÚZK vypršel.")
+    return {name: future.result() for name, future in futures.items()}
+
+
+def _timed_call(fn, *args):
     start = time.perf_counter()
-    sjtsk_x, sjtsk_y, transform_method = wgs84_to_sjtsk_for_height_estimate(lon, lat)
-    dmr_m = get_image_server_pixel_value(DMR5G_IMAGE_SERVER, sjtsk_x, sjtsk_y, "DMR 5G")
-    dmp_m = get_image_server_pixel_value(DMP_OK_IMAGE_SERVER, sjtsk_x, sjtsk_y, "DMP OK")
-    estimated_height_m = dmp_m - dmr_m
-    duration_ms = int(round((time.perf_counter() - start) * 1000))
+    value = fn(*args)
+    return value, int(round((time.perf_counter() - start) * 1000))
+
 
+def _height_result(
+    dmr_m: float,
+    dmp_m: float,
+    start: float,
+    breakdown: dict,
+    sjtsk_x: float,
+    sjtsk_y: float,
+    transform_method: str,
+) -> dict:
+    estimated_height_m = dmp_m - dmr_m
     warnings = []
     if estimated_height_m < 0:
         warnings.append("Odhad výšky je záporný; bod nemusí ležet na koruně stromu nebo data nejsou vhodná.")
@@ -209,10 +393,215 @@ def estimate_tree_height_from_cuzk(lat: float, lon: float) -> dict:
         "dmr_m": round(dmr_m, 3),
         "dmp_m": round(dmp_m, 3),
         "estimated_height_m": round(estimated_height_m, 3),
-        "duration_ms": duration_ms,
+        "duration_ms": int(round((time.perf_counter() - start) * 1000)),
+        "duration_ms_breakdown": breakdown,
         "source": CUZK_HEIGHT_SOURCE,
         "sjtsk_x": sjtsk_x,
         "sjtsk_y": sjtsk_y,
         "transform_method": transform_method,
         "warnings": warnings,
     }
+
+
+def estimate_tree_height_from_cuzk(
+    lat: float,
+    lon: float,
+    deadline_s: float = HEIGHT_ESTIMATE_DEADLINE_S,
+    sjtsk: tuple[float, float] | None = None,
+) -> dict:
+    """
+    DMP OK minus DMR 5G at the tree point. Both rasters are queried in parallel and the
+    whole estimate gives up after `deadline_s`; `duration_ms_breakdown` has per-step timings.
+    A known S-JTSK point (`sjtsk`) is used as is instead of projecting lat/lon.
+    """
+    start = time.perf_counter()
+    sjtsk_x, sjtsk_y, transform_method = wgs84_to_sjtsk_for_height_estimate(lon, lat, sjtsk)
+    transform_ms = int(round((time.perf_counter() - start) * 1000))
+    timeout_s = min(DEFAULT_TIMEOUT_S, deadline_s)
+    results = _run_timed_parallel(
+        {
+            "dmr": (
+                get_image_server_pixel_value,
+                DMR5G_IMAGE_SERVER,
+                sjtsk_x,
+                sjtsk_y,
+                "DMR 5G",
+                timeout_s,
+            ),
+            "dmp": (
+                get_image_server_pixel_value,
+                DMP_OK_IMAGE_SERVER,
+                sjtsk_x,
+                sjtsk_y,
+                "DMP OK",
+                timeout_s,
+            ),
+        },
+        start,
+        deadline_s,
+    )
+    (dmr_m, dmr_ms), (dmp_m, dmp_ms) = results["dmr"], results["dmp"]
+    breakdown = {"transform": transform_ms, "dmr": dmr_ms, "dmp": dmp_ms}
+    return _height_result(dmr_m, dmp_m, start, breakdown, sjtsk_x, sjtsk_y, transform_method)
+
+
+def circle_grid_points(
+    sjtsk_x: float, sjtsk_y: float, radius_m: float, step_m: float
+) -> list[tuple[float, float]]:
+    """Square grid of `step_m` spacing clipped to a circle of `radius_m` around the point."""
+    if radius_m <= 0 or step_m <= 0:
+        raise ValueError("radius_m and step_m must be greater than 0")
+    points = []
+    steps = int(radius_m // step_m)
+    offsets = [round(i * step_m, 6) for i in range(-steps, steps + 1)]
+    for dx in offsets:
+        for dy in offsets:
+            if dx * dx + dy * dy <= radius_m * radius_m + 1e-9:
+                points.append((sjtsk_x + dx, sjtsk_y + dy))
+    return points
+
+
+def _percentile(values: list[float], percentile: float) -> float:
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percentile / 100 * len(ordered)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def _cached_raster_samples(
+    service: str,
+    image_server_url: str,
+    service_label: str,
+    points: list[tuple[float, float]],
+    cache_key: str,
+    timeout_s: float,
+) -> list[float | None]:
+    key = f"cuzk-samples:{service}:{cache_key}"
+    values = cache.get(key)
+    if values is None:
+        values = get_image_server_samples(image_server_url, points, service_label, timeout_s=timeout_s)
+        cache.set(key, values, RASTER_SAMPLES_CACHE_TIMEOUT)
+    return values
+
+
+def estimate_crown_height_from_cuzk(
+    lat: float,
+    lon: float,
+    radius_m: float = CROWN_RADIUS_M,
+    step_m: float = CROWN_STEP_M,
+    percentile: float = CROWN_PERCENTILE,
+    deadline_s: float = HEIGHT_ESTIMATE_DEADLINE_S,
+    sjtsk: tuple[float, float] | None = None,
+) -> dict:
+    """
+    Crown-aware estimate: one getSamples request per raster over a small grid around the
+    tree, then the `percentile` of DMP OK minus the median of DMR 5G, so a single pixel
+    hitting a gap in the crown does not drag the height to zero. Raster samples are
+    cached, so re-estimating the same spot does not call ČÚZK again.
+    """
+    start = time.perf_counter()
+    sjtsk_x, sjtsk_y, transform_method = wgs84_to_sjtsk_for_height_estimate(lon, lat, sjtsk)
+    transform_ms = int(round((time.perf_counter() - start) * 1000))
+    points = circle_grid_points(sjtsk_x, sjtsk_y, radius_m, step_m)
+    cache_key = f"{sjtsk_x:.1f}:{sjtsk_y:.1f}:{radius_m:g}:{step_m:g}"
+    timeout_s = min(DEFAULT_TIMEOUT_S, deadline_s)
+    results = _run_timed_parallel(
+        {
+            "dmr": (
+                _cached_raster_samples,
+                "dmr",
+                DMR5G_IMAGE_SERVER,
+                "DMR 5G",
+                points,
+                cache_key,
+                timeout_s,
+            ),
+            "dmp": (
+                _cached_raster_samples,
+                "dmp",
+                DMP_OK_IMAGE_SERVER,
+                "DMP OK",
+                points,
+                cache_key,
+                timeout_s,
+            ),
+        },
+        start,
+        deadline_s,
+    )
+    (dmr_values, dmr_ms), (dmp_values, dmp_ms) = results["dmr"], results["dmp"]
+    dmr_values = [value for value in dmr_values if value is not None]
+    dmp_values = [value for value in dmp_values if value is not None]
+    if not dmr_values:
+        raise CuzkHeightError("ČÚZK DMR 5G nevrátil výškovou hodnotu pro okolí bodu.")
+    if not dmp_values:
+        raise CuzkHeightError("ČÚZK DMP OK nevrátil výškovou hodnotu pro okolí bodu.")
+
+    breakdown = {"transform": transform_ms, "dmr": dmr_ms, "dmp": dmp_ms}
+    result = _height_result(
+        statistics.median(dmr_values),
+        _percentile(dmp_values, percentile),
+        start,
+        breakdown,
+        sjtsk_x,
+        sjtsk_y,
+        transform_method,
+    )
+    result.update(
+        {
+            "method": "crown",
+            "sample_count": len(points),
+            "percentile": percentile,
+            "dmp_max_m": round(max(dmp_values), 3),
+        }
+    )
+    return result
+
+
+def estimate_tree_heights_from_cuzk(
+    points: list[tuple[float, float]],
+    timeout_s: int = DEFAULT_TIMEOUT_S,
+    deadline_s: float = HEIGHT_BATCH_DEADLINE_S,
+) -> list[dict | None]:
+    """
+    Heights for many S-JTSK points at once: DMR 5G and DMP OK are sampled with chunked
+    getSamples requests (both services in parallel on the batch pool). Points without
+    data on either raster give None; the whole batch gives up after `deadline_s`.
+    """
+    if not points:
+        return []
+    start = time.perf_counter()
+    deadline_at = start + deadline_s
+    results = _run_timed_parallel(
+        {
+            "dmr": (
+                get_image_server_samples,
+                DMR5G_IMAGE_SERVER,
+                points,
+                "DMR 5G",
+                timeout_s,
+                deadline_at,
+            ),
+            "dmp": (
+                get_image_server_samples,
+                DMP_OK_IMAGE_SERVER,
+                points,
+                "DMP OK",
+                timeout_s,
+                deadline_at,
+            ),
+        },
+        start,
+        deadline_s,
+        executor=_HEIGHT_BATCH_EXECUTOR,
+    )
+    (dmr_values, _dmr_ms), (dmp_values, _dmp_ms) = results["dmr"], results["dmp"]
+    return [
+        {
+            "dmr_m": round(dmr_m, 3),
+            "dmp_m": round(dmp_m, 3),
+            "estimated_height_m": round(dmp_m - dmr_m, 3),
+        }
+        if dmr_m is not None and dmp_m is not None
+        else None
+        for dmr_m, dmp_m in zip(dmr_values, dmp_values)
+    ]
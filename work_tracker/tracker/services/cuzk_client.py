@@ -0,0 +1,170 @@
+import logging
+import random
+import threading
+import time
+from urllib.parse import urlsplit
+
+import requests
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+# Shared HTTP client for ČÚZK services (cadastre WFS, ImageServer heights, RÚIAN downloads).
+# Settings override the defaults below, e.g. CUZK_HTTP_TIMEOUT_S = 10.
+DEFAULT_TIMEOUT_S = 5
+DEFAULT_RETRIES = 1
+DEFAULT_BACKOFF_S = 0.5
+DEFAULT_POOL_MAXSIZE = 8
+# Consecutive failed calls to one host that open its circuit, and how long it stays open.
+DEFAULT_CIRCUIT_FAILURES = 5
+DEFAULT_CIRCUIT_RESET_S = 60
+USER_AGENT = "work_tracker/1.0"
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class CuzkCircuitOpen(requests.ConnectionError):
+    """Raised without a request while a host's circuit is open."""
+
+
+def _option(value, setting_name: str, default):
+    return value if value is not None else getattr(settings, setting_name, default)
+
+
+class CuzkClient:
+    """
+    One requests.Session with a per-host keep-alive pool. Transient failures (connection
+    errors, timeouts, 429/5xx) are retried with jittered exponential backoff; after
+    `circuit_failures` failed calls in a row a host is short-circuited for `circuit_reset_s`,
+    then a single failure opens it again until a call succeeds.
+    """
+
+    def __init__(
+        self,
+        timeout_s: float | None = None,
+        retries: int | None = None,
+        backoff_s: float | None = None,
+        pool_maxsize: int | None = None,
+        circuit_failures: int | None = None,
+        circuit_reset_s: float | None = None,
+    ):
+        self.timeout_s = _option(timeout_s, "CUZK_HTTP_TIMEOUT_S", DEFAULT_TIMEOUT_S)
+        self.retries = _option(retries, "CUZK_HTTP_RETRIES", DEFAULT_RETRIES)
+        self.backoff_s = _option(backoff_s, "CUZK_HTTP_BACKOFF_S", DEFAULT_BACKOFF_S)
+        self.circuit_failures = _option(circuit_failures, "CUZK_CIRCUIT_FAILURES", DEFAULT_CIRCUIT_FAILURES)
+        self.circuit_reset_s = _option(circuit_reset_s, "CUZK_CIRCUIT_RESET_S", DEFAULT_CIRCUIT_RESET_S)
+        pool_maxsize = _option(pool_maxsize, "CUZK_HTTP_POOL_MAXSIZE", DEFAULT_POOL_MAXSIZE)
+
+        self.session = requests.Session()
+        self.session.headers["User-Agent"] = USER_AGENT
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self._lock = threading.Lock()
+        self._circuits = {}
+        self._metrics = {}
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url: str, **kwargs) -> requests.Response:
+        return self.request("POST", url, **kwargs)
+
+    def request(
+        self,
+        method: str,
+        url: str,
+        params=None,
+        data=None,
+        timeout_s: float | None = None,
+        retries: int | None = None,
+        service: str = "",
+    ) -> requests.Response:
+        """Send a request; non-2xx responses raise requests.HTTPError after retries."""
+        host = urlsplit(url).netloc
+        service = service or host
+        timeout_s = timeout_s if timeout_s is not None else self.timeout_s
+        retries = retries if retries is not None else self.retries
+        self._check_circuit(host)
+
+        for attempt in range(retries + 1):
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, params=params, data=data, timeout=timeout_s)
+                if response.status_code in RETRY_STATUS_CODES:
+                    response.raise_for_status()
+            except (requests.ConnectionError, requests.Timeout, requests.HTTPError) as exc:
+                self._record(service, start, ok=False)
+                logger.debug("cuzk http error service=%s attempt=%s error=%s", service, attempt, exc)
+                if attempt >= retries:
+                    self._record_failure(host)
+                    raise
+                delay = self.backoff_s * (2**attempt)
+                time.sleep(delay * random.uniform(0.5, 1.5))
+                continue
+            self._record(service, start, ok=response.ok)
+            self._record_success(host)
+            response.raise_for_status()
+            return response
+        raise requests.ConnectionError(f"ČÚZK request failed: {url}")
+
+    def _check_circuit(self, host: str) -> None:
+        with self._lock:
+            circuit = self._circuits.get(host)
+            if circuit and circuit["open_until"] > time.monotonic():
+                raise CuzkCircuitOpen(f"ČÚZK host {host} is unavailable (circuit open).")
+
+    def _record_failure(self, host: str) -> None:
+        with self._lock:
+            circuit = self._circuits.setdefault(host, {"failures": 0, "open_until": 0.0})
+            circuit["failures"] += 1
+            if circuit["failures"] >= self.circuit_failures:
+                circuit["open_until"] = time.monotonic() + self.circuit_reset_s
+                logger.warning(
+                    "cuzk circuit open host=%s failures=%s reset_s=%s",
+                    host,
+                    circuit["failures"],
+                    self.circuit_reset_s,
+                )
+
+    def _record_success(self, host: str) -> None:
+        with self._lock:
+            self._circuits.pop(host, None)
+
+    def _record(self, service: str, start: float, ok: bool) -> None:
+        duration_ms = (time.perf_counter() - start) * 1000
+        with self._lock:
+            stats = self._metrics.setdefault(
+                service, {"calls": 0, "errors": 0, "total_ms": 0.0, "max_ms": 0.0}
+            )
+            stats["calls"] += 1
+            stats["errors"] += 0 if ok else 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+        logger.debug("cuzk http service=%s ok=%s duration_ms=%.1f", service, ok, duration_ms)
+
+    def metrics(self) -> dict:
+        """Per-service latency counters: calls, errors, avg_ms and max_ms."""
+        with self._lock:
+            return {
+                service: {
+                    "calls": stats["calls"],
+                    "errors": stats["errors"],
+                    "avg_ms": round(stats["total_ms"] / stats["calls"], 1) if stats["calls"] else 0.0,
+                    "max_ms": round(stats["max_ms"], 1),
+                }
+                for service, stats in self._metrics.items()
+            }
+
+
+_client_lock = threading.Lock()
+_client = None
+
+
+def get_cuzk_client() -> CuzkClient:
+    """Process-wide client, so every caller shares the same connection pools and circuits."""
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = CuzkClient()
+        return _client
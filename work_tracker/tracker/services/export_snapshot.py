@@ -63,6 +63,8 @@ def _assessment_snapshot(assessment):
         "stem_diameters_cm_list": assessment.stem_diameters_cm_list,
         "stem_circumferences_cm_list": assessment.stem_circumferences_cm_list,
         "height_m": assessment.height_m,
+        "height_m_source": assessment.height_m_source,
+        "height_source_label": assessment.get_height_source_label(),
         "crown_width_m": assessment.crown_width_m,
         "crown_area_m2": assessment.crown_area_m2,
         "physiological_age": assessment.physiological_age,
@@ -0,0 +1,188 @@
+import math
+import struct
+
+# Minimal Mapbox Vector Tile (spec 2.1) encoder for point/line layers.
+# Only the subset used by the map feed is implemented; no external dependency.
+
+DEFAULT_EXTENT = 4096
+
+GEOM_POINT = 1
+GEOM_LINESTRING = 2
+
+_CMD_MOVE_TO = 1
+_CMD_LINE_TO = 2
+
+_WIRE_VARINT = 0
+_WIRE_64BIT = 1
+_WIRE_LENGTH = 2
+
+
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    value &= 0xFFFFFFFFFFFFFFFF
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _key(field: int, wire_type: int) -> bytes:
+    return _varint((field << 3) | wire_type)
+
+
+def _length_delimited(field: int, payload: bytes) -> bytes:
+    return _key(field, _WIRE_LENGTH) + _varint(len(payload)) + payload
+
+
+def _packed(field: int, values) -> bytes:
+    return _length_delimited(field, b"".join(_varint(v) for v in values))
+
+
+def _encode_value(value) -> bytes:
+    if isinstance(value, bool):
+        return _key(7, _WIRE_VARINT) + _varint(int(value))
+    if isinstance(value, int):
+        return _key(6, _WIRE_VARINT) + _varint(_zigzag(value))
+    if isinstance(value, float):
+        return _key(3, _WIRE_64BIT) + struct.pack("<d", value)
+    return _length_delimited(1, str(value).encode("utf-8"))
+
+
+def _command(command_id: int, count: int) -> int:
+    return (command_id & 0x7) | (count << 3)
+
+
+def _encode_geometry(geometry_type: int, coords: list[tuple[int, int]]) -> list[int]:
+    cursor_x = 0
+    cursor_y = 0
+    parts = []
+
+    def delta(point):
+        nonlocal cursor_x, cursor_y
+        dx = point[0] - cursor_x
+        dy = point[1] - cursor_y
+        cursor_x, cursor_y = point
+        return [_zigzag(dx), _zigzag(dy)]
+
+    if geometry_type == GEOM_POINT:
+        parts.append(_command(_CMD_MOVE_TO, 1))
+        parts.extend(delta(coords[0]))
+        return parts
+
+    parts.append(_command(_CMD_MOVE_TO, 1))
+    parts.extend(delta(coords[0]))
+    parts.append(_command(_CMD_LINE_TO, len(coords) - 1))
+    for point in coords[1:]:
+        parts.extend(delta(point))
+    return parts
+
+
+def _normalize_property(value):
+    if value is None:
+        return None
+    if isinstance(value, (list, tuple, set)):
+        return ",".join(str(item) for item in value)
+    if isinstance(value, (bool, int, float, str)):
+        return value
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return str(value)
+
+
+def encode_layer(name: str, features: list[dict], extent: int = DEFAULT_EXTENT) -> bytes:
+    """
+    Encode one layer. Each feature is a dict with keys
+    ``id``, ``type`` (GEOM_POINT / GEOM_LINESTRING), ``coords`` (tile coordinates)
+    and ``properties``. ``None`` properties are omitted, lists are joined by commas.
+    """
+    keys: dict[str, int] = {}
+    values: dict[tuple, int] = {}
+    encoded_features = []
+
+    for feature in features:
+        coords = feature["coords"]
+        geometry_type = feature.get("type", GEOM_POINT)
+        if not coords or (geometry_type == GEOM_LINESTRING and len(coords) < 2):
+            continue
+        tags = []
+        for prop_key, raw_value in (feature.get("properties") or {}).items():
+            value = _normalize_property(raw_value)
+            if value is None:
+                continue
+            key_index = keys.setdefault(prop_key, len(keys))
+            value_index = values.setdefault((type(value), value), len(values))
+            tags.extend((key_index, value_index))
+
+        body = b""
+        feature_id = feature.get("id")
+        if feature_id is not None and feature_id >= 0:
+            body += _key(1, _WIRE_VARINT) + _varint(int(feature_id))
+        if tags:
+            body += _packed(2, tags)
+        body += _key(3, _WIRE_VARINT) + _varint(geometry_type)
+        body += _packed(4, _encode_geometry(geometry_type, coords))
+        encoded_features.append(_length_delimited(2, body))
+
+    if not encoded_features:
+        return b""
+
+    layer = _key(15, _WIRE_VARINT) + _varint(2)
+    layer += _length_delimited(1, name.encode("utf-8"))
+    layer += b"".join(encoded_features)
+    for prop_key in keys:
+        layer += _length_delimited(3, prop_key.encode("utf-8"))
+    for value_type, value in values:
+        layer += _length_delimited(4, _encode_value(value))
+    layer += _key(5, _WIRE_VARINT) + _varint(extent)
+    return layer
+
+
+def encode_tile(layers: dict[str, list[dict]], extent: int = DEFAULT_EXTENT) -> bytes:
+    out = b""
+    for name, features in layers.items():
+        layer = encode_layer(name, features, extent=extent)
+        if layer:
+            out += _length_delimited(3, layer)
+    return out
+
+
+def tile_to_lonlat(z: int, x: float, y: float) -> tuple[float, float]:
+    n = 2 ** z
+    lon = x / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return lon, lat
+
+
+def tile_bounds(z: int, x: int, y: int, buffer_ratio: float = 0.0) -> tuple[float, float, float, float]:
+    """Return (min_lon, min_lat, max_lon, max_lat) of the tile, optionally buffered."""
+    min_lon, max_lat = tile_to_lonlat(z, x - buffer_ratio, y - buffer_ratio)
+    max_lon, min_lat = tile_to_lonlat(z, x + 1 + buffer_ratio, y + 1 + buffer_ratio)
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def lonlat_to_tile_coords(
+    lon: float,
+    lat: float,
+    z: int,
+    x: int,
+    y: int,
+    extent: int = DEFAULT_EXTENT,
+) -> tuple[int, int]:
+    n = 2 ** z
+    lat = max(min(lat, 85.0511287798), -85.0511287798)
+    lat_rad = math.radians(lat)
+    world_x = (lon + 180.0) / 360.0 * n
+    world_y = (1.0 - math.log(math.tan(lat_rad) + 1.0 / math.cos(lat_rad)) / math.pi) / 2.0 * n
+    return (
+        int(round((world_x - x) * extent)),
+        int(round((world_y - y) * extent)),
+    )
@@ -0,0 +1,489 @@
+import io
+import json
+import logging
+import math
+import mmap
+import os
+import struct
+import sys
+import threading
+from array import array
+from pathlib import Path
+from xml.etree.ElementTree import ParseError, iterparse
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Local cadastral parcel store: parcel polygons in S-JTSK (EPSG:5514) packed into an
+# STR (sort-tile-recursive) R-tree and written as flat little-endian arrays to one file,
+# see `import_parcels`. The file is memory-mapped on load, so lookups read only the pages
+# they touch and worker processes share them through the page cache.
+PARCEL_INDEX_MAGIC = b"TWPARCEL"
+PARCEL_INDEX_FORMAT_VERSION = 2
+# magic, version, node capacity, level count, reserved, parcel/ring/coordinate counts
+# and the size of the JSON fields blob.
+PARCEL_INDEX_HEADER = struct.Struct("<8sIIII4Q")
+PARCEL_INDEX_NODE_CAPACITY = 16
+SUPPORTED_SRS_CODES = ("5514",)
+WFS_EXCEPTION_ROOT_TAGS = ("ServiceExceptionReport", "ExceptionReport")
+
+
+class ParcelIndexError(Exception):
+    pass
+
+
+class WfsExceptionReport(Exception):
+    pass
+
+
+class WfsUnexpectedResponse(Exception):
+    pass
+
+
+def default_parcel_index_path() -> Path:
+    return Path(
+        getattr(settings, "PARCEL_INDEX_PATH", "")
+        or settings.BASE_DIR / "var" / "parcels" / "parcels.idx"
+    )
+
+
+def _local_name(tag: str) -> str:
+    return tag.split("}")[-1]
+
+
+def _ring_from_coordinates(values: list[float], dimension: int) -> array | None:
+    ring = array("d")
+    for index in range(0, len(values) - dimension + 1, dimension):
+        ring.append(values[index])
+        ring.append(values[index + 1])
+    return ring if len(ring) >= 6 else None
+
+
+def _parse_parcel_element(element) -> dict | None:
+    fields = {}
+    rings = []
+    for child in element.iter():
+        tag = _local_name(child.tag).lower()
+        text = child.text.strip() if child.text else ""
+        if tag == "localid" and text:
+            fields.setdefault("inspire_local_id", text)
+        elif tag == "namespace" and text:
+            fields.setdefault("inspire_namespace", text)
+        elif "nationalcadastralreference" in tag and text:
+            fields.setdefault("national_cadastral_reference", text)
+        elif tag == "label" and text:
+            fields.setdefault("label", text)
+        elif tag == "linearring":
+            dimension = 2
+            values = []
+            for part in child.iter():
+                part_tag = _local_name(part.tag).lower()
+                if part_tag == "poslist" and part.text:
+                    dimension = int(part.get("srsDimension") or child.get("srsDimension") or 2)
+                    values.extend(float(value) for value in part.text.split())
+                elif part_tag == "pos" and part.text:
+                    values.extend(float(value) for value in part.text.split()[:2])
+            ring = _ring_from_coordinates(values, dimension)
+            if ring is not None:
+                rings.append(ring)
+    if not rings:
+        return None
+    parcel_number = fields.get("national_cadastral_reference") or fields.get("inspire_local_id")
+    if not parcel_number:
+        return None
+    fields["parcel_number"] = parcel_number
+    xs = [value for ring in rings for value in ring[0::2]]
+    ys = [value for ring in rings for value in ring[1::2]]
+    return {
+        "fields": fields,
+        "bbox": (min(xs), min(ys), max(xs), max(ys)),
+        "rings": rings,
+    }
+
+
+def _extract_wfs_fields(feature) -> dict:
+    local_id = None
+    namespace = None
+    national_ref = None
+    for elem in feature.iter():
+        text = elem.text.strip() if elem.text else ""
+        if not text:
+            continue
+        tag = _local_name(elem.tag).lower()
+        if tag == "localid" and local_id is None:
+            local_id = text
+        elif tag == "namespace" and namespace is None:
+            namespace = text
+        if "nationalcadastralreference" in tag and national_ref is None:
+            national_ref = text
+    fields = {
+        "parcel_number": national_ref or local_id,
+        "inspire_local_id": local_id,
+        "inspire_namespace": namespace,
+        "national_cadastral_reference": national_ref,
+    }
+    return {key: value for key, value in fields.items() if value}
+
+
+def scan_wfs_response(source) -> dict:
+    """
+    Single incremental pass over a WFS response (bytes or file object): notes the root
+    element, stops early on exception reports and at the end of the first CadastralParcel.
+    Returns {"root", "exception", "found", "fields"}; unparsable or truncated payloads
+    without a parcel give root None.
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    scan = {"root": None, "exception": False, "found": False, "fields": {}}
+    depth = 0
+    in_parcel = False
+    try:
+        for event, element in iterparse(source, events=("start", "end")):
+            tag = _local_name(element.tag)
+            if event == "start":
+                if scan["root"] is None:
+                    scan["root"] = tag
+                    if tag in WFS_EXCEPTION_ROOT_TAGS:
+                        scan["exception"] = True
+                        break
+                if tag.lower() == "cadastralparcel":
+                    in_parcel = True
+                depth += 1
+                continue
+            depth -= 1
+            if in_parcel and tag.lower() == "cadastralparcel":
+                scan["fields"] = _extract_wfs_fields(element)
+                scan["found"] = True
+                break
+            if not in_parcel and depth > 0:
+                element.clear()
+    except ParseError:
+        if not scan["found"]:
+            scan["root"] = None
+    return scan
+
+
+def iter_gml_parcels(source, root_tags=None):
+    """
+    Stream CadastralParcel features from an INSPIRE CP GML dump or WFS response (file path
+    or file object). Only S-JTSK (EPSG:5514) geometries are accepted, matching the WFS
+    point lookups; a WFS exception report raises WfsExceptionReport and, when `root_tags`
+    is given, any other root element raises WfsUnexpectedResponse.
+    """
+    root_seen = False
+    for event, element in iterparse(source, events=("start", "end")):
+        if event == "start":
+            if not root_seen:
+                root_seen = True
+                root = _local_name(element.tag)
+                if root in WFS_EXCEPTION_ROOT_TAGS:
+                    raise WfsExceptionReport(root)
+                if root_tags is not None and root not in root_tags:
+                    raise WfsUnexpectedResponse(root)
+            continue
+        if _local_name(element.tag).lower() != "cadastralparcel":
+            continue
+        srs_names = {
+            node.get("srsName")
+            for node in element.iter()
+            if node.get("srsName")
+        }
+        if srs_names and not all(
+            any(code in srs for code in SUPPORTED_SRS_CODES) for srs in srs_names
+        ):
+            raise ParcelIndexError(f"Unsupported parcel geometry CRS: {', '.join(sorted(srs_names))}")
+        parcel = _parse_parcel_element(element)
+        element.clear()
+        if parcel is not None:
+            yield parcel
+
+
+def _str_order(boxes: list[tuple], capacity: int) -> list[int]:
+    count = len(boxes)
+    slice_count = math.ceil(math.sqrt(math.ceil(count / capacity))) or 1
+    slice_size = slice_count * capacity
+    by_x = sorted(range(count), key=lambda i: boxes[i][0] + boxes[i][2])
+    order = []
+    for start in range(0, count, slice_size):
+        chunk = by_x[start : start + slice_size]
+        chunk.sort(key=lambda i: boxes[i][1] + boxes[i][3])
+        order.extend(chunk)
+    return order
+
+
+def _union(boxes) -> tuple[float, float, float, float]:
+    return (
+        min(box[0] for box in boxes),
+        min(box[1] for box in boxes),
+        max(box[2] for box in boxes),
+        max(box[3] for box in boxes),
+    )
+
+
+def _point_in_rings(x: float, y: float, rings) -> bool:
+    """Even-odd rule over all rings, so holes and multipolygons need no special casing."""
+    inside = False
+    for ring in rings:
+        count = len(ring) // 2
+        prev_x, prev_y = ring[2 * count - 2], ring[2 * count - 1]
+        for index in range(count):
+            cur_x, cur_y = ring[2 * index], ring[2 * index + 1]
+            if (cur_y > y) != (prev_y > y):
+                cross_x = (prev_x - cur_x) * (y - cur_y) / (prev_y - cur_y) + cur_x
+                if x < cross_x:
+                    inside = not inside
+            prev_x, prev_y = cur_x, cur_y
+    return inside
+
+
+class ParcelIndex:
+    """
+    Parcels packed bottom-up with STR. `levels[0]` groups parcels, each higher level
+    groups the nodes below; a node is (min_x, min_y, max_x, max_y, start, end) with
+    children in the contiguous range [start, end) of the level below.
+    """
+
+    def __init__(self, parcels: list[dict], node_capacity: int = PARCEL_INDEX_NODE_CAPACITY):
+        if not parcels:
+            raise ParcelIndexError("Parcel index needs at least one parcel.")
+        self.node_capacity = node_capacity
+        order = _str_order([parcel["bbox"] for parcel in parcels], node_capacity)
+        self.parcels = [parcels[index] for index in order]
+        self.levels = []
+        boxes = [parcel["bbox"] for parcel in self.parcels]
+        while True:
+            nodes = []
+            for start in range(0, len(boxes), node_capacity):
+                end = min(start + node_capacity, len(boxes))
+                nodes.append((*_union(boxes[start:end]), start, end))
+            if len(nodes) > 1:
+                node_order = _str_order(nodes, node_capacity)
+                nodes = [nodes[index] for index in node_order]
+            self.levels.append(nodes)
+            if len(nodes) == 1:
+                break
+            boxes = nodes
+        self.bounds = self.levels[-1][0][:4]
+
+    def __len__(self):
+        return len(self.parcels)
+
+    def candidates(self, x: float, y: float) -> list[dict]:
+        found = []
+        stack = [(len(self.levels) - 1, node) for node in self.levels[-1]]
+        while stack:
+            level, (min_x, min_y, max_x, max_y, start, end) = stack.pop()
+            if not (min_x <= x <= max_x and min_y <= y <= max_y):
+                continue
+            if level == 0:
+                found.extend(
+                    parcel
+                    for parcel in self.parcels[start:end]
+                    if parcel["bbox"][0] <= x <= parcel["bbox"][2]
+                    and parcel["bbox"][1] <= y <= parcel["bbox"][3]
+                )
+            else:
+                stack.extend((level - 1, node) for node in self.levels[level - 1][start:end])
+        return found
+
+    def lookup(self, x: float, y: float) -> dict | None:
+        for parcel in self.candidates(x, y):
+            if _point_in_rings(x, y, parcel["rings"]):
+                return dict(parcel["fields"])
+        return None
+
+    def save(self, path) -> None:
+        """
+        Write the packed file: header, node counts per level, then for each level the
+        node boxes ("d" x4) and child ranges ("q" x2), followed by parcel boxes, ring and
+        coordinate offsets, ring coordinates and the per-parcel JSON fields.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        ring_offsets = array("q", [0])
+        coord_offsets = array("q", [0])
+        coords = array("d")
+        parcel_boxes = array("d")
+        field_offsets = array("q", [0])
+        fields_blob = bytearray()
+        for parcel in self.parcels:
+            parcel_boxes.extend(parcel["bbox"])
+            for ring in parcel["rings"]:
+                coords.extend(ring)
+                coord_offsets.append(len(coords))
+            ring_offsets.append(len(coord_offsets) - 1)
+            fields_blob += json.dumps(parcel["fields"], separators=(",", ":")).encode("utf-8")
+            field_offsets.append(len(fields_blob))
+        sections = [array("q", [len(nodes) for nodes in self.levels])]
+        for nodes in self.levels:
+            sections.append(array("d", [value for node in nodes for value in node[:4]]))
+            sections.append(array("q", [value for node in nodes for value in node[4:]]))
+        sections.extend([parcel_boxes, ring_offsets, coord_offsets, coords, field_offsets])
+        if sys.byteorder != "little":
+            for section in sections:
+                section.byteswap()
+        header = PARCEL_INDEX_HEADER.pack(
+            PARCEL_INDEX_MAGIC,
+            PARCEL_INDEX_FORMAT_VERSION,
+            self.node_capacity,
+            len(self.levels),
+            0,
+            len(self.parcels),
+            len(coord_offsets) - 1,
+            len(coords),
+            len(fields_blob),
+        )
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        with open(tmp_path, "wb") as fh:
+            fh.write(header)
+            for section in sections:
+                section.tofile(fh)
+            fh.write(fields_blob)
+        os.replace(tmp_path, path)
+
+
+class PackedParcelIndex:
+    """
+    Read-only view of a file written by `ParcelIndex.save`, with the same lookup API.
+    Every section is 8-byte aligned, so the arrays are cast straight out of the mmap.
+    """
+
+    def __init__(self, path):
+        with open(path, "rb") as fh:
+            self._mmap = mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._mmap)
+        if len(view) < PARCEL_INDEX_HEADER.size:
+            raise ParcelIndexError("Parcel index file is truncated.")
+        (
+            magic,
+            version,
+            self.node_capacity,
+            level_count,
+            _reserved,
+            parcel_count,
+            ring_count,
+            coord_count,
+            fields_size,
+        ) = PARCEL_INDEX_HEADER.unpack_from(view)
+        if magic != PARCEL_INDEX_MAGIC:
+            raise ParcelIndexError("Not a parcel index file.")
+        if version != PARCEL_INDEX_FORMAT_VERSION:
+            raise ParcelIndexError(f"Unsupported parcel index version {version}.")
+        self._view = view
+        self._offset = PARCEL_INDEX_HEADER.size
+        node_counts = self._section("q", level_count)
+        self.levels = [
+            (self._section("d", 4 * count), self._section("q", 2 * count))
+            for count in node_counts
+        ]
+        self._parcel_count = parcel_count
+        self._boxes = self._section("d", 4 * parcel_count)
+        self._ring_offsets = self._section("q", parcel_count + 1)
+        self._coord_offsets = self._section("q", ring_count + 1)
+        self._coords = self._section("d", coord_count)
+        self._field_offsets = self._section("q", parcel_count + 1)
+        if self._offset + fields_size > len(view):
+            raise ParcelIndexError("Parcel index file is truncated.")
+        self._fields = view[self._offset : self._offset + fields_size]
+        boxes, _ranges = self.levels[-1]
+        self.bounds = tuple(boxes[0:4])
+
+    def _section(self, typecode: str, count: int):
+        size = count * 8
+        if self._offset + size > len(self._view):
+            raise ParcelIndexError("Parcel index file is truncated.")
+        section = self._view[self._offset : self._offset + size].cast(typecode)
+        self._offset += size
+        if sys.byteorder != "little":
+            section = array(typecode, section.tobytes())
+            section.byteswap()
+        return section
+
+    def __len__(self):
+        return self._parcel_count
+
+    def _parcel_fields(self, index: int) -> dict:
+        start, end = self._field_offsets[index], self._field_offsets[index + 1]
+        return json.loads(bytes(self._fields[start:end]))
+
+    def _parcel_rings(self, index: int) -> list:
+        offsets = self._coord_offsets
+        return [
+            self._coords[offsets[ring] : offsets[ring + 1]]
+            for ring in range(self._ring_offsets[index], self._ring_offsets[index + 1])
+        ]
+
+    def candidates(self, x: float, y: float) -> list[int]:
+        found = []
+        boxes = self._boxes
+        top_boxes, _ranges = self.levels[-1]
+        stack = [(len(self.levels) - 1, node) for node in range(len(top_boxes) // 4)]
+        while stack:
+            level, node = stack.pop()
+            node_boxes, node_ranges = self.levels[level]
+            if not (
+                node_boxes[4 * node] <= x <= node_boxes[4 * node + 2]
+                and node_boxes[4 * node + 1] <= y <= node_boxes[4 * node + 3]
+            ):
+                continue
+            start, end = node_ranges[2 * node], node_ranges[2 * node + 1]
+            if level == 0:
+                found.extend(
+                    index
+                    for index in range(start, end)
+                    if boxes[4 * index] <= x <= boxes[4 * index + 2]
+                    and boxes[4 * index + 1] <= y <= boxes[4 * index + 3]
+                )
+            else:
+                stack.extend((level - 1, child) for child in range(start, end))
+        return found
+
+    def lookup(self, x: float, y: float) -> dict | None:
+        for index in self.candidates(x, y):
+            if _point_in_rings(x, y, self._parcel_rings(index)):
+                return self._parcel_fields(index)
+        return None
+
+    def iter_parcels(self):
+        """Parcels in the builder's dict form, used by `import_parcels --merge`."""
+        for index in range(self._parcel_count):
+            yield {
+                "fields": self._parcel_fields(index),
+                "bbox": tuple(self._boxes[4 * index : 4 * index + 4]),
+                "rings": [array("d", ring) for ring in self._parcel_rings(index)],
+            }
+
+
+_loaded_lock = threading.Lock()
+_loaded_index = {"key": None, "index": None}
+
+
+def load_parcel_index(path=None) -> PackedParcelIndex | None:
+    """Index stored at `path` (default PARCEL_INDEX_PATH), reloaded when the file changes."""
+    path = Path(path or default_parcel_index_path())
+    try:
+        key = (str(path), path.stat().st_mtime_ns)
+    except OSError:
+        return None
+    with _loaded_lock:
+        if _loaded_index["key"] != key:
+            try:
+                index = PackedParcelIndex(path)
+            except (OSError, ValueError, ParcelIndexError) as err:
+                logger.warning("parcel index load failed path=%s error=%s", path, err)
+                return None
+            _loaded_index["key"] = key
+            _loaded_index["index"] = index
+        return _loaded_index["index"]
+
+
+def lookup_parcel_sjtsk(x: float, y: float) -> dict | None:
+    """
+    Parcel fields for an S-JTSK point from the local index, or None when the point is
+    not covered (no index, outside its parcels), in which case callers fall back to WFS.
+    """
+    index = load_parcel_index()
+    if index is None:
+        return None
+    return index.lookup(x, y)
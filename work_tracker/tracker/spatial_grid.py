@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from django.db.models import Q
+
+# Z-order (Morton) key over a lon/lat grid, used to index WorkRecord coordinates without
+# GeoDjango. GRID_BITS per axis gives cells of ~25 x 19 m in the Czech Republic.
+GRID_BITS = 20
+GRID_SIZE = 1 << GRID_BITS
+# Upper bound for key ranges produced per bbox; more ranges mean tighter but longer SQL.
+DEFAULT_MAX_RANGES = 32
+
+
+def _spread_bits(value: int) -> int:
+    """Insert a zero bit between each of the low 32 bits of value."""
+    value &= 0xFFFFFFFF
+    value = (value | (value << 16)) & 0x0000FFFF0000FFFF
+    value = (value | (value << 8)) & 0x00FF00FF00FF00FF
+    value = (value | (value << 4)) & 0x0F0F0F0F0F0F0F0F
+    value = (value | (value << 2)) & 0x3333333333333333
+    value = (value | (value << 1)) & 0x5555555555555555
+    return value
+
+
+def _interleave(cell_x: int, cell_y: int) -> int:
+    return _spread_bits(cell_x) | (_spread_bits(cell_y) << 1)
+
+
+def _cell_x(lon: float) -> int:
+    cell = int((lon + 180.0) / 360.0 * GRID_SIZE)
+    return min(max(cell, 0), GRID_SIZE - 1)
+
+
+def _cell_y(lat: float) -> int:
+    cell = int((lat + 90.0) / 180.0 * GRID_SIZE)
+    return min(max(cell, 0), GRID_SIZE - 1)
+
+
+def grid_key(lat, lon) -> int | None:
+    """Spatial key for a point; None when the coordinates are missing or invalid."""
+    try:
+        lat = float(lat)
+        lon = float(lon)
+    except (TypeError, ValueError):
+        return None
+    if not (-90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0):
+        return None
+    return _interleave(_cell_x(lon), _cell_y(lat))
+
+
+def bbox_key_ranges(bbox, max_ranges: int = DEFAULT_MAX_RANGES) -> list[tuple[int, int]]:
+    """
+    Cover bbox (min_lon, min_lat, max_lon, max_lat) with inclusive key ranges.
+    The quadtree is refined level by level until max_ranges would be exceeded, so the
+    cover is a superset of the bbox; callers still apply the exact lat/lon predicates.
+    """
+    min_lon, min_lat, max_lon, max_lat = bbox
+    x0, x1 = _cell_x(min_lon), _cell_x(max_lon)
+    y0, y1 = _cell_y(min_lat), _cell_y(max_lat)
+
+    covered = []
+    frontier = [(0, 0, 0)]
+    while frontier:
+        partial = []
+        refined = []
+        for level, cell_x, cell_y in frontier:
+            shift = GRID_BITS - level
+            left, right = cell_x << shift, ((cell_x + 1) << shift) - 1
+            bottom, top = cell_y << shift, ((cell_y + 1) << shift) - 1
+            if right < x0 or left > x1 or top < y0 or bottom > y1:
+                continue
+            inside = x0 <= left and right <= x1 and y0 <= bottom and top <= y1
+            if inside or level == GRID_BITS:
+                covered.append((level, cell_x, cell_y))
+                continue
+            partial.append((level, cell_x, cell_y))
+            for dx in (0, 1):
+                for dy in (0, 1):
+                    refined.append((level + 1, cell_x * 2 + dx, cell_y * 2 + dy))
+        if len(covered) + len(refined) > max_ranges:
+            # Stop refining: keep the partially covered cells of this level as they are.
+            covered.extend(partial)
+            break
+        frontier = refined
+
+    ranges = []
+    for level, cell_x, cell_y in covered:
+        span = 2 * (GRID_BITS - level)
+        prefix = _interleave(cell_x, cell_y)
+        ranges.append((prefix << span, ((prefix + 1) << span) - 1))
+    ranges.sort()
+
+    merged = []
+    for low, high in ranges:
+        if merged and low <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], high))
+        else:
+            merged.append((low, high))
+    return merged
+
+
+def bbox_key_q(bbox, field: str = "map_grid_key", max_ranges: int = DEFAULT_MAX_RANGES) -> Q:
+    """Q object matching rows whose spatial key falls into the bbox cover."""
+    query = Q()
+    for low, high in bbox_key_ranges(bbox, max_ranges=max_ranges):
+        query |= Q(**{f"{field}__range": (low, high)})
+    return query
@@ -1,26 +1,43 @@
 import io
 import csv
+import json
+import math
+import zipfile
 import tempfile
+import time
 from pathlib import Path
 from unittest.mock import patch
 
 from django.contrib.auth import get_user_model
+from django.core.cache import cache
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test import TestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
 
 from .models import (
+    CadastreLookupCache,
+    CadastreLookupJob,
     InterventionType,
     Project,
     ProjectMembership,
     PhotoDocumentation,
+    PriceListItem,
+    PriceListVersion,
+    ProjectPriceTotal,
+    ProjectTree,
+    ProjectRepriceJob,
     RuianCadastralArea,
     RuianCadastralAreaMunicipality,
     RuianMunicipality,
     TreeAssessment,
     TreeIntervention,
+    TreeMapSummary,
     WorkRecord,
 )
+from .cadastre_queue import CADASTRE_JOB_MAX_ATTEMPTS, run_cadastre_jobs
+from .spatial_grid import bbox_key_ranges, grid_key
 
 
 class ChangeConiferInterventionCommandTests(TestCase):
@@ -151,6 +168,25 @@ class ChangeConiferInterventionCommandTests(TestCase):
         self.assert_type(self.other_project_intervention, self.from_type)
         self.assert_type(self.completed_intervention, self.from_type)
 
+    def test_confirm_refreshes_project_price_totals_of_unassessed_trees(self):
+        from .project_pricing import project_price_totals
+
+        InterventionType.objects.filter(pk=self.to_type.pk).update(category="Bezpečnostní řez")
+        self.project.trees.add(self.conifer, self.czech_conifer, self.leaf)
+
+        def category_counts():
+            return {
+                row.category: row.intervention_count
+                for row in project_price_totals(self.project)["rows"]
+            }
+
+        self.assertEqual(category_counts(), {"Řez stromů": 3})
+        with tempfile.TemporaryDirectory() as tmpdir:
+            self.call_command("--backup-dir", tmpdir, "--confirm")
+        self.conifer_intervention.refresh_from_db()
+        self.assertIsNone(self.conifer_intervention.estimated_price_czk)
+        self.assertEqual(category_counts(), {"Řez stromů": 1, "Bezpečnostní řez": 2})
+
     def test_include_completed_changes_completed_conifers(self):
         with tempfile.TemporaryDirectory() as tmpdir:
             self.call_command("--backup-dir", tmpdir, "--confirm", "--include-completed")
@@ -345,6 +381,373 @@ class ExportProjectTreeCardsDocxCommandTests(TestCase):
         self.assertEqual(int(width), int(Cm(9)))
 
 
+class PriceListIndexTests(TestCase):
+    def setUp(self):
+        from .pricing import invalidate_price_list_index
+
+        invalidate_price_list_index()
+        self.addCleanup(invalidate_price_list_index)
+        self.version = PriceListVersion.objects.create(code="NOO_2026", label="NOO 2026")
+        for item_code, band_min, band_max, price, operation_type, is_combo in [
+            ("ZE41a", 0, 50, 1000, "zdravotni", False),
+            ("ZE41b", 51, 100, 2000, "zdravotni", False),
+            ("ZE41c", 101, None, 3000, "zdravotni", False),
+            ("ZE41d", 0, 100, 1500, "bezpecnostni", False),
+            ("ZE41e", 0, 100, 9000, "zdravotni", True),
+        ]:
+            PriceListItem.objects.create(
+                version=self.version,
+                activity_code="ZE41",
+                item_code=item_code,
+                label=item_code,
+                price_czk=price,
+                band_min_m2=band_min,
+                band_max_m2=band_max,
+                operation_type=operation_type,
+                is_combo=is_combo,
+            )
+
+    def test_bands_are_looked_up_in_memory(self):
+        from .pricing import _lookup_noo_base_price
+
+        _lookup_noo_base_price(10.0, "zdravotni")
+        with self.assertNumQueries(0):
+            self.assertEqual(_lookup_noo_base_price(50.0, "zdravotni")[0], 1000)
+            self.assertEqual(_lookup_noo_base_price(50.5, "zdravotni")[0], None)
+            price, meta = _lookup_noo_base_price(75.0, "zdravotni")
+            self.assertEqual(_lookup_noo_base_price(5000.0, "zdravotni")[0], 3000)
+            self.assertEqual(_lookup_noo_base_price(75.0, "bezpecnostni")[0], 1500)
+            self.assertEqual(_lookup_noo_base_price(75.0, "lokalni")[0], None)
+        self.assertEqual(price, 2000)
+        self.assertEqual(meta["base_price_item_code"], "ZE41b")
+        self.assertEqual(meta["base_price_band"], "51–100")
+        self.assertEqual(meta["base_price_source"], "NOO_DB")
+
+    def test_overlapping_bands_pick_lowest_band_start(self):
+        from .pricing import PriceListIndex
+
+        items = [
+            PriceListItem(
+                pk=pk,
+                activity_code="ZE41",
+                operation_type="x",
+                item_code=item_code,
+                band_min_m2=band_min,
+                band_max_m2=band_max,
+                price_czk=pk,
+            )
+            for pk, item_code, band_min, band_max in [
+                (1, "a", 0, 500),
+                (2, "b", 10, 20),
+                (3, "c", 600, None),
+            ]
+        ]
+        index = PriceListIndex(items)
+        self.assertEqual(index.lookup("ZE41", "x", 15)[3], "a")
+        self.assertIsNone(index.lookup("ZE41", "x", 550))
+        self.assertEqual(index.lookup("ZE41", "x", 10_000)[3], "c")
+
+    def test_price_list_changes_invalidate_index(self):
+        from .pricing import _lookup_noo_base_price
+
+        self.assertEqual(_lookup_noo_base_price(75.0, "zdravotni")[0], 2000)
+        item = PriceListItem.objects.get(item_code="ZE41b")
+        item.price_czk = 2500
+        item.save()
+        self.assertEqual(_lookup_noo_base_price(75.0, "zdravotni")[0], 2500)
+        self.version.delete()
+        self.assertEqual(_lookup_noo_base_price(75.0, "zdravotni")[0], None)
+
+
+class RecalculatePricesTests(TestCase):
+    def setUp(self):
+        from .pricing import invalidate_price_list_index
+
+        invalidate_price_list_index()
+        self.addCleanup(invalidate_price_list_index)
+        version = PriceListVersion.objects.create(code="NOO_2026", label="NOO 2026")
+        PriceListItem.objects.create(
+            version=version,
+            activity_code="ZE41",
+            item_code="ZE41a",
+            label="Zdravotní řez do 100 m2",
+            price_czk=1000,
+            band_min_m2=0,
+            band_max_m2=100,
+            operation_type="zdravotni",
+        )
+        intervention_type = InterventionType.objects.create(code="S-RZ-T", name="Řez zdravotní")
+        self.project = Project.objects.create(name="Pricing project")
+        self.interventions = []
+        with patch.dict("os.environ", {"ARBOMAP_DISABLE_CADASTRE_LOOKUP": "1"}):
+            for index in range(6):
+                tree = WorkRecord.objects.create(title=f"WR {index}")
+                self.project.trees.add(tree)
+                TreeAssessment.objects.create(work_record=tree, height_m=10, crown_width_m=5)
+                self.interventions.append(
+                    TreeIntervention.objects.create(tree=tree, intervention_type=intervention_type)
+                )
+        TreeIntervention.objects.update(estimated_price_czk=None, estimated_price_breakdown=None)
+
+    def test_batch_recalculation_uses_constant_queries(self):
+        from django.db import connection
+        from django.test.utils import CaptureQueriesContext
+
+        from .pricing import load_price_list_index, recalculate_prices
+
+        load_price_list_index()
+        query_counts = []
+        for interventions in (self.interventions[:3], self.interventions):
+            TreeIntervention.objects.update(estimated_price_czk=None)
+            with CaptureQueriesContext(connection) as queries:
+                changed = recalculate_prices(
+                    TreeIntervention.objects.filter(pk__in=[item.pk for item in interventions])
+                )
+            self.assertEqual(changed, len(interventions))
+            query_counts.append(len(queries))
+        self.assertEqual(query_counts[0], query_counts[1])
+        for intervention in self.interventions:
+            intervention.refresh_from_db()
+            self.assertEqual(intervention.estimated_price_czk, 1000)
+            self.assertEqual(intervention.estimated_price_breakdown["base_price_item_code"], "ZE41a")
+        self.assertEqual(recalculate_prices(TreeIntervention.objects.all()), 0)
+
+    def test_command_limits_to_project_and_checks_version(self):
+        other = TreeIntervention.objects.create(
+            tree=WorkRecord.objects.create(title="Elsewhere"),
+            intervention_type=self.interventions[0].intervention_type,
+        )
+        TreeIntervention.objects.filter(pk=other.pk).update(estimated_price_czk=None)
+        out = io.StringIO()
+        call_command("recalculate_prices", "--project", str(self.project.pk), stdout=out)
+        self.assertIn("Recalculated 6 interventions: 6 changed", out.getvalue())
+        other.refresh_from_db()
+        self.assertIsNone(other.estimated_price_czk)
+
+        with self.assertRaisesMessage(CommandError, "'NOO_1999' does not exist"):
+            call_command("recalculate_prices", "--version", "NOO_1999", stdout=io.StringIO())
+
+
+@override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+class ProjectPricingTests(TestCase):
+    def setUp(self):
+        from .pricing import invalidate_price_list_index
+
+        invalidate_price_list_index()
+        self.addCleanup(invalidate_price_list_index)
+        self.versions = {}
+        for code, price in (("NOO_2026", 1000), ("CITY_2027", 1500)):
+            self.versions[code] = PriceListVersion.objects.create(code=code, label=code)
+            PriceListItem.objects.create(
+                version=self.versions[code],
+                activity_code="ZE41",
+                item_code="ZE41a",
+                label="Zdravotní řez do 100 m2",
+                price_czk=price,
+                band_min_m2=0,
+                band_max_m2=100,
+                operation_type="zdravotni",
+            )
+        self.intervention_type = InterventionType.objects.create(
+            code="S-RZ-T", name="Řez zdravotní", category="rez"
+        )
+        self.project = Project.objects.create(name="Pricing project")
+        self.trees = []
+        with patch.dict("os.environ", {"ARBOMAP_DISABLE_CADASTRE_LOOKUP": "1"}):
+            for index in range(2):
+                tree = WorkRecord.objects.create(title=f"WR {index}")
+                self.project.trees.add(tree)
+                TreeAssessment.objects.create(work_record=tree, height_m=10, crown_width_m=5)
+                self.trees.append(tree)
+
+    def _add_intervention(self, tree, **fields):
+        return TreeIntervention.objects.create(
+            tree=tree, intervention_type=self.intervention_type, **fields
+        )
+
+    def _totals(self):
+        from .project_pricing import project_price_totals
+
+        return project_price_totals(self.project)
+
+    def test_totals_follow_intervention_writes(self):
+        first = self._add_intervention(self.trees[0])
+        self._add_intervention(self.trees[1])
+        totals = self._totals()
+        self.assertEqual(totals["total_czk"], 2000)
+        self.assertEqual(totals["by_status"], {"proposed": 2000})
+        self.assertEqual([(row.category, row.intervention_count) for row in totals["rows"]], [("rez", 2)])
+
+        first.status = "completed"
+        first.save()
+        self.assertEqual(self._totals()["by_status"], {"completed": 1000, "proposed": 1000})
+
+        first.delete()
+        self.assertEqual(self._totals()["by_status"], {"proposed": 1000})
+
+        self.project.trees.remove(self.trees[1])
+        totals = self._totals()
+        self.assertEqual(totals["total_czk"], 0)
+        self.assertFalse(ProjectPriceTotal.objects.filter(project=self.project).exists())
+
+    def test_incremental_totals_match_a_full_rebuild(self):
+        from .project_pricing import refresh_project_price_totals
+
+        def assert_matches_rebuild():
+            def snapshot():
+                return sorted(
+                    ProjectPriceTotal.objects.filter(project=self.project).values_list(
+                        "status", "category", "intervention_count", "priced_count", "total_czk"
+                    )
+                )
+
+            incremental = snapshot()
+            refresh_project_price_totals([self.project.pk])
+            self.assertEqual(snapshot(), incremental)
+            return incremental
+
+        other_type = InterventionType.objects.create(code="K-X", name="Kácení", category="kaceni")
+        first = self._add_intervention(self.trees[0])
+        second = self._add_intervention(self.trees[1], status="completed")
+        first.intervention_type = other_type
+        first.save()
+        self.assertEqual(len(assert_matches_rebuild()), 2)
+        TreeAssessment.objects.create(work_record=self.trees[1], height_m=10, crown_width_m=20)
+        assert_matches_rebuild()
+        self.project.trees.remove(self.trees[0])
+        self.project.trees.add(self.trees[0])
+        second.delete()
+        self.assertEqual([row[:3] for row in assert_matches_rebuild()], [("proposed", "kaceni", 1)])
+        self.project.trees.clear()
+        self.assertEqual(assert_matches_rebuild(), [])
+        ProjectTree.objects.create(project=self.project, tree=self.trees[1])
+        self._add_intervention(self.trees[1])
+        self.assertEqual([row[:4] for row in assert_matches_rebuild()], [("proposed", "rez", 1, 1)])
+
+    def test_intervention_save_does_not_rebuild_project_totals(self):
+        intervention = self._add_intervention(self.trees[0])
+        with patch("tracker.project_pricing.refresh_project_price_totals") as rebuild:
+            intervention.status = "completed"
+            intervention.save()
+            intervention.delete()
+            self.project.trees.remove(self.trees[1])
+        rebuild.assert_not_called()
+        self.assertFalse(ProjectPriceTotal.objects.filter(project=self.project).exists())
+
+    def test_pinning_version_queues_repricing(self):
+        intervention = self._add_intervention(self.trees[0])
+        intervention.refresh_from_db()
+        self.assertEqual(intervention.estimated_price_czk, 1000)
+
+        self.project.price_list_version = self.versions["CITY_2027"]
+        self.project.save()
+        job = ProjectRepriceJob.objects.get(project=self.project)
+        self.assertEqual(job.status, ProjectRepriceJob.Status.PENDING)
+
+        out = io.StringIO()
+        call_command("process_reprice_queue", stdout=out)
+        self.assertIn("Repriced 1 projects", out.getvalue())
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProjectRepriceJob.Status.DONE)
+        intervention.refresh_from_db()
+        self.assertEqual(intervention.estimated_price_czk, 1500)
+        self.assertEqual(self._totals()["total_czk"], 1500)
+
+        # Saving without touching the pin does not queue another run.
+        self.project.name = "Renamed"
+        self.project.save()
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProjectRepriceJob.Status.DONE)
+
+    def test_conflicting_pins_on_shared_trees_are_rejected(self):
+        from .forms import ProjectEditForm
+
+        other = Project.objects.create(name="Sdílený", price_list_version=self.versions["NOO_2026"])
+        other.trees.add(self.trees[0])
+
+        def form(version):
+            data = {"name": self.project.name, "description": "", "price_list_version": version.pk}
+            return ProjectEditForm(data, instance=self.project)
+
+        conflicting = form(self.versions["CITY_2027"])
+        self.assertFalse(conflicting.is_valid())
+        self.assertIn("Sdílený", conflicting.errors["price_list_version"][0])
+        self.assertTrue(form(self.versions["NOO_2026"]).is_valid())
+
+        other.price_list_version = None
+        other.save()
+        self.assertTrue(form(self.versions["CITY_2027"]).is_valid())
+
+    def test_linking_trees_across_conflicting_pins_is_rejected(self):
+        from django.core.exceptions import ValidationError
+        from django.db import transaction
+
+        self.project.price_list_version = self.versions["CITY_2027"]
+        self.project.save()
+        other = Project.objects.create(name="Sdílený", price_list_version=self.versions["NOO_2026"])
+
+        with self.assertRaises(ValidationError), transaction.atomic():
+            other.trees.add(self.trees[0])
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.trees[1].projects.add(other)
+        with self.assertRaises(ValidationError), transaction.atomic():
+            ProjectTree.objects.create(project=other, tree=self.trees[1])
+        self.trees[0].project = other
+        with self.assertRaises(ValidationError), transaction.atomic():
+            self.trees[0].save()
+        self.assertFalse(ProjectTree.objects.filter(project=other).exists())
+
+        user = get_user_model().objects.create_user(username="foreman", password="pass1234")
+        ProjectMembership.objects.create(user=user, project=other, role=ProjectMembership.Role.FOREMAN)
+        self.client.force_login(user)
+        response = self.client.post(reverse("project_tree_add", args=[other.pk, self.trees[0].pk]))
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Pricing project", response.json()["error"])
+
+        unpinned = Project.objects.create(name="Bez ceníku")
+        unpinned.trees.add(self.trees[0])
+        other.price_list_version = self.versions["CITY_2027"]
+        other.save()
+        other.trees.add(self.trees[0])
+
+    def test_failed_reprice_is_retried_then_marked_failed(self):
+        from .project_pricing import REPRICE_JOB_MAX_ATTEMPTS, run_project_reprice_jobs
+
+        self.project.price_list_version = self.versions["CITY_2027"]
+        self.project.save()
+        with patch("tracker.project_pricing.recalculate_prices", side_effect=RuntimeError("boom")):
+            for _ in range(REPRICE_JOB_MAX_ATTEMPTS):
+                ProjectRepriceJob.objects.update(available_at=timezone.now())
+                run_project_reprice_jobs()
+        job = ProjectRepriceJob.objects.get(project=self.project)
+        self.assertEqual(job.status, ProjectRepriceJob.Status.FAILED)
+        self.assertEqual(job.last_error, "boom")
+
+    def test_project_detail_and_export_show_totals(self):
+        self._add_intervention(self.trees[0])
+        self._add_intervention(self.trees[1], status="completed")
+        user = get_user_model().objects.create_user(username="foreman", password="pass1234")
+        ProjectMembership.objects.create(
+            user=user, project=self.project, role=ProjectMembership.Role.FOREMAN
+        )
+        self.client.force_login(user)
+
+        response = self.client.get(reverse("project_detail", args=[self.project.pk]))
+        self.assertContains(response, "1000 Kč")
+        self.assertContains(response, "Celkem 2000 Kč")
+
+        from openpyxl import load_workbook
+
+        response = self.client.post(
+            reverse("export_selected_xlsx", args=[self.project.pk]), {"export_all": "1"}
+        )
+        worksheet = load_workbook(io.BytesIO(response.content))["Odhad ceny"]
+        rows = [[cell.value for cell in row] for row in worksheet.iter_rows(min_row=2)]
+        self.assertEqual(rows[-1][0], "Celkem")
+        self.assertEqual(rows[-1][-1], 2000)
+        self.assertEqual(len(rows), 3)
+
+
 class ProjectTreeAddTests(TestCase):
     def setUp(self):
         self.user = get_user_model().objects.create_user(
@@ -578,7 +981,7 @@ class ProjectXlsxExportTests(TestCase):
         workbook = self._workbook(response)
         self.assertEqual(
             workbook.sheetnames,
-            ["Přehled stromů", "Souhrn", "Zásahy", "Fotky"],
+            ["Přehled stromů", "Souhrn", "Odhad ceny", "Zásahy", "Fotky"],
         )
         self.assertNotIn("Technická data", workbook.sheetnames)
         worksheet = workbook["Přehled stromů"]
@@ -591,6 +994,7 @@ class ProjectXlsxExportTests(TestCase):
                 "Český název",
                 "Datum hodnocení",
                 "Výška [m]",
+                "Zdroj výšky",
                 "Obvod kmene [cm]",
                 "DBH [cm]",
                 "Šířka koruny [m]",
@@ -829,6 +1233,7 @@ class ProjectXlsxExportTests(TestCase):
 
 class WorkrecordsGeojsonTests(TestCase):
     def setUp(self):
+        cache.clear()
         self.user = get_user_model().objects.create_user(
             username="user1", password="pass1234"
         )
@@ -859,12 +1264,16 @@ class WorkrecordsGeojsonTests(TestCase):
         self.project1.trees.add(self.in_project_blank)
         self.project2.trees.add(self.other_project)
 
+    def _json(self, resp):
+        self.assertTrue(resp.streaming)
+        return json.loads(b"".join(resp.streaming_content))
+
     def test_workrecords_geojson_non_project_uses_m2m(self):
         self.client.force_login(self.user)
         url = reverse("workrecords_geojson")
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, 200)
-        payload = resp.json()
+        payload = self._json(resp)
         ids = {f["properties"]["id"] for f in payload.get("features", [])}
         self.assertIn(self.in_project.pk, ids)
         self.assertIn(self.in_project_far.pk, ids)
@@ -892,7 +1301,7 @@ class WorkrecordsGeojsonTests(TestCase):
             },
         )
         self.assertEqual(resp.status_code, 200)
-        payload = resp.json()
+        payload = self._json(resp)
         ids = {f["properties"]["id"] for f in payload.get("features", [])}
         self.assertEqual(ids, {self.in_project.pk})
         self.assertEqual(payload.get("project_intervention_types"), ["A", "B"])
@@ -935,7 +1344,7 @@ class WorkrecordsGeojsonTests(TestCase):
         self.assertEqual(resp.status_code, 200)
         features_by_id = {
             feature["properties"]["id"]: feature["properties"]
-            for feature in resp.json().get("features", [])
+            for feature in self._json(resp).get("features", [])
         }
 
         self.assertFalse(features_by_id[self.in_project.pk]["has_active_intervention"])
@@ -950,6 +1359,503 @@ class WorkrecordsGeojsonTests(TestCase):
         self.assertTrue(features_by_id[self.in_project_blank.pk]["has_removal_intervention"])
         self.assertEqual(features_by_id[self.in_project_blank.pk]["intervention_stage"], "none")
 
+    def test_workrecords_geojson_streams_summary_after_features(self):
+        self.client.force_login(self.user)
+        resp = self.client.get(reverse("workrecords_geojson"), {"project": self.project1.pk})
+        body = b"".join(resp.streaming_content).decode("utf-8")
+        self.assertLess(body.index('"features"'), body.index('"project_vegetation_counts"'))
+        self.assertEqual(len(json.loads(body)["features"]), 3)
+
+    def test_workrecords_geojson_conditional_get_uses_project_revision(self):
+        self.client.force_login(self.user)
+        url = reverse("workrecords_geojson")
+        params = {"project": self.project1.pk}
+        first = self.client.get(url, params)
+        etag = first["ETag"]
+        self.assertTrue(etag)
+        self.assertIn("no-cache", first["Cache-Control"])
+
+        # session, user, membership check and the project revision only
+        with self.assertNumQueries(4):
+            cached = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(cached.status_code, 304)
+
+        other_type = InterventionType.objects.create(code="X", name="Typ X")
+        TreeIntervention.objects.create(tree=self.in_project, intervention_type=other_type)
+        changed = self.client.get(url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed["ETag"], etag)
+
+    def test_workrecords_geojson_etag_changes_when_tree_removed_from_project(self):
+        self.client.force_login(self.user)
+        url = reverse("workrecords_geojson")
+        etag = self.client.get(url)["ETag"]
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.project1.trees.remove(self.in_project_far)
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        ids = {f["properties"]["id"] for f in self._json(resp)["features"]}
+        self.assertNotIn(self.in_project_far.pk, ids)
+
+    def test_workrecords_geojson_since_returns_changes_and_tombstones(self):
+        self.client.force_login(self.user)
+        url = reverse("workrecords_geojson")
+        params = {"project": self.project1.pk}
+        revision = self._json(self.client.get(url, params))["revision"]
+
+        unchanged = self._json(self.client.get(url, {**params, "since": revision}))
+        self.assertEqual(unchanged["features"], [])
+        self.assertEqual(unchanged["deleted"], [])
+        self.assertEqual(unchanged["revision"], revision)
+        self.assertNotIn("project_intervention_types", unchanged)
+
+        self.in_project.title = "Renamed"
+        self.in_project.save()
+        self.project1.trees.remove(self.in_project_far)
+        blank_pk = self.in_project_blank.pk
+        self.in_project_blank.delete()
+        self.other_project.title = "Elsewhere"
+        self.other_project.save()
+
+        delta = self._json(self.client.get(url, {**params, "since": revision}))
+        self.assertEqual([f["id"] for f in delta["features"]], [self.in_project.pk])
+        self.assertEqual(
+            delta["deleted"],
+            sorted([self.in_project_far.pk, blank_pk]),
+        )
+        self.assertGreater(delta["revision"], revision)
+
+        resp = self.client.get(url, {**params, "since": "x"})
+        self.assertEqual(resp.status_code, 400)
+
+    def test_workrecords_geojson_since_with_bbox_keeps_trees_outside_viewport(self):
+        self.client.force_login(self.user)
+        url = reverse("workrecords_geojson")
+        params = {"project": self.project1.pk, "bbox": "17.05,49.05,17.2,49.2"}
+        revision = self._json(self.client.get(url, params))["revision"]
+
+        self.in_project_far.title = "Edited elsewhere"
+        self.in_project_far.save()
+        blank_pk = self.in_project_blank.pk
+        self.in_project_blank.delete()
+
+        delta = self._json(self.client.get(url, {**params, "since": revision}))
+        self.assertEqual(delta["features"], [])
+        self.assertEqual(delta["deleted"], [blank_pk])
+
+    def test_workrecords_geojson_since_waits_for_uncommitted_change_ids(self):
+        from datetime import timedelta
+
+        from .models import ProjectMapChange
+
+        self.client.force_login(self.user)
+        url = reverse("workrecords_geojson")
+        params = {"project": self.project1.pk}
+        revision = self._json(self.client.get(url, params))["revision"]
+
+        self.in_project.title = "Renamed"
+        self.in_project.save()
+        self.in_project_far.title = "Renamed far"
+        self.in_project_far.save()
+        # Hold back the first change as if its transaction had not committed yet.
+        in_flight = ProjectMapChange.objects.filter(id__gt=revision).order_by("id").first()
+        in_flight_values = {
+            "id": in_flight.id,
+            "project_id": in_flight.project_id,
+            "tree_id": in_flight.tree_id,
+        }
+        in_flight.delete()
+
+        delta = self._json(self.client.get(url, {**params, "since": revision}))
+        self.assertEqual(delta["revision"], revision)
+        self.assertEqual(delta["features"], [])
+
+        ProjectMapChange.objects.create(**in_flight_values)
+        delta = self._json(self.client.get(url, {**params, "since": revision}))
+        self.assertEqual(
+            {f["id"] for f in delta["features"]},
+            {self.in_project.pk, self.in_project_far.pk},
+        )
+        self.assertGreater(delta["revision"], revision)
+
+        # A hole that never fills (rolled back) stops holding the cursor once it settles.
+        ProjectMapChange.objects.filter(id=in_flight_values["id"]).delete()
+        ProjectMapChange.objects.update(created_at=timezone.now() - timedelta(hours=1))
+        latest = ProjectMapChange.objects.order_by("-id").values_list("id", flat=True)[0]
+        delta = self._json(self.client.get(url, {**params, "since": revision}))
+        self.assertEqual(delta["revision"], latest)
+
+    def test_pruned_change_log_asks_old_cursors_to_resync(self):
+        from datetime import timedelta
+
+        from .models import ProjectMapChange
+
+        self.client.force_login(self.user)
+        url = reverse("workrecords_geojson")
+        params = {"project": self.project1.pk}
+        old_revision = self._json(self.client.get(url, params))["revision"]
+        self.in_project.title = "Renamed"
+        self.in_project.save()
+        ProjectMapChange.objects.update(created_at=timezone.now() - timedelta(days=60))
+        self.in_project_far.title = "Renamed far"
+        self.in_project_far.save()
+
+        out = io.StringIO()
+        call_command("prune_map_changes", stdout=out)
+        self.assertIn("Deleted", out.getvalue())
+        self.assertEqual(ProjectMapChange.objects.count(), 2)
+
+        resp = self.client.get(url, {**params, "since": 0})
+        self.assertEqual(resp.status_code, 410)
+        self.assertTrue(resp.json()["resync"])
+        # The newest expired row is kept as an anchor, so the cursor just before it works.
+        delta = self._json(self.client.get(url, {**params, "since": old_revision}))
+        self.assertEqual(
+            {f["id"] for f in delta["features"]}, {self.in_project.pk, self.in_project_far.pk}
+        )
+
+    def test_map_change_log_skips_cadastre_saves_and_logs_removals_once(self):
+        from .models import ProjectMapChange
+
+        changes = ProjectMapChange.objects.all()
+        before = changes.count()
+        self.project1.refresh_from_db()
+        map_revision = self.project1.map_revision
+        self.in_project.parcel_number = "123/4"
+        self.in_project.cad_lookup_status = "ok"
+        self.in_project.save(update_fields=["parcel_number", "cad_lookup_status"])
+        self.project1.refresh_from_db()
+        self.assertEqual(self.project1.map_revision, map_revision)
+        self.assertEqual(changes.count(), before)
+
+        self.project1.trees.remove(self.in_project_far)
+        self.assertEqual(changes.count(), before + 1)
+        tree_ids = list(
+            ProjectTree.objects.filter(project=self.project1).values_list("tree_id", flat=True)
+        )
+        self.project1.trees.clear()
+        self.assertEqual(changes.count(), before + 1 + len(tree_ids))
+
+    def test_workrecords_geojson_zoom_returns_clusters_cached_per_revision(self):
+        self.client.force_login(self.user)
+        url = reverse("workrecords_geojson")
+        params = {"project": self.project1.pk, "zoom": 2}
+        payload = self._json(self.client.get(url, params))
+        self.assertEqual(payload["zoom"], 2)
+        self.assertEqual(len(payload["features"]), 1)
+        cluster = payload["features"][0]["properties"]
+        self.assertTrue(cluster["cluster"])
+        self.assertEqual(cluster["point_count"], 3)
+        self.assertEqual(cluster["tree_count"], 3)
+        self.assertEqual(cluster["intervention_stage"], "none")
+        self.assertIn("project_vegetation_counts", payload)
+
+        with patch("tracker.views._map_cluster_rows") as cluster_rows:
+            cached = self._json(self.client.get(url, params))
+        cluster_rows.assert_not_called()
+        self.assertEqual(cached["features"], payload["features"])
+
+        self.project1.trees.add(self.other_project)
+        refreshed = self._json(self.client.get(url, params))
+        self.assertEqual(refreshed["features"][0]["properties"]["point_count"], 4)
+
+        outside = self._json(self.client.get(url, {**params, "bbox": "0,0,1,1"}))
+        self.assertEqual(outside["features"], [])
+
+        detail = self._json(self.client.get(url, {**params, "zoom": 18}))
+        self.assertEqual(len(detail["features"]), 4)
+        self.assertNotIn("zoom", detail)
+
+        self.assertEqual(self.client.get(url, {**params, "zoom": "x"}).status_code, 400)
+
+    def test_workrecords_facets_are_cached_until_the_project_changes(self):
+        type_a = InterventionType.objects.create(code="A", name="Typ A")
+        TreeIntervention.objects.create(tree=self.in_project, intervention_type=type_a)
+        self.client.force_login(self.user)
+        params = {"project": self.project1.pk}
+
+        facets = self.client.get(reverse("workrecords_facets"), params).json()
+        self.assertEqual(facets["project_intervention_type_counts"], {"A": 1})
+        self.assertEqual(facets["project_no_intervention_count"], 2)
+
+        url = reverse("workrecords_geojson")
+        with patch("tracker.views._build_map_project_facets") as build_facets:
+            panned = self._json(self.client.get(url, {**params, "bbox": "17.0,49.0,17.5,49.5"}))
+            light = self._json(self.client.get(url, {**params, "facets": "0"}))
+        build_facets.assert_not_called()
+        self.assertEqual(panned["project_intervention_type_counts"], {"A": 1})
+        self.assertNotIn("project_intervention_types", light)
+
+        TreeIntervention.objects.create(tree=self.in_project_far, intervention_type=type_a)
+        facets = self.client.get(reverse("workrecords_facets"), params).json()
+        self.assertEqual(facets["project_intervention_type_counts"], {"A": 2})
+        self.assertEqual(facets["project_no_intervention_count"], 1)
+
+    def test_workrecords_geojson_columnar_format_matches_geojson(self):
+        type_a = InterventionType.objects.create(code="A", name="Typ A")
+        TreeIntervention.objects.create(tree=self.in_project, intervention_type=type_a)
+        TreeAssessment.objects.create(work_record=self.in_project_far, mistletoe_level=2)
+        self.client.force_login(self.user)
+        url = reverse("workrecords_geojson")
+        params = {"project": self.project1.pk}
+
+        geojson_resp = self.client.get(url, params)
+        geojson = self._json(geojson_resp)
+        columnar_resp = self.client.get(url, {**params, "format": "columnar"})
+        self.assertEqual(columnar_resp["Content-Type"], "application/vnd.arbomap.columnar+json")
+        self.assertNotEqual(columnar_resp["ETag"], geojson_resp["ETag"])
+        self.assertIn("Accept", columnar_resp["Vary"])
+        columnar = self._json(columnar_resp)
+        self.assertEqual(columnar["count"], 3)
+        self.assertEqual(
+            columnar["project_intervention_type_counts"],
+            geojson["project_intervention_type_counts"],
+        )
+
+        dictionaries = columnar["dictionaries"]
+        for index, tree_id in enumerate(columnar["id"]):
+            expected = next(f for f in geojson["features"] if f["id"] == tree_id)
+            self.assertEqual(
+                [columnar["lon"][index], columnar["lat"][index]],
+                expected["geometry"]["coordinates"],
+            )
+            decoded = {"id": tree_id}
+            for key, values in columnar["columns"].items():
+                value = values[index]
+                if key in ("intervention_types", "intervention_statuses"):
+                    value = [dictionaries[key][item] for item in value]
+                elif key in dictionaries and value is not None:
+                    value = dictionaries[key][value]
+                elif key.startswith("has_"):
+                    value = bool(value)
+                decoded[key] = value
+            self.assertEqual(decoded, expected["properties"])
+
+        accepted = self.client.get(url, params, HTTP_ACCEPT="application/vnd.arbomap.columnar+json")
+        self.assertEqual(self._json(accepted)["id"], columnar["id"])
+
+        with patch("tracker.views.MAP_COLUMNAR_SPOOL_BYTES", 8):
+            spilled = self._json(self.client.get(url, {**params, "format": "columnar"}))
+        self.assertEqual(spilled, columnar)
+
+        empty = self._json(
+            self.client.get(url, {**params, "format": "columnar", "bbox": "0,0,0.001,0.001"})
+        )
+        self.assertEqual((empty["count"], empty["id"], empty["columns"]), (0, [], {}))
+        self.assertIn("revision", empty)
+
+    def test_export_qgis_geojson_streams_zip_with_both_layers(self):
+        self.in_project.project = self.project1
+        self.in_project.save(update_fields=["project"])
+        hedge = WorkRecord.objects.create(
+            title="Hedge",
+            vegetation_type=WorkRecord.VegetationType.HEDGE,
+            hedge_line={"type": "LineString", "coordinates": [[17.0, 49.0], [17.1, 49.1]]},
+        )
+        self.project1.trees.add(hedge)
+        TreeAssessment.objects.create(work_record=self.in_project, crown_width_m="4.50")
+
+        self.client.force_login(self.user)
+        resp = self.client.post(
+            reverse("export_qgis_geojson", kwargs={"pk": self.project1.pk}),
+            {"export_all": "1"},
+        )
+        self.assertEqual(resp.status_code, 200)
+        archive = zipfile.ZipFile(io.BytesIO(b"".join(resp.streaming_content)))
+        trees = json.loads(archive.read("trees_points.geojson"))
+        hedges = json.loads(archive.read("hedges_lines.geojson"))
+
+        tree_ids = {f["properties"]["work_record_id"] for f in trees["features"]}
+        self.assertEqual(
+            tree_ids,
+            {self.in_project.pk, self.in_project_far.pk, self.in_project_blank.pk},
+        )
+        by_id = {f["properties"]["work_record_id"]: f["properties"] for f in trees["features"]}
+        self.assertEqual(by_id[self.in_project.pk]["assessment_crown_width_m"], 4.5)
+        self.assertEqual(by_id[self.in_project.pk]["project_name"], "P1")
+        self.assertEqual([f["properties"]["work_record_id"] for f in hedges["features"]], [hedge.pk])
+        self.assertEqual(hedges["features"][0]["geometry"]["type"], "LineString")
+
+
+class WorkrecordsMvtTests(TestCase):
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            username="user1", password="pass1234"
+        )
+        self.project = Project.objects.create(name="P1")
+        ProjectMembership.objects.create(
+            user=self.user,
+            project=self.project,
+            role=ProjectMembership.Role.WORKER,
+        )
+        self.tree = WorkRecord.objects.create(title="Near", latitude=49.1, longitude=17.1)
+        self.neighbour = WorkRecord.objects.create(
+            title="Neighbour", latitude=49.10001, longitude=17.10001
+        )
+        self.hidden = WorkRecord.objects.create(title="Hidden", latitude=49.1, longitude=17.1)
+        self.project.trees.add(self.tree, self.neighbour)
+        self.client.force_login(self.user)
+
+    def _tile_url(self, z):
+        n = 2 ** z
+        x = int((17.1 + 180.0) / 360.0 * n)
+        lat_rad = math.radians(49.1)
+        y = int((1.0 - math.log(math.tan(lat_rad) + 1 / math.cos(lat_rad)) / math.pi) / 2.0 * n)
+        return reverse("workrecords_mvt", kwargs={"z": z, "x": x, "y": y})
+
+    def test_detail_tile_contains_visible_records_only(self):
+        resp = self.client.get(self._tile_url(18))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual(resp["Content-Type"], "application/vnd.mapbox-vector-tile")
+        self.assertIn(b"workrecords", resp.content)
+        self.assertIn(b"intervention_stage", resp.content)
+        self.assertIn(b"Neighbour", resp.content)
+        self.assertNotIn(b"Hidden", resp.content)
+        self.assertNotIn(b"point_count", resp.content)
+
+    def test_low_zoom_tile_is_clustered(self):
+        resp = self.client.get(self._tile_url(10))
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn(b"point_count", resp.content)
+        self.assertNotIn(b"Neighbour", resp.content)
+
+    def test_cluster_tiles_share_the_feed_clusters(self):
+        from .views import _map_cluster_rows
+
+        resp = self.client.get(self._tile_url(10))
+        [cluster] = _map_cluster_rows(
+            [
+                {
+                    "id": tree.pk,
+                    "latitude": tree.latitude,
+                    "longitude": tree.longitude,
+                    "vegetation_type": tree.vegetation_type,
+                }
+                for tree in (self.tree, self.neighbour)
+            ],
+            10,
+        )
+        self.assertIn(cluster["properties"]["cluster_id"].encode(), resp.content)
+
+    def test_tiles_answer_conditional_requests_with_the_feed_etag(self):
+        url = self._tile_url(18)
+        resp = self.client.get(url)
+        etag = resp["ETag"]
+        self.assertIn("no-cache", resp["Cache-Control"])
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.tree.title = "Renamed"
+        self.tree.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_gl_pilot_renders_points_from_the_tiles(self):
+        resp = self.client.get(reverse("map_gl_pilot"), {"project": self.project.pk})
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, "/api/workrecords/0/0/0.mvt")
+        self.assertContains(resp, "type: 'vector'")
+        self.assertNotContains(resp, "data: WORKRECORDS_GEOJSON_URL_WITH_PARAMS")
+
+    def test_empty_tile_returns_no_content(self):
+        resp = self.client.get(reverse("workrecords_mvt", kwargs={"z": 18, "x": 0, "y": 0}))
+        self.assertEqual(resp.status_code, 204)
+
+    def test_out_of_range_tile_returns_404(self):
+        resp = self.client.get(reverse("workrecords_mvt", kwargs={"z": 2, "x": 4, "y": 0}))
+        self.assertEqual(resp.status_code, 404)
+
+
+class SpatialGridTests(TestCase):
+    def test_grid_key_follows_coordinate_updates(self):
+        record = WorkRecord.objects.create(title="Grid", latitude=49.1, longitude=17.1)
+        self.assertEqual(record.map_grid_key, grid_key(49.1, 17.1))
+
+        record.latitude = 49.5
+        record.save(update_fields=["latitude", "longitude"])
+        record.refresh_from_db()
+        self.assertEqual(record.map_grid_key, grid_key(49.5, 17.1))
+
+        WorkRecord.objects.filter(pk=record.pk).update(map_grid_key=None)
+        record.latitude = None
+        record.save()
+        record.refresh_from_db()
+        self.assertIsNone(record.map_grid_key)
+
+    def test_bbox_key_ranges_cover_points_inside_bbox(self):
+        bbox = (17.05, 49.05, 17.2, 49.2)
+        ranges = bbox_key_ranges(bbox, max_ranges=8)
+        self.assertLessEqual(len(ranges), 8)
+        for lon, lat in [(17.05, 49.05), (17.2, 49.2), (17.1, 49.15), (17.19, 49.06)]:
+            key = grid_key(lat, lon)
+            self.assertTrue(any(low <= key <= high for low, high in ranges))
+
+        inside = WorkRecord.objects.create(title="Inside", latitude=49.1, longitude=17.1)
+        WorkRecord.objects.create(title="Outside", latitude=49.3, longitude=17.3)
+        from .views import _filter_map_bbox
+
+        matched = _filter_map_bbox(WorkRecord.objects.all(), bbox)
+        self.assertEqual(list(matched.values_list("pk", flat=True)), [inside.pk])
+
+
+class TreeMapSummaryTests(TestCase):
+    def setUp(self):
+        self.tree = WorkRecord.objects.create(title="WR", latitude=49.1, longitude=17.1)
+        self.removal_type = InterventionType.objects.create(
+            code="KAC", name="Kácení", category="Kácení"
+        )
+
+    def test_summary_created_with_tree(self):
+        summary = TreeMapSummary.objects.get(work_record=self.tree)
+        self.assertFalse(summary.has_interventions)
+        self.assertEqual(summary.intervention_type_codes, [])
+
+    def test_summary_follows_interventions_and_assessments(self):
+        intervention = TreeIntervention.objects.create(
+            tree=self.tree,
+            intervention_type=self.removal_type,
+            status="proposed",
+        )
+        TreeAssessment.objects.create(work_record=self.tree, crown_width_m=6, mistletoe_level=3)
+
+        summary = TreeMapSummary.objects.get(work_record=self.tree)
+        self.assertTrue(summary.has_active_intervention)
+        self.assertTrue(summary.has_removal_intervention)
+        self.assertTrue(summary.has_proposed_removal_intervention)
+        self.assertTrue(summary.has_tree_assessment)
+        self.assertEqual(summary.mistletoe_level, 3)
+        self.assertEqual(summary.intervention_type_codes, ["KAC"])
+        self.assertEqual(summary.intervention_statuses, ["proposed"])
+
+        intervention.status = "completed"
+        intervention.save()
+        summary.refresh_from_db()
+        self.assertTrue(summary.has_approved_intervention)
+        self.assertFalse(summary.has_active_intervention)
+
+        intervention.delete()
+        summary.refresh_from_db()
+        self.assertFalse(summary.has_interventions)
+        self.assertEqual(summary.intervention_statuses, [])
+
+    def test_deleting_tree_removes_summary(self):
+        TreeIntervention.objects.create(tree=self.tree, intervention_type=self.removal_type)
+        TreeAssessment.objects.create(work_record=self.tree)
+        tree_id = self.tree.pk
+        self.tree.delete()
+        self.assertFalse(TreeMapSummary.objects.filter(work_record_id=tree_id).exists())
+
+    def test_rebuild_command_restores_missing_rows(self):
+        TreeIntervention.objects.create(tree=self.tree, intervention_type=self.removal_type)
+        TreeMapSummary.objects.all().delete()
+
+        out = io.StringIO()
+        call_command("rebuild_tree_map_summary", stdout=out)
+
+        summary = TreeMapSummary.objects.get(work_record=self.tree)
+        self.assertTrue(summary.has_interventions)
+        self.assertIn("Rebuilt 1 tree map summaries", out.getvalue())
+
 
 class CadastreAreaCodeDerivationTests(TestCase):
     def _create_with_parcel(self, parcel_number):
@@ -960,6 +1866,7 @@ class CadastreAreaCodeDerivationTests(TestCase):
             record = WorkRecord.objects.create(
                 title="WR", latitude=49.0, longitude=17.0
             )
+            run_cadastre_jobs()
         record.refresh_from_db()
         return record
 
@@ -980,6 +1887,866 @@ class CadastreAreaCodeDerivationTests(TestCase):
         self.assertEqual(record.cadastral_area_code, "123")
 
 
+class CadastreQueueTests(TestCase):
+    def test_create_enqueues_lookup_without_calling_wfs(self):
+        with patch("tracker.models._cad_lookup_by_point") as lookup:
+            record = WorkRecord.objects.create(title="WR", latitude=49.0, longitude=17.0)
+        lookup.assert_not_called()
+        record.refresh_from_db()
+        self.assertEqual(record.cad_lookup_status, "pending")
+        self.assertEqual(record.cadastre_job.status, CadastreLookupJob.Status.PENDING)
+
+        with patch(
+            "tracker.models._cad_lookup_by_point",
+            return_value={"parcel_number": "710504-241/1", "cad_lookup_status": "ok"},
+        ) as lookup:
+            outcomes = run_cadastre_jobs()
+            self.assertEqual(run_cadastre_jobs(), {})
+        lookup.assert_called_once_with(17.0, 49.0, sjtsk=(record.sjtsk_x, record.sjtsk_y))
+        self.assertEqual(outcomes[CadastreLookupJob.Status.DONE], 1)
+        record.refresh_from_db()
+        self.assertEqual(record.cad_lookup_status, "ok")
+        self.assertEqual(record.parcel_number, "710504-241/1")
+        self.assertEqual(record.cadastre_job.status, CadastreLookupJob.Status.DONE)
+
+    def test_failed_lookup_is_retried_with_backoff_then_marked_error(self):
+        with patch("tracker.models._cad_lookup_by_point"):
+            record = WorkRecord.objects.create(title="WR", latitude=49.0, longitude=17.0)
+        job = record.cadastre_job
+
+        with patch("tracker.models._cad_lookup_by_point", side_effect=OSError("timeout")):
+            run_cadastre_jobs()
+            job.refresh_from_db()
+            self.assertEqual(job.status, CadastreLookupJob.Status.PENDING)
+            self.assertEqual(job.attempts, 1)
+            self.assertGreater(job.available_at, job.updated_at)
+            self.assertEqual(run_cadastre_jobs(), {})
+
+            for _ in range(CADASTRE_JOB_MAX_ATTEMPTS - 1):
+                CadastreLookupJob.objects.filter(pk=job.pk).update(available_at=job.created_at)
+                run_cadastre_jobs()
+
+        job.refresh_from_db()
+        record.refresh_from_db()
+        self.assertEqual(job.status, CadastreLookupJob.Status.FAILED)
+        self.assertEqual(job.attempts, CADASTRE_JOB_MAX_ATTEMPTS)
+        self.assertEqual(job.last_error, "timeout")
+        self.assertEqual(record.cad_lookup_status, "error")
+
+    def test_skipped_jobs_leave_trees_with_terminal_status(self):
+        with patch("tracker.models._cad_lookup_by_point"):
+            with_parcel = WorkRecord.objects.create(title="Parcel", latitude=49.0, longitude=17.0)
+            without_coords = WorkRecord.objects.create(
+                title="Moved", latitude=49.1, longitude=17.1
+            )
+        WorkRecord.objects.filter(pk=with_parcel.pk).update(parcel_number="710504-241/1")
+        WorkRecord.objects.filter(pk=without_coords.pk).update(latitude=None, longitude=None)
+
+        with patch("tracker.models._cad_lookup_by_point") as lookup:
+            outcomes = run_cadastre_jobs()
+        lookup.assert_not_called()
+        self.assertEqual(outcomes[CadastreLookupJob.Status.DONE], 2)
+        with_parcel.refresh_from_db()
+        without_coords.refresh_from_db()
+        self.assertEqual(with_parcel.cad_lookup_status, "ok")
+        self.assertEqual(without_coords.cad_lookup_status, "error")
+
+
+PARCEL_GML_TEMPLATE = """<?xml version="1.0" encoding="UTF-8"?>
+<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0"
+    xmlns:gml="http://www.opengis.net/gml/3.2"
+    xmlns:cp="http://inspire.ec.europa.eu/schemas/cp/4.0"
+    xmlns:base="http://inspire.ec.europa.eu/schemas/base/3.3">
+{members}
+</wfs:FeatureCollection>
+"""
+
+PARCEL_GML_MEMBER = """<wfs:member><cp:CadastralParcel gml:id="CP.{ref}">
+  <cp:geometry><gml:MultiSurface srsName="urn:ogc:def:crs:EPSG::5514"><gml:surfaceMember>
+    <gml:Polygon>
+      <gml:exterior><gml:LinearRing><gml:posList>{outer}</gml:posList></gml:LinearRing></gml:exterior>
+      {holes}
+    </gml:Polygon>
+  </gml:surfaceMember></gml:MultiSurface></cp:geometry>
+  <cp:inspireId><base:Identifier><base:localId>{ref}</base:localId>
+    <base:namespace>CZ-00025712-CUZK_CP</base:namespace></base:Identifier></cp:inspireId>
+  <cp:nationalCadastralReference>{ref}</cp:nationalCadastralReference>
+</cp:CadastralParcel></wfs:member>"""
+
+
+def _square_ring(x, y, half):
+    points = [(x - half, y - half), (x + half, y - half), (x + half, y + half), (x - half, y + half)]
+    points.append(points[0])
+    return " ".join(f"{px} {py}" for px, py in points)
+
+
+class ParcelIndexTests(TestCase):
+    def setUp(self):
+        from .services.cuzk import wgs84_to_sjtsk_with_fallback
+
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.lon, self.lat = 17.25, 49.6
+        self.x, self.y, _ = wgs84_to_sjtsk_with_fallback(self.lon, self.lat)
+
+    def _write_gml(self, members):
+        path = Path(self.tmpdir.name) / "parcels.xml"
+        path.write_text(PARCEL_GML_TEMPLATE.format(members="".join(members)), encoding="utf-8")
+        return path
+
+    def test_import_and_lookup_replaces_wfs_for_covered_points(self):
+        hole = (
+            "<gml:interior><gml:LinearRing><gml:posList>"
+            f"{_square_ring(self.x + 50, self.y, 5)}"
+            "</gml:posList></gml:LinearRing></gml:interior>"
+        )
+        gml_path = self._write_gml(
+            [
+                PARCEL_GML_MEMBER.format(
+                    ref="710504-241/1", outer=_square_ring(self.x, self.y, 10), holes=""
+                ),
+                PARCEL_GML_MEMBER.format(
+                    ref="710504-241/2", outer=_square_ring(self.x + 50, self.y, 20), holes=hole
+                ),
+            ]
+        )
+        index_path = Path(self.tmpdir.name) / "parcels.idx"
+        out = io.StringIO()
+        call_command("import_parcels", str(gml_path), output=str(index_path), stdout=out)
+        self.assertIn("Indexed 2 parcels", out.getvalue())
+
+        from .models import _cad_lookup_by_point
+
+        with override_settings(PARCEL_INDEX_PATH=str(index_path)):
+            with patch("tracker.models._http_get") as http_get:
+                result = _cad_lookup_by_point(self.lon, self.lat)
+            http_get.assert_not_called()
+            self.assertEqual(result["parcel_number"], "710504-241/1")
+            self.assertEqual(result["cad_lookup_status"], "ok")
+
+            from .services.parcels import lookup_parcel_sjtsk
+
+            self.assertEqual(
+                lookup_parcel_sjtsk(self.x + 60, self.y)["parcel_number"], "710504-241/2"
+            )
+            self.assertIsNone(lookup_parcel_sjtsk(self.x + 50, self.y))
+            self.assertIsNone(lookup_parcel_sjtsk(self.x + 200, self.y))
+
+    def test_packed_index_merges_and_rejects_foreign_files(self):
+        from .services.parcels import PARCEL_INDEX_MAGIC, PackedParcelIndex, load_parcel_index
+
+        index_path = Path(self.tmpdir.name) / "parcels.idx"
+        first = self._write_gml(
+            [PARCEL_GML_MEMBER.format(ref="1-1/1", outer=_square_ring(5, 5, 5), holes="")]
+        )
+        call_command("import_parcels", str(first), output=str(index_path), stdout=io.StringIO())
+        second = self._write_gml(
+            [PARCEL_GML_MEMBER.format(ref="1-1/2", outer=_square_ring(15, 5, 5), holes="")]
+        )
+        call_command(
+            "import_parcels", str(second), output=str(index_path), merge=True, stdout=io.StringIO()
+        )
+        self.assertEqual(index_path.read_bytes()[:8], PARCEL_INDEX_MAGIC)
+
+        index = load_parcel_index(index_path)
+        self.assertIsInstance(index, PackedParcelIndex)
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.lookup(2, 2)["parcel_number"], "1-1/1")
+        self.assertEqual(index.lookup(12, 2)["parcel_number"], "1-1/2")
+        self.assertEqual(index.bounds, (0.0, 0.0, 20.0, 10.0))
+
+        legacy_path = Path(self.tmpdir.name) / "legacy.idx"
+        legacy_path.write_bytes(b"\x80\x05legacy pickle")
+        with self.assertLogs("tracker.services.parcels", level="WARNING"):
+            self.assertIsNone(load_parcel_index(legacy_path))
+
+    def test_str_index_finds_parcels_in_large_grid(self):
+        from .services.parcels import PackedParcelIndex, ParcelIndex, iter_gml_parcels
+
+        members = [
+            PARCEL_GML_MEMBER.format(
+                ref=f"1-{row}/{col}",
+                outer=_square_ring(col * 10 + 5, row * 10 + 5, 5),
+                holes="",
+            )
+            for row in range(30)
+            for col in range(30)
+        ]
+        with open(self._write_gml(members), "rb") as fh:
+            index = ParcelIndex(list(iter_gml_parcels(fh)))
+        self.assertEqual(len(index), 900)
+        index_path = Path(self.tmpdir.name) / "grid.idx"
+        index.save(index_path)
+        packed = PackedParcelIndex(index_path)
+        self.assertEqual(len(packed.levels), len(index.levels))
+        for candidate in (index, packed):
+            for row, col in [(0, 0), (29, 29), (13, 7), (4, 22)]:
+                fields = candidate.lookup(col * 10 + 2.5, row * 10 + 7.5)
+                self.assertEqual(fields["parcel_number"], f"1-{row}/{col}")
+            self.assertIsNone(candidate.lookup(-1, -1))
+
+
+WFS_PARCEL_PAYLOAD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0"
+    xmlns:cp="http://inspire.ec.europa.eu/schemas/cp/4.0"
+    xmlns:base="http://inspire.ec.europa.eu/schemas/base/3.3">
+  <wfs:member><cp:CadastralParcel>
+    <cp:inspireId><base:Identifier><base:localId>710504-241/1</base:localId></base:Identifier></cp:inspireId>
+    <cp:nationalCadastralReference>710504-241/1</cp:nationalCadastralReference>
+  </cp:CadastralParcel></wfs:member>
+</wfs:FeatureCollection>"""
+
+WFS_EMPTY_PAYLOAD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<wfs:FeatureCollection xmlns:wfs="http://www.opengis.net/wfs/2.0"/>"""
+
+WFS_EXCEPTION_PAYLOAD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<ows:ExceptionReport xmlns:ows="http://www.opengis.net/ows/1.1" version="2.0.0">
+  <ows:Exception exceptionCode="OperationProcessingFailed"/>
+</ows:ExceptionReport>"""
+
+
+class CadastreLookupCacheTests(TestCase):
+    def test_point_lookup_results_are_cached_per_cell(self):
+        from .models import _cad_lookup_by_point
+
+        with patch(
+            "tracker.models._http_get", return_value=(200, "text/xml", WFS_PARCEL_PAYLOAD)
+        ) as http_get:
+            first = _cad_lookup_by_point(17.25, 49.6)
+            second = _cad_lookup_by_point(17.25, 49.6)
+        self.assertEqual(http_get.call_count, 1)
+        self.assertEqual(first, second)
+        self.assertEqual(second["parcel_number"], "710504-241/1")
+        self.assertEqual(second["cad_lookup_status"], "ok")
+
+        with patch(
+            "tracker.models._http_get", return_value=(200, "text/xml", WFS_EMPTY_PAYLOAD)
+        ) as http_get:
+            self.assertEqual(_cad_lookup_by_point(17.35, 49.6)["cad_lookup_status"], "not_found")
+            self.assertEqual(_cad_lookup_by_point(17.35, 49.6)["cad_lookup_status"], "not_found")
+        self.assertEqual(http_get.call_count, 1)
+        ok_entry = CadastreLookupCache.objects.get(status="ok")
+        not_found_entry = CadastreLookupCache.objects.get(status="not_found")
+        self.assertLess(not_found_entry.expires_at, ok_entry.expires_at)
+
+    def test_errors_and_expired_entries_are_not_served(self):
+        from .models import _cad_lookup_by_point
+
+        with patch("tracker.models._http_get", side_effect=OSError("down")):
+            with self.assertRaises(OSError):
+                _cad_lookup_by_point(17.25, 49.6)
+        self.assertFalse(CadastreLookupCache.objects.exists())
+
+        with patch(
+            "tracker.models._http_get", return_value=(200, "text/xml", WFS_PARCEL_PAYLOAD)
+        ):
+            _cad_lookup_by_point(17.25, 49.6)
+        CadastreLookupCache.objects.update(expires_at=timezone.now())
+        with patch(
+            "tracker.models._http_get", return_value=(200, "text/xml", WFS_EMPTY_PAYLOAD)
+        ) as http_get:
+            result = _cad_lookup_by_point(17.25, 49.6)
+        http_get.assert_called_once()
+        self.assertEqual(result["cad_lookup_status"], "not_found")
+
+
+class WfsResponseScanTests(TestCase):
+    def test_scan_stops_at_first_parcel(self):
+        from .services.parcels import scan_wfs_response
+
+        # Anything after the first parcel is never parsed, even if malformed.
+        payload = WFS_PARCEL_PAYLOAD.replace(
+            b"</wfs:member>", b"</wfs:member><wfs:member><broken", 1
+        )
+        scan = scan_wfs_response(payload)
+        self.assertTrue(scan["found"])
+        self.assertEqual(scan["root"], "FeatureCollection")
+        self.assertEqual(scan["fields"]["parcel_number"], "710504-241/1")
+        self.assertEqual(scan["fields"]["inspire_local_id"], "710504-241/1")
+
+        empty = scan_wfs_response(WFS_EMPTY_PAYLOAD)
+        self.assertFalse(empty["found"])
+        self.assertEqual(empty["fields"], {})
+        self.assertIsNone(scan_wfs_response(b"not xml")["root"])
+
+    def test_exception_report_is_retried_not_cached(self):
+        from .models import _cad_lookup_by_point
+        from .services.parcels import WfsExceptionReport, scan_wfs_response
+
+        self.assertTrue(scan_wfs_response(WFS_EXCEPTION_PAYLOAD)["exception"])
+        with patch(
+            "tracker.models._http_get", return_value=(200, "text/xml", WFS_EXCEPTION_PAYLOAD)
+        ), self.assertLogs("tracker.models", level="WARNING"):
+            with self.assertRaises(WfsExceptionReport):
+                _cad_lookup_by_point(17.25, 49.6)
+        self.assertFalse(CadastreLookupCache.objects.exists())
+
+    def test_unparsable_response_is_retried_not_cached(self):
+        from .models import _cad_lookup_by_point
+        from .services.parcels import WfsUnexpectedResponse
+
+        truncated = WFS_EMPTY_PAYLOAD.replace(b"/>", b"><wfs:member>")
+        for payload in (b"<html><body>Bad gateway</body></html>", b"", truncated):
+            with patch(
+                "tracker.models._http_get", return_value=(200, "text/html", payload)
+            ), self.assertLogs("tracker.models", level="WARNING"):
+                with self.assertRaises(WfsUnexpectedResponse):
+                    _cad_lookup_by_point(17.25, 49.6)
+        self.assertFalse(CadastreLookupCache.objects.exists())
+
+
+class CuzkClientTests(TestCase):
+    def _response(self, status_code, content=b"{}"):
+        import requests
+
+        response = requests.Response()
+        response.status_code = status_code
+        response._content = content
+        response.url = "https://ags.cuzk.gov.cz/identify"
+        return response
+
+    def test_transient_errors_are_retried_and_measured(self):
+        from .services.cuzk_client import CuzkClient
+
+        client = CuzkClient(retries=2, backoff_s=0)
+        with patch.object(
+            client.session,
+            "request",
+            side_effect=[self._response(503), self._response(200, b'{"value": "1"}')],
+        ) as request:
+            response = client.get("https://ags.cuzk.gov.cz/identify", service="height")
+        self.assertEqual(response.json(), {"value": "1"})
+        self.assertEqual(request.call_count, 2)
+        metrics = client.metrics()["height"]
+        self.assertEqual(metrics["calls"], 2)
+        self.assertEqual(metrics["errors"], 1)
+
+    def test_circuit_opens_after_repeated_failures(self):
+        import requests
+
+        from .services.cuzk_client import CuzkCircuitOpen, CuzkClient
+
+        client = CuzkClient(retries=0, backoff_s=0, circuit_failures=2, circuit_reset_s=60)
+        url = "https://services.cuzk.gov.cz/wfs/inspire-cp-wfs.asp"
+        with patch.object(
+            client.session, "request", side_effect=requests.ConnectionError("down")
+        ) as request, self.assertLogs("tracker.services.cuzk_client", level="WARNING"):
+            for _ in range(2):
+                with self.assertRaises(requests.ConnectionError):
+                    client.get(url)
+            with self.assertRaises(CuzkCircuitOpen):
+                client.get(url)
+        self.assertEqual(request.call_count, 2)
+
+        # Other hosts keep their own circuit.
+        with patch.object(client.session, "request", return_value=self._response(200)):
+            self.assertEqual(client.get("https://ags.cuzk.gov.cz/identify").status_code, 200)
+
+
+class SjtskBatchTransformTests(TestCase):
+    points = [(12.09, 50.25), (14.42, 50.09), (17.25, 49.6), (18.85, 49.55)]
+
+    def test_batch_matches_single_point_transform(self):
+        from .services.cuzk import wgs84_to_sjtsk_many, wgs84_to_sjtsk_with_fallback
+
+        xs, ys, method = wgs84_to_sjtsk_many(
+            [lon for lon, _ in self.points], [lat for _, lat in self.points]
+        )
+        self.assertEqual(method, "pyproj")
+        for (lon, lat), x, y in zip(self.points, xs, ys):
+            expected_x, expected_y, _ = wgs84_to_sjtsk_with_fallback(lon, lat)
+            self.assertAlmostEqual(x, expected_x, places=6)
+            self.assertAlmostEqual(y, expected_y, places=6)
+        self.assertEqual(wgs84_to_sjtsk_many([], []), ([], [], "pyproj"))
+
+    def test_manual_fallback_with_and_without_numpy(self):
+        import sys
+
+        from .services.cuzk import CuzkHeightError, wgs84_to_sjtsk, wgs84_to_sjtsk_many
+
+        lons = [lon for lon, _ in self.points]
+        lats = [lat for _, lat in self.points]
+        expected = [wgs84_to_sjtsk(lon, lat) for lon, lat in self.points]
+        with patch(
+            "tracker.services.cuzk._sjtsk_transformer", side_effect=CuzkHeightError("no pyproj")
+        ):
+            vectorised = wgs84_to_sjtsk_many(lons, lats)
+            with patch.dict(sys.modules, {"numpy": None}):
+                looped = wgs84_to_sjtsk_many(lons, lats)
+        for xs, ys, method in (vectorised, looped):
+            self.assertEqual(method, "manual-fallback")
+            for (expected_x, expected_y), x, y in zip(expected, xs, ys):
+                self.assertAlmostEqual(x, expected_x, places=4)
+                self.assertAlmostEqual(y, expected_y, places=4)
+
+    def test_pyproj_array_failure_falls_back_to_manual_transform(self):
+        from pyproj.exceptions import ProjError
+
+        from .services import cuzk
+
+        transformer = cuzk._sjtsk_transformer()
+
+        class ScalarOnlyTransformer:
+            def transform(self, lons, lats):
+                if isinstance(lons, (list, tuple)):
+                    raise ProjError("array input not supported")
+                return transformer.transform(lons, lats)
+
+        lons = [lon for lon, _ in self.points]
+        lats = [lat for _, lat in self.points]
+        with patch.object(cuzk, "_SJTKS_TRANSFORMER", ScalarOnlyTransformer()), self.assertLogs(
+            "tracker.services.cuzk", level="WARNING"
+        ):
+            xs, ys, method = cuzk.wgs84_to_sjtsk_many(lons, lats)
+        self.assertEqual(method, "manual-fallback")
+        for (lon, lat), x, y in zip(self.points, xs, ys):
+            expected_x, expected_y = cuzk.wgs84_to_sjtsk(lon, lat)
+            self.assertAlmostEqual(x, expected_x, places=4)
+            self.assertAlmostEqual(y, expected_y, places=4)
+
+
+class WorkRecordSjtskTests(TestCase):
+    def setUp(self):
+        with patch.dict("os.environ", {"ARBOMAP_DISABLE_CADASTRE_LOOKUP": "1"}):
+            self.tree = WorkRecord.objects.create(title="WR", latitude=49.6, longitude=17.25)
+
+    def test_save_stores_projection_and_follows_location(self):
+        from .services.cuzk import wgs84_to_sjtsk_with_fallback
+
+        x, y, _ = wgs84_to_sjtsk_with_fallback(17.25, 49.6)
+        self.tree.refresh_from_db()
+        self.assertAlmostEqual(self.tree.sjtsk_x, x, places=6)
+        self.assertAlmostEqual(self.tree.sjtsk_y, y, places=6)
+
+        self.tree.latitude = 49.61
+        self.tree.save(update_fields=["latitude"])
+        self.tree.refresh_from_db()
+        moved_x, _, _ = wgs84_to_sjtsk_with_fallback(17.25, 49.61)
+        self.assertAlmostEqual(self.tree.sjtsk_x, moved_x, places=6)
+
+        self.tree.latitude = None
+        self.tree.save(update_fields=["latitude"])
+        self.tree.refresh_from_db()
+        self.assertIsNone(self.tree.sjtsk_x)
+        self.assertIsNone(self.tree.sjtsk_y)
+
+    def test_backfill_command_fills_missing_coordinates(self):
+        WorkRecord.objects.filter(pk=self.tree.pk).update(sjtsk_x=None, sjtsk_y=None)
+        out = io.StringIO()
+        call_command("backfill_sjtsk", stdout=out)
+        self.assertIn("for 1 trees", out.getvalue())
+        self.tree.refresh_from_db()
+        self.assertIsNotNone(self.tree.sjtsk_x)
+        self.assertLess(self.tree.sjtsk_y, 0)
+
+        out = io.StringIO()
+        call_command("backfill_sjtsk", stdout=out)
+        self.assertIn("for 0 trees", out.getvalue())
+
+
+class CuzkHeightEstimateTests(TestCase):
+    def test_dmr_and_dmp_are_sampled_in_parallel(self):
+        import threading
+
+        from .services.cuzk import estimate_tree_height_from_cuzk
+
+        # Both calls must be in flight at once to get past the barrier.
+        barrier = threading.Barrier(2, timeout=2)
+
+        def pixel_value(url, x, y, label, timeout_s=5):
+            barrier.wait()
+            return 250.0 if label == "DMR 5G" else 268.5
+
+        with patch("tracker.services.cuzk.get_image_server_pixel_value", side_effect=pixel_value):
+            result = estimate_tree_height_from_cuzk(lat=49.6, lon=17.25)
+        self.assertEqual(result["estimated_height_m"], 18.5)
+        self.assertEqual(set(result["duration_ms_breakdown"]), {"transform", "dmr", "dmp"})
+
+    def test_deadline_and_service_errors(self):
+        import threading
+
+        from .services.cuzk import CuzkHeightError, estimate_tree_height_from_cuzk
+
+        release = threading.Event()
+        self.addCleanup(release.set)
+
+        def slow_pixel_value(url, x, y, label, timeout_s=5):
+            release.wait(2)
+            return 250.0
+
+        with patch(
+            "tracker.services.cuzk.get_image_server_pixel_value", side_effect=slow_pixel_value
+        ), self.assertLogs("tracker.services.cuzk", level="WARNING"):
+            with self.assertRaisesMessage(CuzkHeightError, "vypršel"):
+                estimate_tree_height_from_cuzk(lat=49.6, lon=17.25, deadline_s=0.1)
+        release.set()
+
+        def failing_dmr(url, x, y, label, timeout_s=5):
+            if label == "DMR 5G":
+                raise CuzkHeightError("ČÚZK DMR 5G vrátil chybu: x.")
+            release.wait(2)
+            return 268.5
+
+        release.clear()
+        with patch("tracker.services.cuzk.get_image_server_pixel_value", side_effect=failing_dmr):
+            with self.assertRaisesMessage(CuzkHeightError, "DMR 5G"):
+                estimate_tree_height_from_cuzk(lat=49.6, lon=17.25, deadline_s=5)
+
+    def test_crown_estimate_uses_grid_statistics_and_cached_samples(self):
+        from .services.cuzk import circle_grid_points, estimate_crown_height_from_cuzk
+
+        cache.clear()
+        self.assertEqual(len(circle_grid_points(0, 0, radius_m=3, step_m=1)), 29)
+        calls = []
+
+        def samples(url, params, timeout_s=5):
+            count = len(json.loads(params["geometry"])["points"])
+            calls.append(url)
+            if "dmr5g" in url:
+                values = [250.0] * (count - 1) + [262.0]
+            else:
+                # A crown gap at the tree point itself, foliage around it.
+                values = [250.1] + [268.0 + index / 100 for index in range(count - 1)]
+            return {
+                "samples": [
+                    {"locationId": index, "value": str(value)} for index, value in enumerate(values)
+                ]
+            }
+
+        with patch("tracker.services.cuzk._http_post_json", side_effect=samples):
+            first = estimate_crown_height_from_cuzk(lat=49.6, lon=17.25)
+            second = estimate_crown_height_from_cuzk(lat=49.6, lon=17.25)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(first["sample_count"], 29)
+        self.assertEqual(first["dmr_m"], 250.0)
+        self.assertEqual(first["dmp_m"], 268.25)
+        self.assertEqual(first["dmp_max_m"], 268.27)
+        self.assertEqual(first["estimated_height_m"], 18.25)
+        self.assertEqual(second["estimated_height_m"], first["estimated_height_m"])
+
+
+class HeightEstimateStoreTests(TestCase):
+    def setUp(self):
+        with patch.dict("os.environ", {"ARBOMAP_DISABLE_CADASTRE_LOOKUP": "1"}):
+            self.tree = WorkRecord.objects.create(title="WR", latitude=49.6, longitude=17.25)
+        self.user = get_user_model().objects.create_superuser(
+            username="admin", password="pass1234", email="admin@example.com"
+        )
+        self.client.force_login(self.user)
+        self.url = reverse("workrecord_height_estimate_api", args=[self.tree.pk]) + "?method=crown"
+
+    def _estimate(self, lat, lon, sjtsk=None):
+        return {
+            "ok": True,
+            "dmr_m": 250.0,
+            "dmp_m": 268.5,
+            "estimated_height_m": 18.5,
+            "duration_ms": 120,
+            "duration_ms_breakdown": {"transform": 1, "dmr": 110, "dmp": 119},
+            "source": "CUZK DMP OK - DMR 5G",
+            "sjtsk_x": -548000.0,
+            "sjtsk_y": -1140000.0,
+            "transform_method": "pyproj",
+            "warnings": [],
+        }
+
+    def test_repeated_requests_are_served_from_store_until_tree_moves(self):
+        with patch(
+            "tracker.views.estimate_crown_height_from_cuzk", side_effect=self._estimate
+        ) as estimate:
+            first = self.client.get(self.url).json()
+            second = self.client.get(self.url).json()
+            self.assertEqual(estimate.call_count, 1)
+            self.assertFalse(first["cached"])
+            self.assertTrue(second["cached"])
+            self.assertEqual(second["estimated_height_m"], 18.5)
+            self.assertEqual(second["estimated_at"], first["estimated_at"])
+
+            resp = self.client.post(
+                reverse("workrecord_set_location", args=[self.tree.pk]),
+                {"lat": "49.61", "lon": "17.25"},
+            )
+            self.assertEqual(resp.status_code, 200)
+            self.assertFalse(self.tree.height_estimates.exists())
+            self.assertFalse(self.client.get(self.url).json()["cached"])
+            self.assertEqual(estimate.call_count, 2)
+
+    def test_point_method_stays_the_default(self):
+        url = reverse("workrecord_height_estimate_api", args=[self.tree.pk])
+        with patch(
+            "tracker.views.estimate_tree_height_from_cuzk", side_effect=self._estimate
+        ) as point, patch("tracker.views.estimate_crown_height_from_cuzk") as crown:
+            data = self.client.get(url).json()
+        self.assertEqual(data["method"], "point")
+        point.assert_called_once()
+        crown.assert_not_called()
+
+
+class EstimateProjectHeightsCommandTests(TestCase):
+    def setUp(self):
+        with patch.dict("os.environ", {"ARBOMAP_DISABLE_CADASTRE_LOOKUP": "1"}):
+            self.project = Project.objects.create(name="Výšky")
+            self.draft = WorkRecord.objects.create(title="Draft", latitude=49.6, longitude=17.25)
+            self.measured = WorkRecord.objects.create(
+                title="Measured", latitude=49.6001, longitude=17.2501
+            )
+            self.bare = WorkRecord.objects.create(title="Bare", latitude=49.6002, longitude=17.2502)
+        self.project.trees.add(self.draft, self.measured, self.bare)
+        self.draft_assessment = TreeAssessment.objects.create(
+            work_record=self.draft, crown_width_m=4
+        )
+        TreeAssessment.objects.create(work_record=self.measured, height_m=12.0)
+        self.requests = []
+
+    def _samples(self, url, params, timeout_s=5):
+        points = json.loads(params["geometry"])["points"]
+        self.requests.append((url, len(points)))
+        value = 250.0 if "dmr5g" in url else 268.44
+        return {
+            "samples": [
+                {"locationId": index, "value": str(value)} for index in range(len(points))
+            ]
+        }
+
+    def test_heights_are_written_as_drafts_in_bulk(self):
+        out = io.StringIO()
+        with patch("tracker.services.cuzk._http_post_json", side_effect=self._samples):
+            call_command(
+                "estimate_project_heights",
+                project_id=self.project.pk,
+                create_missing=True,
+                stdout=out,
+            )
+        # One multipoint getSamples request per service for the two trees needing a height.
+        self.assertEqual(sorted(count for _url, count in self.requests), [2, 2])
+        self.assertIn("1 heights updated, 1 assessments created, 1 measured kept", out.getvalue())
+
+        self.draft_assessment.refresh_from_db()
+        self.assertEqual(self.draft_assessment.height_m, 18.4)
+        self.assertEqual(self.draft_assessment.height_m_source, "CUZK DMP OK - DMR 5G")
+        self.assertEqual(str(self.draft_assessment.crown_area_m2), "73.60")
+        self.assertEqual(self.measured.assessments.get().height_m, 12.0)
+        created = self.bare.assessments.get()
+        self.assertEqual(created.height_m, 18.4)
+        self.assertTrue(TreeMapSummary.objects.get(work_record=self.bare).has_tree_assessment)
+
+    @override_settings(STATICFILES_STORAGE="django.contrib.staticfiles.storage.StaticFilesStorage")
+    def test_drafts_are_visible_as_drafts(self):
+        intervention_type = InterventionType.objects.create(code="S-RZ-T", name="Řez zdravotní")
+        intervention = TreeIntervention.objects.create(
+            tree=self.draft, intervention_type=intervention_type
+        )
+        with patch("tracker.services.cuzk._http_post_json", side_effect=self._samples):
+            call_command("estimate_project_heights", project_id=self.project.pk, stdout=io.StringIO())
+        user = get_user_model().objects.create_superuser(username="admin", password="pass1234")
+        self.client.force_login(user)
+        url = reverse("workrecord_assessment_api", args=[self.draft.pk])
+
+        data = self.client.get(url).json()
+        self.assertEqual(data["height_m"], 18.4)
+        self.assertTrue(data["height_m_is_draft"])
+        self.assertEqual(data["height_m_source"], "CUZK DMP OK - DMR 5G")
+        self.assertFalse(
+            self.client.get(reverse("workrecord_assessment_api", args=[self.measured.pk])).json()[
+                "height_m_is_draft"
+            ]
+        )
+        response = self.client.get(reverse("work_record_detail", args=[self.draft.pk]))
+        self.assertContains(response, "návrh k potvrzení")
+        intervention.refresh_from_db()
+        self.assertEqual(
+            intervention.estimated_price_breakdown["height_m_source"], "CUZK DMP OK - DMR 5G"
+        )
+
+        # Saving the draft back unchanged keeps it a draft; without the source it is measured.
+        payload = {"height_m": 18.4, "crown_width_m": "4", "height_m_source": data["height_m_source"]}
+        saved = self.client.post(url, json.dumps(payload), content_type="application/json").json()
+        self.assertTrue(saved["height_m_is_draft"])
+        del payload["height_m_source"]
+        saved = self.client.post(url, json.dumps(payload), content_type="application/json").json()
+        self.assertFalse(saved["height_m_is_draft"])
+        self.assertEqual(saved["height_m_source"], "")
+
+    def test_samples_are_chunked(self):
+        from .services.cuzk import get_image_server_samples
+
+        with patch("tracker.services.cuzk.GET_SAMPLES_MAX_POINTS", 2), patch(
+            "tracker.services.cuzk._http_post_json", side_effect=self._samples
+        ):
+            values = get_image_server_samples(
+                "https://ags.cuzk.gov.cz/dmr5g/ImageServer", [(0, 0)] * 5, "DMR 5G"
+            )
+        self.assertEqual(values, [250.0] * 5)
+        self.assertEqual([count for _url, count in self.requests], [2, 2, 1])
+
+    def test_batch_estimates_use_their_own_pool_and_deadline(self):
+        import threading
+
+        from .services.cuzk import (
+            CuzkHeightError,
+            estimate_tree_heights_from_cuzk,
+            get_image_server_samples,
+        )
+
+        threads = set()
+
+        def samples(url, params, timeout_s=5):
+            threads.add(threading.current_thread().name)
+            return self._samples(url, params, timeout_s)
+
+        with patch("tracker.services.cuzk._http_post_json", side_effect=samples):
+            estimates = estimate_tree_heights_from_cuzk([(0, 0)] * 3)
+            self.assertEqual(len(estimates), 3)
+            self.assertTrue(all(name.startswith("cuzk-height-batch") for name in threads))
+
+            self.requests = []
+            with self.assertRaises(CuzkHeightError):
+                get_image_server_samples(
+                    "https://ags.cuzk.gov.cz/dmr5g/ImageServer",
+                    [(0, 0)] * 3,
+                    "DMR 5G",
+                    deadline_at=time.perf_counter(),
+                )
+            self.assertEqual(self.requests, [])
+
+
+class CadastreBatchLookupTests(TestCase):
+    def test_clustered_jobs_share_paged_bbox_requests(self):
+        from .services.cuzk import wgs84_to_sjtsk_with_fallback
+
+        coords = [(17.25, 49.6), (17.2504, 49.6), (17.25, 49.6004), (17.2508, 49.6008)]
+        records = [
+            WorkRecord.objects.create(title=f"WR {index}", latitude=lat, longitude=lon)
+            for index, (lon, lat) in enumerate(coords)
+        ]
+        members = []
+        for index, (lon, lat) in enumerate(coords[:3]):
+            x, y, _ = wgs84_to_sjtsk_with_fallback(lon, lat)
+            members.append(
+                PARCEL_GML_MEMBER.format(
+                    ref=f"710504-241/{index + 1}", outer=_square_ring(x, y, 5), holes=""
+                )
+            )
+        pages = [
+            PARCEL_GML_TEMPLATE.format(members="".join(members[:2])).encode(),
+            PARCEL_GML_TEMPLATE.format(members=members[2]).encode(),
+        ]
+
+        with patch("tracker.cadastre_batch.CADASTRE_BATCH_PAGE_SIZE", 2), patch(
+            "tracker.cadastre_batch.CADASTRE_BATCH_CLUSTER_M", 10_000.0
+        ), patch(
+            "tracker.cadastre_batch._http_get",
+            side_effect=[(200, "text/xml", page) for page in pages],
+        ) as http_get, patch(
+            "tracker.models._cad_lookup_by_point",
+            return_value={"cad_lookup_status": "not_found"},
+        ) as point_lookup:
+            outcomes = run_cadastre_jobs()
+
+        self.assertEqual(outcomes[CadastreLookupJob.Status.DONE], 4)
+        self.assertEqual(http_get.call_count, 2)
+        self.assertIn("STARTINDEX=0", http_get.call_args_list[0].args[0])
+        self.assertIn("STARTINDEX=2", http_get.call_args_list[1].args[0])
+        records[3].refresh_from_db()
+        point_lookup.assert_called_once_with(
+            17.2508, 49.6008, sjtsk=(records[3].sjtsk_x, records[3].sjtsk_y)
+        )
+        for index, record in enumerate(records[:3]):
+            record.refresh_from_db()
+            self.assertEqual(record.parcel_number, f"710504-241/{index + 1}")
+            self.assertEqual(record.cad_lookup_status, "ok")
+        records[3].refresh_from_db()
+        self.assertEqual(records[3].cad_lookup_status, "not_found")
+        self.assertEqual(CadastreLookupCache.objects.filter(status="ok").count(), 3)
+
+
+class BackfillCadastreCommandTests(TestCase):
+    def setUp(self):
+        with patch.dict("os.environ", {"ARBOMAP_DISABLE_CADASTRE_LOOKUP": "1"}):
+            self.failed = WorkRecord.objects.create(
+                title="Failed", latitude=49.6, longitude=17.25, cad_lookup_status="error"
+            )
+            self.twin = WorkRecord.objects.create(
+                title="Twin", latitude=49.6000001, longitude=17.2500001
+            )
+            self.missing = WorkRecord.objects.create(
+                title="Missing", latitude=49.7, longitude=17.3, cad_lookup_status="not_found"
+            )
+            self.done = WorkRecord.objects.create(
+                title="Done",
+                latitude=49.8,
+                longitude=17.4,
+                cad_lookup_status="ok",
+                parcel_number="1-1/1",
+            )
+        self.lookup_points = []
+
+    def _lookup(self, lon, lat, sjtsk=None):
+        from .services.cuzk_client import get_cuzk_client
+
+        self.lookup_points.append(sjtsk)
+        # Stand-in for the WFS request the real point lookup sends.
+        get_cuzk_client()._record("cadastre", time.perf_counter(), ok=True)
+        if round(lat, 1) == 49.6:
+            return {"parcel_number": "710504-241/1", "cad_lookup_status": "ok"}
+        return {"cad_lookup_status": "not_found"}
+
+    def test_backfill_deduplicates_coordinates_and_bulk_updates(self):
+        out = io.StringIO()
+        with patch(
+            "tracker.models._cad_lookup_by_point",
+            side_effect=self._lookup,
+        ) as lookup:
+            call_command("backfill_cadastre", rate=0, batch_size=10, stdout=out)
+        self.assertEqual(lookup.call_count, 2)
+        self.assertIn("Backfilled cadastre for 3 trees with 2 WFS requests", out.getvalue())
+        # The stored S-JTSK coordinates are passed on instead of re-projecting.
+        self.assertIsNotNone(self.failed.sjtsk_x)
+        self.assertEqual(
+            sorted(self.lookup_points),
+            sorted(
+                [
+                    (self.failed.sjtsk_x, self.failed.sjtsk_y),
+                    (self.missing.sjtsk_x, self.missing.sjtsk_y),
+                ]
+            ),
+        )
+
+        for record in (self.failed, self.twin):
+            record.refresh_from_db()
+            self.assertEqual(record.parcel_number, "710504-241/1")
+            self.assertEqual(record.cadastral_area_code, "710504")
+            self.assertEqual(record.cad_lookup_status, "ok")
+        self.missing.refresh_from_db()
+        self.assertEqual(self.missing.cad_lookup_status, "not_found")
+        self.assertIsNotNone(self.missing.cad_lookup_at)
+
+    def test_backfill_resumes_from_checkpoint(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            checkpoint = Path(tmpdir) / "backfill.checkpoint"
+            with patch(
+                "tracker.models._cad_lookup_by_point",
+                side_effect=self._lookup,
+            ) as lookup:
+                call_command(
+                    "backfill_cadastre",
+                    rate=0,
+                    batch_size=1,
+                    limit=1,
+                    checkpoint=str(checkpoint),
+                    stdout=io.StringIO(),
+                )
+                self.assertEqual(checkpoint.read_text(), str(self.failed.pk))
+                call_command(
+                    "backfill_cadastre",
+                    rate=0,
+                    checkpoint=str(checkpoint),
+                    stdout=io.StringIO(),
+                )
+            self.assertEqual(lookup.call_count, 3)
+            self.assertFalse(checkpoint.exists())
+
+
 class RuianImportTests(TestCase):
     def test_import_ruian_from_sample_dir(self):
         sample_dir = Path(__file__).resolve().parent / "data" / "ruian_sample"
@@ -1003,6 +2770,7 @@ class WorkRecordRuianEnrichmentTests(TestCase):
             record = WorkRecord.objects.create(
                 title="WR", latitude=49.0, longitude=17.0
             )
+            run_cadastre_jobs()
         record.refresh_from_db()
         return record
 
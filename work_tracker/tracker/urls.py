@@ -46,6 +46,12 @@ urlpatterns = [
     path("map-gl-pilot/", views.map_gl_pilot, name="map_gl_pilot"),
     path("map-project/<int:pk>/", views.map_project_redirect, name="map_project_redirect"),
     path("api/workrecords.geojson", views.workrecords_geojson, name="workrecords_geojson"),
+    path("api/workrecords/facets.json", views.workrecords_facets, name="workrecords_facets"),
+    path(
+        "api/workrecords/<int:z>/<int:x>/<int:y>.mvt",
+        views.workrecords_mvt,
+        name="workrecords_mvt",
+    ),
     path("api/gbif-taxons/", views.gbif_taxon_suggest, name="gbif_taxon_suggest"),
     path("save-coordinates/", views.save_coordinates, name="save_coordinates"),
     path("map-upload-photo/", views.map_upload_photo, name="map_upload_photo"),
@@ -21,6 +21,8 @@ from django.conf import settings
 from django.contrib import messages
 from django.contrib.auth import logout
 from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.exceptions import ValidationError
 from django.core.files import File
 from django.core.files.base import ContentFile
 from django.core.paginator import Paginator
@@ -39,6 +41,7 @@ from django.db.models import (
     When,
     BooleanField,
 )
+from django.db.models.functions import Coalesce
 from django.http import (
     StreamingHttpResponse,
     FileResponse,
@@ -49,9 +52,10 @@ from django.http import (
 from django.shortcuts import render, redirect, get_object_or_404
 from django.urls import reverse
 from django.utils import timezone
+from django.utils.cache import patch_cache_control, patch_vary_headers
 from django.utils.dateparse import parse_date
 from django.utils.safestring import mark_safe
-from django.views.decorators.http import require_GET, require_http_methods
+from django.views.decorators.http import condition, require_GET, require_http_methods
 from PIL import Image
 
 from .forms import (
@@ -73,12 +77,23 @@ from .models import (
     TreeAssessment,
     ShrubAssessment,
     TreeIntervention,
+    TreeMapSummary,
+    InterventionType,
     Species,
     MISTLETOE_LEVELS,
     ACCESS_OBSTACLE_LEVEL_CHOICES,
     ACCESS_OBSTACLE_MULTIPLIERS,
     MISTLETOE_MULTIPLIERS,
+    INTERVENTION_STATUS_CHOICES,
 )
+from .height_estimates import cached_tree_height_estimate, invalidate_tree_height_estimates
+from .map_changes import (
+    latest_map_change_id,
+    map_change_horizon,
+    map_changed_tree_ids,
+    map_feed_state,
+)
+from .project_pricing import check_tree_link_price_lists, project_price_totals
 from .permissions import (
     user_projects_qs,
     user_can_view_project,
@@ -91,11 +106,17 @@ from .permissions import (
     can_purge_project,
     can_transition_intervention,
 )
-from .services.cuzk import CuzkHeightError, estimate_tree_height_from_cuzk
+from .services import mvt
+from .services.cuzk import (
+    CuzkHeightError,
+    estimate_crown_height_from_cuzk,
+    estimate_tree_height_from_cuzk,
+)
 from .services.export_snapshot import (
     build_tree_export_snapshot,
     prepare_tree_export_queryset,
 )
+from .spatial_grid import bbox_key_q
 
 # ------------------ Auth / základní stránky ------------------
 logger = logging.getLogger(__name__)
@@ -259,26 +280,21 @@ def project_detail(request, pk):
     can_lock = can_lock_project(request.user, project)
     can_delete = can_delete_project(request.user, project)
     project_tree_stats = project.trees.aggregate(
-        tree_count=Count("id", distinct=True),
+        tree_count=Count("id"),
         completed_tree_count=Count(
             "id",
-            filter=Q(interventions__status="completed"),
-            distinct=True,
+            filter=Q(map_summary__has_approved_intervention=True),
         ),
         pending_check_tree_count=Count(
             "id",
-            filter=Q(interventions__status="done_pending_owner"),
-            distinct=True,
+            filter=Q(map_summary__has_done_intervention=True),
         ),
         proposed_felling_tree_count=Count(
             "id",
-            filter=Q(
-                interventions__status="proposed",
-                interventions__intervention_type__category="Kácení",
-            ),
-            distinct=True,
+            filter=Q(map_summary__has_proposed_removal_intervention=True),
         ),
     )
+    price_totals = project_price_totals(project)
     return render(
         request,
         "tracker/project_detail.html",
@@ -292,6 +308,8 @@ def project_detail(request, pk):
             "completed_tree_count": project_tree_stats["completed_tree_count"],
             "pending_check_tree_count": project_tree_stats["pending_check_tree_count"],
             "proposed_felling_tree_count": project_tree_stats["proposed_felling_tree_count"],
+            "proposed_price_czk": price_totals["by_status"].get("proposed", 0),
+            "total_price_czk": price_totals["total_czk"],
         },
     )
 
@@ -687,7 +705,12 @@ def create_work_record(request, project_id=None):
                     return redirect('work_record_list')
                 if not user_can_view_project(request.user, project.pk):
                     return redirect('work_record_list')
-                project.trees.add(work_record)
+                try:
+                    check_tree_link_price_lists([project.pk], [work_record.pk])
+                except ValidationError as exc:
+                    messages.error(request, " ".join(exc.messages))
+                else:
+                    project.trees.add(work_record)
 
             if 'photo' in request.FILES and photo_form.is_valid():
                 photo = photo_form.save(commit=False)
@@ -1321,6 +1344,7 @@ EXPORT_HEADERS = [
     "assessment_stem_diameters_cm_list",
     "assessment_stem_circumferences_cm_list",
     "assessment_height_m",
+    "assessment_height_m_source",
     "assessment_crown_width_m",
     "assessment_crown_area_m2",
     "assessment_physiological_age",
@@ -1466,6 +1490,7 @@ def _export_row_native(record, assessment, shrub_assessment):
         _format_csv_list(assessment.stem_diameters_cm_list) if assessment else "",
         _format_csv_list(assessment.stem_circumferences_cm_list) if assessment else "",
         to_float(assessment.height_m) if assessment and assessment.height_m is not None else None,
+        assessment.height_m_source or None if assessment else None,
         to_float(assessment.crown_width_m) if assessment and assessment.crown_width_m is not None else None,
         to_float(assessment.crown_area_m2) if assessment and assessment.crown_area_m2 is not None else None,
         assessment.physiological_age if assessment and assessment.physiological_age is not None else None,
@@ -1520,6 +1545,11 @@ def _split_interventions_for_summary(value):
 
 
 def _add_summary_sheet(wb, export_rows, format_sheet, *, index=None):
+    """
+    Trees per proposed intervention among the exported rows. Counted from the rows on
+    purpose: a selection export covers only some trees, while ProjectPriceTotal holds
+    whole-project sums and backs the separate "Odhad ceny" sheet of full exports.
+    """
     intervention_counts = Counter()
 
     for row in export_rows:
@@ -1549,6 +1579,33 @@ def _add_summary_sheet(wb, export_rows, format_sheet, *, index=None):
     return ws
 
 
+def _add_price_totals_sheet(wb, price_totals, format_sheet, *, index=None):
+    """Project-wide estimated prices per status and category from ProjectPriceTotal."""
+    from openpyxl.styles import Font
+
+    status_labels = dict(INTERVENTION_STATUS_CHOICES)
+    ws = wb.create_sheet("Odhad ceny", index)
+    headers = ["Stav zásahu", "Kategorie", "Počet zásahů", "Oceněno", "Odhad ceny"]
+    ws.append(headers)
+    for row in price_totals["rows"]:
+        ws.append([
+            status_labels.get(row.status, row.status),
+            row.category,
+            row.intervention_count,
+            row.priced_count,
+            row.total_czk,
+        ])
+    ws.append([
+        "Celkem",
+        "",
+        price_totals["intervention_count"],
+        price_totals["priced_count"],
+        price_totals["total_czk"],
+    ])
+    format_sheet(ws, headers, [28, 28, 14, 12, 18], currency_headers={"Odhad ceny"})
+    for cell in ws[ws.max_row]:
+        cell.font = Font(bold=True)
+    return ws
 
 
 @login_required
@@ -1718,6 +1775,7 @@ def export_selected_xlsx(request, pk):
         "Český název",
         "Datum hodnocení",
         "Výška [m]",
+        "Zdroj výšky",
         "Obvod kmene [cm]",
         "DBH [cm]",
         "Šířka koruny [m]",
@@ -1748,7 +1806,7 @@ def export_selected_xlsx(request, pk):
         "Obec",
     ]
     overview_widths = [
-        18, 24, 24, 18, 14, 20, 12, 18, 18,
+        18, 24, 24, 18, 14, 30, 20, 12, 18, 18,
         10, 28, 10, 28, 10, 28, 10, 28, 10, 32, 10, 30, 10, 30,
         42, 10, 30, 24, 45, 14, 14, 18, 24, 22,
     ]
@@ -1825,6 +1883,7 @@ def export_selected_xlsx(request, pk):
             if shrub_kind
             else assessment.get("height_m")
         )
+        height_source = None if shrub_kind else assessment.get("height_source_label") or None
         width = (
             shrub_assessment.get("width_m")
             if shrub_kind
@@ -1847,6 +1906,7 @@ def export_selected_xlsx(request, pk):
             snapshot["taxon_czech"],
             assessed_at,
             height,
+            height_source,
             None if shrub_kind else assessment.get("stem_circumference_cm"),
             None if shrub_kind else assessment.get("dbh_cm"),
             width,
@@ -1944,6 +2004,9 @@ def export_selected_xlsx(request, pk):
                 link_cell.style = "Hyperlink"
 
     _add_summary_sheet(wb, export_rows, format_sheet, index=1)
+    # Project totals would not match a partial selection.
+    if export_all_requested:
+        _add_price_totals_sheet(wb, project_price_totals(project), format_sheet, index=2)
     format_sheet(
         overview_ws,
         overview_headers,
@@ -2036,6 +2099,8 @@ def export_selected_xml(request, pk):
             attrs = {}
             if assessment.height_m is not None:
                 attrs["height_m"] = str(assessment.height_m)
+            if assessment.is_height_draft:
+                attrs["height_m_source"] = assessment.height_m_source
             if assessment.crown_width_m is not None:
                 attrs["crown_width_m"] = str(assessment.crown_width_m)
             if assessment.crown_area_m2 is not None:
@@ -2084,155 +2149,185 @@ def export_selected_xml(request, pk):
     return response
 
 
-@login_required
-def export_qgis_geojson(request, pk):
-    project = get_object_or_404(Project, pk=pk)
+GEOJSON_STREAM_CHUNK_SIZE = 2000
+GEOJSON_STREAM_BUFFER_BYTES = 64 * 1024
 
-    if not user_can_view_project(request.user, project.pk):
-        return redirect('work_record_list')
 
-    work_records, redirect_response = _get_export_work_records(request, project)
-    if redirect_response:
-        return redirect_response
+def _geojson_default(value):
+    if isinstance(value, (dt.datetime, date)):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return float(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
 
-    work_records = _build_export_queryset(work_records)
 
-    tree_features = []
-    hedge_features = []
+def _geojson_dumps(value):
+    return json.dumps(value, ensure_ascii=False, default=_geojson_default)
 
-    for record in work_records:
-        assessment = _latest_assessment_for_export(record)
-        shrub_assessment = _latest_shrub_assessment_for_export(record)
 
-        properties = {
-            "work_record_id": record.id,
-            "project_id": record.project_id,
-            "project_name": record.project.name if record.project else None,
-            "title": record.title or None,
-            "external_tree_id": record.external_tree_id or None,
-            "passport_no": record.passport_no,
-            "passport_code": record.passport_code or None,
-            "vegetation_type": record.vegetation_type,
-            "taxon": record.taxon or None,
-            "taxon_czech": record.taxon_czech or None,
-            "taxon_latin": record.taxon_latin or None,
-            "latitude": record.latitude,
-            "longitude": record.longitude,
-            "date": record.date.isoformat() if record.date else None,
-            "created_at": record.created_at.isoformat() if record.created_at else None,
-            "parcel_number": record.parcel_number,
-            "cadastral_area_code": record.cadastral_area_code,
-            "cadastral_area_name": record.cadastral_area_name,
-            "municipality_code": record.municipality_code,
-            "municipality_name": record.municipality_name,
-            "lv_number": record.lv_number,
-            "cad_lookup_status": record.cad_lookup_status,
-            "cad_lookup_at": record.cad_lookup_at.isoformat() if record.cad_lookup_at else None,
-            "intervention_count": getattr(record, "intervention_count", None),
-            "interventions_codes": _interventions_codes(record),
-            "assessment_assessed_at": assessment.assessed_at.isoformat()
-            if assessment and assessment.assessed_at
-            else None,
-            "assessment_dbh_cm": assessment.dbh_cm if assessment else None,
-            "assessment_stem_circumference_cm": assessment.stem_circumference_cm if assessment else None,
-            "assessment_stem_diameters_cm_list": _format_csv_list(assessment.stem_diameters_cm_list)
-            if assessment
-            else "",
-            "assessment_stem_circumferences_cm_list": _format_csv_list(
-                assessment.stem_circumferences_cm_list
-            )
-            if assessment
-            else "",
-            "assessment_height_m": assessment.height_m if assessment else None,
-            "assessment_crown_width_m": assessment.crown_width_m if assessment else None,
-            "assessment_crown_area_m2": assessment.crown_area_m2 if assessment else None,
-            "assessment_physiological_age": assessment.physiological_age if assessment else None,
-            "assessment_vitality": assessment.vitality if assessment else None,
-            "assessment_health_state": assessment.health_state if assessment else None,
-            "assessment_stability": assessment.stability if assessment else None,
-            "assessment_access_obstacle_level": assessment.access_obstacle_level
-            if assessment
-            else None,
-            "assessment_access_obstacle_label": _access_obstacle_text(
-                assessment.access_obstacle_level if assessment else None
-            ),
-            "assessment_access_obstacle_multiplier": _access_obstacle_multiplier(
-                assessment.access_obstacle_level if assessment else None
-            ),
-            "assessment_mistletoe_level_raw": assessment.mistletoe_level if assessment else None,
-            "assessment_mistletoe_label": _mistletoe_text(
-                assessment.mistletoe_level if assessment else None
-            ),
-            "assessment_mistletoe_text": _mistletoe_text(
-                assessment.mistletoe_level if assessment else None
-            ),
-            "assessment_mistletoe_multiplier": _mistletoe_multiplier(
-                assessment.mistletoe_level if assessment else None
-            ),
-            "assessment_combined_multiplier": _access_obstacle_multiplier(
-                assessment.access_obstacle_level if assessment else None
-            )
-            * _mistletoe_multiplier(assessment.mistletoe_level if assessment else None),
-            "assessment_perspective": assessment.perspective if assessment else None,
-            "shrub_assessed_at": shrub_assessment.assessed_at.isoformat()
-            if shrub_assessment and shrub_assessment.assessed_at
-            else None,
-            "shrub_vitality": shrub_assessment.vitality if shrub_assessment else None,
-            "shrub_height_m": shrub_assessment.height_m if shrub_assessment else None,
-            "shrub_width_m": shrub_assessment.width_m if shrub_assessment else None,
-            "shrub_note": shrub_assessment.note if shrub_assessment else "",
-        }
+def _iter_feature_collection(features, trailing_members=None):
+    """
+    Yield a GeoJSON FeatureCollection as UTF-8 chunks without materialising the features.
+    `trailing_members` is an optional callable returning extra top-level members; it is
+    evaluated after the last feature, so project-level summaries can be computed last.
+    """
+    buffer = ['{"type": "FeatureCollection", "features": [']
+    size = len(buffer[0])
+    separator = ""
+    for feature in features:
+        chunk = separator + _geojson_dumps(feature)
+        separator = ", "
+        buffer.append(chunk)
+        size += len(chunk)
+        if size >= GEOJSON_STREAM_BUFFER_BYTES:
+            yield "".join(buffer).encode("utf-8")
+            buffer = []
+            size = 0
+    buffer.append("]")
+    if trailing_members is not None:
+        for key, value in trailing_members().items():
+            buffer.append(f", {_geojson_dumps(key)}: {_geojson_dumps(value)}")
+    buffer.append("}")
+    yield "".join(buffer).encode("utf-8")
+
+
+def _qgis_feature_properties(record, assessment, shrub_assessment):
+    return {
+        "work_record_id": record.id,
+        "project_id": record.project_id,
+        "project_name": record.project.name if record.project else None,
+        "title": record.title or None,
+        "external_tree_id": record.external_tree_id or None,
+        "passport_no": record.passport_no,
+        "passport_code": record.passport_code or None,
+        "vegetation_type": record.vegetation_type,
+        "taxon": record.taxon or None,
+        "taxon_czech": record.taxon_czech or None,
+        "taxon_latin": record.taxon_latin or None,
+        "latitude": record.latitude,
+        "longitude": record.longitude,
+        "date": record.date.isoformat() if record.date else None,
+        "created_at": record.created_at.isoformat() if record.created_at else None,
+        "parcel_number": record.parcel_number,
+        "cadastral_area_code": record.cadastral_area_code,
+        "cadastral_area_name": record.cadastral_area_name,
+        "municipality_code": record.municipality_code,
+        "municipality_name": record.municipality_name,
+        "lv_number": record.lv_number,
+        "cad_lookup_status": record.cad_lookup_status,
+        "cad_lookup_at": record.cad_lookup_at.isoformat() if record.cad_lookup_at else None,
+        "intervention_count": getattr(record, "intervention_count", None),
+        "interventions_codes": _interventions_codes(record),
+        "assessment_assessed_at": assessment.assessed_at.isoformat()
+        if assessment and assessment.assessed_at
+        else None,
+        "assessment_dbh_cm": assessment.dbh_cm if assessment else None,
+        "assessment_stem_circumference_cm": assessment.stem_circumference_cm if assessment else None,
+        "assessment_stem_diameters_cm_list": _format_csv_list(assessment.stem_diameters_cm_list)
+        if assessment
+        else "",
+        "assessment_stem_circumferences_cm_list": _format_csv_list(
+            assessment.stem_circumferences_cm_list
+        )
+        if assessment
+        else "",
+        "assessment_height_m": assessment.height_m if assessment else None,
+        "assessment_height_m_source": assessment.height_m_source or None if assessment else None,
+        "assessment_crown_width_m": assessment.crown_width_m if assessment else None,
+        "assessment_crown_area_m2": assessment.crown_area_m2 if assessment else None,
+        "assessment_physiological_age": assessment.physiological_age if assessment else None,
+        "assessment_vitality": assessment.vitality if assessment else None,
+        "assessment_health_state": assessment.health_state if assessment else None,
+        "assessment_stability": assessment.stability if assessment else None,
+        "assessment_access_obstacle_level": assessment.access_obstacle_level
+        if assessment
+        else None,
+        "assessment_access_obstacle_label": _access_obstacle_text(
+            assessment.access_obstacle_level if assessment else None
+        ),
+        "assessment_access_obstacle_multiplier": _access_obstacle_multiplier(
+            assessment.access_obstacle_level if assessment else None
+        ),
+        "assessment_mistletoe_level_raw": assessment.mistletoe_level if assessment else None,
+        "assessment_mistletoe_label": _mistletoe_text(
+            assessment.mistletoe_level if assessment else None
+        ),
+        "assessment_mistletoe_text": _mistletoe_text(
+            assessment.mistletoe_level if assessment else None
+        ),
+        "assessment_mistletoe_multiplier": _mistletoe_multiplier(
+            assessment.mistletoe_level if assessment else None
+        ),
+        "assessment_combined_multiplier": _access_obstacle_multiplier(
+            assessment.access_obstacle_level if assessment else None
+        )
+        * _mistletoe_multiplier(assessment.mistletoe_level if assessment else None),
+        "assessment_perspective": assessment.perspective if assessment else None,
+        "shrub_assessed_at": shrub_assessment.assessed_at.isoformat()
+        if shrub_assessment and shrub_assessment.assessed_at
+        else None,
+        "shrub_vitality": shrub_assessment.vitality if shrub_assessment else None,
+        "shrub_height_m": shrub_assessment.height_m if shrub_assessment else None,
+        "shrub_width_m": shrub_assessment.width_m if shrub_assessment else None,
+        "shrub_note": shrub_assessment.note if shrub_assessment else "",
+    }
 
-        if record.vegetation_type == WorkRecord.VegetationType.HEDGE:
-            if not record.hedge_line:
-                continue
-            hedge_features.append(
-                {
-                    "type": "Feature",
-                    "geometry": record.hedge_line,
-                    "properties": properties,
-                }
-            )
-            continue
 
-        if record.latitude is None or record.longitude is None:
+def _iter_qgis_features(work_records, hedges):
+    if hedges:
+        work_records = work_records.filter(
+            vegetation_type=WorkRecord.VegetationType.HEDGE,
+            hedge_line__isnull=False,
+        )
+    else:
+        work_records = work_records.exclude(
+            vegetation_type=WorkRecord.VegetationType.HEDGE,
+        ).filter(latitude__isnull=False, longitude__isnull=False)
+
+    for record in work_records.iterator(chunk_size=GEOJSON_STREAM_CHUNK_SIZE):
+        if hedges and not record.hedge_line:
             continue
-        tree_features.append(
-            {
-                "type": "Feature",
-                "geometry": {
-                    "type": "Point",
-                    "coordinates": [record.longitude, record.latitude],
-                },
-                "properties": properties,
-            }
+        properties = _qgis_feature_properties(
+            record,
+            _latest_assessment_for_export(record),
+            _latest_shrub_assessment_for_export(record),
         )
+        if hedges:
+            geometry = record.hedge_line
+        else:
+            geometry = {
+                "type": "Point",
+                "coordinates": [record.longitude, record.latitude],
+            }
+        yield {"type": "Feature", "geometry": geometry, "properties": properties}
 
-    def _json_safe(value):
-        if isinstance(value, dt.datetime):
-            return value.isoformat()
-        if isinstance(value, date):
-            return value.isoformat()
-        if isinstance(value, Decimal):
-            return float(value)
-        if isinstance(value, dict):
-            return {key: _json_safe(val) for key, val in value.items()}
-        if isinstance(value, (list, tuple)):
-            return [_json_safe(item) for item in value]
-        return value
 
-    trees_geojson = _json_safe({"type": "FeatureCollection", "features": tree_features})
-    hedges_geojson = _json_safe({"type": "FeatureCollection", "features": hedge_features})
+@login_required
+def export_qgis_geojson(request, pk):
+    project = get_object_or_404(Project, pk=pk)
+
+    if not user_can_view_project(request.user, project.pk):
+        return redirect('work_record_list')
 
-    output = io.BytesIO()
-    with zipfile.ZipFile(output, mode="w", compression=zipfile.ZIP_DEFLATED) as zf:
-        zf.writestr("trees_points.geojson", json.dumps(trees_geojson, ensure_ascii=False))
-        zf.writestr("hedges_lines.geojson", json.dumps(hedges_geojson, ensure_ascii=False))
+    work_records, redirect_response = _get_export_work_records(request, project)
+    if redirect_response:
+        return redirect_response
+
+    work_records = _build_export_queryset(work_records)
+
+    z = zipstream.ZipFile(mode="w", compression=zipfile.ZIP_DEFLATED)
+    z.write_iter(
+        "trees_points.geojson",
+        _iter_feature_collection(_iter_qgis_features(work_records, hedges=False)),
+    )
+    z.write_iter(
+        "hedges_lines.geojson",
+        _iter_feature_collection(_iter_qgis_features(work_records, hedges=True)),
+    )
 
-    output.seek(0)
     today_str = date.today().strftime("%Y-%m-%d")
     filename = f'{_slugify_export_name(project.name)}_{today_str}_qgis_geojson.zip'
-    response = HttpResponse(output.getvalue(), content_type="application/zip")
+    response = StreamingHttpResponse(z, content_type="application/zip")
     response["Content-Disposition"] = f'attachment; filename="{filename}"'
     return response
 
@@ -2345,22 +2440,20 @@ def _build_map_mapui_context(request):
         .select_related("project")
     )
     records = list(base_records.order_by("-id"))
-    tree_assessment_exists = Exists(TreeAssessment.objects.filter(work_record=OuterRef("pk")))
-    shrub_assessment_exists = Exists(ShrubAssessment.objects.filter(work_record=OuterRef("pk")))
     coords_qs = (
         base_records
         .filter(latitude__isnull=False, longitude__isnull=False)
         .annotate(
-            photo_count=Count("photos", distinct=True),
+            photo_count=Coalesce(F("map_summary__photo_count"), 0),
             has_any_assessment=Case(
                 When(
                     vegetation_type__in=[
                         WorkRecord.VegetationType.SHRUB,
                         WorkRecord.VegetationType.HEDGE,
                     ],
-                    then=shrub_assessment_exists,
+                    then=Coalesce(F("map_summary__has_shrub_assessment"), False),
                 ),
-                default=tree_assessment_exists,
+                default=Coalesce(F("map_summary__has_tree_assessment"), False),
                 output_field=BooleanField(),
             ),
         )
@@ -2426,159 +2519,218 @@ def map_leaflet_test(request):
     return redirect(target)
 
 
-@login_required
-def workrecords_geojson(request):
+def _map_to_float(value):
+    if value is None:
+        return None
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+MAP_FEED_ONLY_FIELDS = (
+    "id",
+    "latitude",
+    "longitude",
+    "external_tree_id",
+    "title",
+    "passport_code",
+    "vegetation_type",
+    "hedge_line",
+)
+
+INTERVENTION_STATUS_ORDER = [
+    value for value, _ in TreeIntervention._meta.get_field("status").choices
+]
+
+
+def _sort_intervention_statuses(statuses):
+    return sorted(
+        statuses,
+        key=lambda value: (
+            INTERVENTION_STATUS_ORDER.index(value)
+            if value in INTERVENTION_STATUS_ORDER
+            else len(INTERVENTION_STATUS_ORDER),
+            value,
+        ),
+    )
+
+
+def _workrecords_map_scope(request):
     """
-    GeoJSON feed with coordinates of WorkRecords (pilot usage for MapLibre map).
+    Base queryset of WorkRecords with coordinates visible on the map for the request.
+    Returns (queryset, error_response).
     """
-    def to_float(value):
-        if value is None:
-            return None
-        try:
-            return float(value)
-        except (TypeError, ValueError):
-            return None
-
     project_param = request.GET.get("project")
     if project_param:
         try:
             project_id = int(project_param)
         except (TypeError, ValueError):
-            return HttpResponseBadRequest("Invalid project parameter")
+            return None, HttpResponseBadRequest("Invalid project parameter")
         project = get_object_or_404(Project, pk=project_id)
         if not user_can_view_project(request.user, project.pk):
-            return JsonResponse({"error": "Forbidden"}, status=403)
+            return None, JsonResponse({"error": "Forbidden"}, status=403)
         qs = project.trees.filter(
             latitude__isnull=False,
             longitude__isnull=False,
-        ).only(
-            "id",
-            "latitude",
-            "longitude",
-            "external_tree_id",
-            "title",
-            "passport_code",
-            "vegetation_type",
-            "hedge_line",
-        )
-    else:
-        # Use the Project.trees M2M as the source of truth; legacy FK can drift.
-        visible_projects = user_projects_qs(request.user)
-        qs = (
-            WorkRecord.objects.filter(
-                Q(projects__in=visible_projects),
-                latitude__isnull=False,
-                longitude__isnull=False,
-            )
-            .distinct()
-            .only(
-                "id",
-                "latitude",
-                "longitude",
-                "external_tree_id",
-                "title",
-                "passport_code",
-                "vegetation_type",
-                "hedge_line",
-            )
-        )
+        ).only(*MAP_FEED_ONLY_FIELDS)
+        return qs, None
 
-    latest_assessment = TreeAssessment.objects.filter(work_record=OuterRef("pk")).order_by(
-        "-assessed_at",
-        "-id",
-    )
-    latest_shrub = ShrubAssessment.objects.filter(work_record=OuterRef("pk")).order_by(
-        "-assessed_at",
-        "-id",
-    )
-    approved_interventions = TreeIntervention.objects.filter(
-        tree=OuterRef("pk"),
-        status="completed",
-    )
-    any_interventions = TreeIntervention.objects.filter(
-        tree=OuterRef("pk"),
+    # Use the Project.trees M2M as the source of truth; legacy FK can drift.
+    visible_projects = user_projects_qs(request.user)
+    qs = (
+        WorkRecord.objects.filter(
+            Q(projects__in=visible_projects),
+            latitude__isnull=False,
+            longitude__isnull=False,
+        )
+        .distinct()
+        .only(*MAP_FEED_ONLY_FIELDS)
     )
-    active_interventions = TreeIntervention.objects.filter(
-        tree=OuterRef("pk"),
-    ).exclude(status="completed")
-    done_interventions = TreeIntervention.objects.filter(
-        tree=OuterRef("pk"),
-        status="done_pending_owner",
+    return qs, None
+
+
+def _annotate_map_fields(qs):
+    """Attach the per-tree map state from TreeMapSummary (see tracker.map_summary)."""
+    return qs.annotate(
+        crown_width_m=F("map_summary__crown_width_m"),
+        mistletoe_level=F("map_summary__mistletoe_level"),
+        access_obstacle_level=F("map_summary__access_obstacle_level"),
+        shrub_width_m=F("map_summary__shrub_width_m"),
+        has_approved_intervention=Coalesce(F("map_summary__has_approved_intervention"), False),
+        has_interventions=Coalesce(F("map_summary__has_interventions"), False),
+        has_active_intervention=Coalesce(F("map_summary__has_active_intervention"), False),
+        has_done_intervention=Coalesce(F("map_summary__has_done_intervention"), False),
+        has_removal_intervention=Coalesce(F("map_summary__has_removal_intervention"), False),
+        intervention_type_codes=F("map_summary__intervention_type_codes"),
+        intervention_status_values=F("map_summary__intervention_statuses"),
     )
-    active_removal_interventions = TreeIntervention.objects.filter(
-        tree=OuterRef("pk"),
-        intervention_type__category__iexact="Kácení",
-    ).exclude(status="completed")
-    qs = qs.annotate(
-        crown_width_m=Subquery(latest_assessment.values("crown_width_m")[:1]),
-        mistletoe_level=Subquery(latest_assessment.values("mistletoe_level")[:1]),
-        access_obstacle_level=Subquery(latest_assessment.values("access_obstacle_level")[:1]),
-        shrub_width_m=Subquery(latest_shrub.values("width_m")[:1]),
-        has_approved_intervention=Exists(approved_interventions),
-        has_interventions=Exists(any_interventions),
-        has_active_intervention=Exists(active_interventions),
-        has_done_intervention=Exists(done_interventions),
-        has_removal_intervention=Exists(active_removal_interventions),
+
+
+def _parse_bbox_param(value):
+    """Parse "min_lon,min_lat,max_lon,max_lat"; returns a normalized tuple or None."""
+    try:
+        min_lon, min_lat, max_lon, max_lat = [float(part) for part in value.split(",")]
+    except (TypeError, ValueError):
+        return None
+    if min_lon > max_lon:
+        min_lon, max_lon = max_lon, min_lon
+    if min_lat > max_lat:
+        min_lat, max_lat = max_lat, min_lat
+    return min_lon, min_lat, max_lon, max_lat
+
+
+def _filter_map_bbox(qs, bbox):
+    """Narrow by indexed grid key ranges first, then by the exact coordinates."""
+    min_lon, min_lat, max_lon, max_lat = bbox
+    return qs.filter(
+        bbox_key_q(bbox),
+        longitude__gte=min_lon,
+        longitude__lte=max_lon,
+        latitude__gte=min_lat,
+        latitude__lte=max_lat,
     )
 
-    project_scope_qs = qs
 
-    # TODO: this pilot endpoint will be replaced by the registry-driven map feed later.
-    bbox_param = request.GET.get("bbox")
-    if bbox_param:
-        try:
-            min_lon, min_lat, max_lon, max_lat = [float(part) for part in bbox_param.split(",")]
-        except (TypeError, ValueError):
-            return JsonResponse({"error": "Invalid bbox parameter"}, status=400)
-        if min_lon > max_lon:
-            min_lon, max_lon = max_lon, min_lon
-        if min_lat > max_lat:
-            min_lat, max_lat = max_lat, min_lat
-        qs = qs.filter(
-            longitude__gte=min_lon,
-            longitude__lte=max_lon,
-            latitude__gte=min_lat,
-            latitude__lte=max_lat,
-        )
+def _map_intervention_stage(wr):
+    if getattr(wr, "has_approved_intervention", False):
+        return "approved"
+    if getattr(wr, "has_done_intervention", False):
+        return "done"
+    return "none"
+
+
+def _map_feature_properties(wr):
+    intervention_types = getattr(wr, "intervention_type_codes", None) or []
+    intervention_statuses = getattr(wr, "intervention_status_values", None) or []
+    access_obstacle_level = getattr(wr, "access_obstacle_level", None)
+    mistletoe_level = getattr(wr, "mistletoe_level", None)
+
+    shrub_width_value = None
+    if wr.vegetation_type == WorkRecord.VegetationType.HEDGE:
+        shrub_width_value = _map_to_float(getattr(wr, "shrub_width_m", None))
+
+    return {
+        "id": wr.id,
+        "label": wr.display_label,
+        "map_label": wr.map_label,
+        "vegetation_type": wr.vegetation_type,
+        "crown_width_m": _map_to_float(getattr(wr, "crown_width_m", None)),
+        "hedge_line": wr.hedge_line,
+        "shrub_width_m": shrub_width_value,
+        "access_obstacle_level": access_obstacle_level,
+        "access_obstacle_label": _access_obstacle_text(access_obstacle_level),
+        "access_obstacle_multiplier": _access_obstacle_multiplier(access_obstacle_level),
+        "mistletoe_level": mistletoe_level,
+        "mistletoe_label": _mistletoe_text(mistletoe_level),
+        "mistletoe_multiplier": _mistletoe_multiplier(mistletoe_level),
+        "combined_multiplier": _access_obstacle_multiplier(access_obstacle_level)
+        * _mistletoe_multiplier(mistletoe_level),
+        "intervention_stage": _map_intervention_stage(wr),
+        "intervention_types": sorted(intervention_types),
+        "intervention_statuses": _sort_intervention_statuses(intervention_statuses),
+        "has_interventions": bool(getattr(wr, "has_interventions", False)),
+        "has_active_intervention": bool(getattr(wr, "has_active_intervention", False)),
+        "has_removal_intervention": bool(getattr(wr, "has_removal_intervention", False)),
+    }
+
+
+def _workrecords_feed_projects(request):
+    """Projects whose trees make up the map feed for this request, or None if not viewable."""
+    project_param = request.GET.get("project")
+    if not project_param:
+        return user_projects_qs(request.user)
+    try:
+        project_id = int(project_param)
+    except (TypeError, ValueError):
+        return None
+    if not user_can_view_project(request.user, project_id):
+        return None
+    return Project.objects.filter(pk=project_id)
+
+
+def _workrecords_feed_state(request):
+    """
+    (etag, last_modified) of the map feed for this request, derived from project revision
+    counters only. Returns (None, None) when the request cannot be answered from cache.
+    """
+    if not hasattr(request, "_workrecords_feed_state"):
+        projects = _workrecords_feed_projects(request)
+        state = map_feed_state(projects) if projects is not None else (None, None)
+        request._workrecords_feed_state = state
+    return request._workrecords_feed_state
+
 
-    records = list(qs)
-    intervention_types_by_tree = defaultdict(set)
-    intervention_statuses_by_tree = defaultdict(set)
+# Facet cache entries are keyed by project revisions, so the timeout only bounds memory.
+WORKRECORDS_FACETS_CACHE_TIMEOUT = 60 * 60
+
+
+def _build_map_project_facets(project_scope_qs):
+    """Project-wide filter facets of the map scope (ignores bbox)."""
     project_intervention_types = set()
-    project_intervention_type_labels = {}
     project_intervention_type_trees = defaultdict(set)
     project_intervention_statuses = set()
     project_intervention_status_trees = defaultdict(set)
-    project_intervention_status_labels = dict(TreeIntervention._meta.get_field("status").choices)
-    project_intervention_status_order = [
-        value for value, _ in TreeIntervention._meta.get_field("status").choices
-    ]
-    interventions_qs = (
-        TreeIntervention.objects.filter(tree_id__in=project_scope_qs.values("id"))
-        .select_related("intervention_type")
-        .values(
-            "tree_id",
-            "intervention_type__code",
-            "intervention_type__name",
-            "status",
-        )
+    project_intervention_status_labels = dict(
+        TreeIntervention._meta.get_field("status").choices
     )
-    for item in interventions_qs:
-        code = (item.get("intervention_type__code") or "").strip()
-        tree_id = item.get("tree_id")
-        status = (item.get("status") or "").strip()
-        if code:
-            intervention_types_by_tree[tree_id].add(code)
+    summary_rows = TreeMapSummary.objects.filter(
+        work_record_id__in=project_scope_qs.values("id")
+    ).values_list("work_record_id", "intervention_type_codes", "intervention_statuses")
+    for tree_id, codes, statuses in summary_rows:
+        for code in codes or ():
             project_intervention_types.add(code)
             project_intervention_type_trees[code].add(tree_id)
-            if code not in project_intervention_type_labels:
-                name = (item.get("intervention_type__name") or "").strip()
-                if name:
-                    project_intervention_type_labels[code] = name
-        if status:
-            intervention_statuses_by_tree[tree_id].add(status)
+        for status in statuses or ():
             project_intervention_statuses.add(status)
             project_intervention_status_trees[status].add(tree_id)
+    project_intervention_type_labels = {
+        code: name.strip()
+        for code, name in InterventionType.objects.filter(
+            code__in=project_intervention_types
+        ).values_list("code", "name")
+        if name and name.strip()
+    }
 
     vegetation_agg = project_scope_qs.aggregate(
         tree_total=Count(
@@ -2598,111 +2750,546 @@ def workrecords_geojson(request):
         WorkRecord.VegetationType.HEDGE: int(vegetation_agg.get("hedge_total") or 0),
     }
 
-    sorted_project_intervention_statuses = sorted(
-        project_intervention_statuses,
-        key=lambda value: (
-            project_intervention_status_order.index(value)
-            if value in project_intervention_status_order
-            else len(project_intervention_status_order),
-            value,
-        ),
+    sorted_project_intervention_statuses = _sort_intervention_statuses(
+        project_intervention_statuses
     )
+    project_intervention_type_counts = {
+        code: len(project_intervention_type_trees.get(code, set()))
+        for code in sorted(project_intervention_types)
+    }
+    project_intervention_status_counts = {
+        status: len(project_intervention_status_trees.get(status, set()))
+        for status in sorted_project_intervention_statuses
+    }
+    project_no_intervention_count = project_scope_qs.filter(has_interventions=False).count()
 
-    features = []
-    for wr in records:
-        label = wr.display_label
-
-        intervention_stage = "none"
-        if getattr(wr, "has_approved_intervention", False):
-            intervention_stage = "approved"
-        elif getattr(wr, "has_done_intervention", False):
-            intervention_stage = "done"
-
-        shrub_width_value = None
-        if wr.vegetation_type == WorkRecord.VegetationType.HEDGE:
-            shrub_width_value = to_float(getattr(wr, "shrub_width_m", None))
-
-        intervention_types = sorted(intervention_types_by_tree.get(wr.id, set()))
-        intervention_statuses = sorted(
-            intervention_statuses_by_tree.get(wr.id, set()),
-            key=lambda value: (
-                project_intervention_status_order.index(value)
-                if value in project_intervention_status_order
-                else len(project_intervention_status_order),
-                value,
-            ),
+    return {
+        "project_intervention_types": sorted(project_intervention_types),
+        "project_intervention_type_labels": project_intervention_type_labels,
+        "project_intervention_type_counts": project_intervention_type_counts,
+        "project_intervention_statuses": sorted_project_intervention_statuses,
+        "project_intervention_status_labels": project_intervention_status_labels,
+        "project_intervention_status_counts": project_intervention_status_counts,
+        "project_vegetation_counts": vegetation_counts,
+        "project_no_intervention_count": project_no_intervention_count,
+    }
+
+
+def _workrecords_project_facets(request, project_scope_qs):
+    """Facets of the map scope, cached per project revisions (the feed ETag)."""
+    etag = _workrecords_feed_state(request)[0].strip('"')
+    cache_key = f"workrecords-facets:{etag}"
+    facets = cache.get(cache_key)
+    if facets is None:
+        facets = _build_map_project_facets(project_scope_qs)
+        cache.set(cache_key, facets, WORKRECORDS_FACETS_CACHE_TIMEOUT)
+    return facets
+
+
+@login_required
+@require_GET
+@condition(
+    etag_func=lambda request, *args, **kwargs: _workrecords_feed_state(request)[0],
+    last_modified_func=lambda request, *args, **kwargs: _workrecords_feed_state(request)[1],
+)
+def workrecords_facets(request):
+    """
+    Project intervention/vegetation facets for the map filters, without any features.
+    Accepts the same `project` filter as workrecords_geojson.
+    """
+    qs, error_response = _workrecords_map_scope(request)
+    if error_response:
+        return error_response
+    facets = _workrecords_project_facets(request, _annotate_map_fields(qs))
+    response = JsonResponse({**facets, "revision": latest_map_change_id()})
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# Compact map feed: one array per property, low-cardinality strings dictionary-encoded.
+MAP_COLUMNAR_FORMAT = "columnar"
+MAP_COLUMNAR_CONTENT_TYPE = "application/vnd.arbomap.columnar+json"
+MAP_COLUMNAR_DICTIONARY_COLUMNS = (
+    "vegetation_type",
+    "access_obstacle_label",
+    "mistletoe_label",
+    "intervention_stage",
+)
+MAP_COLUMNAR_CODE_LIST_COLUMNS = ("intervention_types", "intervention_statuses")
+# Per-column spool size before it rolls over to a temporary file.
+MAP_COLUMNAR_SPOOL_BYTES = 256 * 1024
+
+
+def _wants_columnar_map_feed(request):
+    """`?format=columnar` wins; otherwise the Accept header decides."""
+    format_param = request.GET.get("format")
+    if format_param:
+        return format_param == MAP_COLUMNAR_FORMAT
+    return MAP_COLUMNAR_CONTENT_TYPE in request.headers.get("Accept", "")
+
+
+def _workrecords_feed_etag(request):
+    etag = _workrecords_feed_state(request)[0]
+    if etag and _wants_columnar_map_feed(request):
+        return f'{etag[:-1]}-{MAP_COLUMNAR_FORMAT}"'
+    return etag
+
+
+def _columnar_dumps(value):
+    return json.dumps(value, ensure_ascii=False, separators=(",", ":"), default=_geojson_default)
+
+
+def _iter_map_columnar_payload(features, trailing_members=None):
+    """
+    Yield the columnar form of map point features as UTF-8 chunks. Dictionary columns
+    hold indexes into `dictionaries[column]`, code list columns hold lists of such indexes
+    and boolean flags are sent as 0/1. Each column is encoded into its own spooled
+    temporary file during the single pass over the features and copied out afterwards,
+    so only the dictionaries stay in memory; `trailing_members` works as in
+    `_iter_feature_collection`.
+    """
+    spools = {}
+    dictionaries = {
+        name: {} for name in MAP_COLUMNAR_DICTIONARY_COLUMNS + MAP_COLUMNAR_CODE_LIST_COLUMNS
+    }
+
+    def append(name, value):
+        spool = spools.get(name)
+        if spool is None:
+            spool = spools[name] = tempfile.SpooledTemporaryFile(
+                max_size=MAP_COLUMNAR_SPOOL_BYTES, mode="w+", encoding="utf-8"
+            )
+        else:
+            spool.write(",")
+        spool.write(_columnar_dumps(value))
+
+    def column(name):
+        spool = spools.get(name)
+        if spool is None:
+            return
+        spool.seek(0)
+        while True:
+            chunk = spool.read(GEOJSON_STREAM_BUFFER_BYTES)
+            if not chunk:
+                break
+            yield chunk.encode("utf-8")
+
+    try:
+        count = 0
+        for feature in features:
+            count += 1
+            append("id", feature["id"])
+            lon, lat = feature["geometry"]["coordinates"]
+            append("lon", lon)
+            append("lat", lat)
+            for key, value in feature["properties"].items():
+                if key == "id":
+                    continue
+                lookup = dictionaries.get(key)
+                if key in MAP_COLUMNAR_CODE_LIST_COLUMNS:
+                    value = [lookup.setdefault(item, len(lookup)) for item in value]
+                elif lookup is not None and value is not None:
+                    value = lookup.setdefault(value, len(lookup))
+                elif isinstance(value, bool):
+                    value = int(value)
+                append(("columns", key), value)
+
+        yield (
+            f'{{"format":{_columnar_dumps(MAP_COLUMNAR_FORMAT)},"count":{count}'
+        ).encode("utf-8")
+        for name in ("id", "lon", "lat"):
+            yield f',"{name}":['.encode("utf-8")
+            yield from column(name)
+            yield b"]"
+        separator = ""
+        yield b',"columns":{'
+        for name in spools:
+            if isinstance(name, tuple):
+                yield f"{separator}{_columnar_dumps(name[1])}:[".encode("utf-8")
+                yield from column(name)
+                yield b"]"
+                separator = ","
+        yield b"}"
+        tail = {"dictionaries": {name: list(lookup) for name, lookup in dictionaries.items()}}
+        if trailing_members is not None:
+            tail.update(trailing_members())
+        yield "".join(
+            f",{_columnar_dumps(key)}:{_columnar_dumps(value)}" for key, value in tail.items()
+        ).encode("utf-8")
+        yield b"}"
+    finally:
+        for spool in spools.values():
+            spool.close()
+
+
+@login_required
+@condition(
+    etag_func=lambda request, *args, **kwargs: _workrecords_feed_etag(request),
+    last_modified_func=lambda request, *args, **kwargs: _workrecords_feed_state(request)[1],
+)
+def workrecords_geojson(request):
+    """
+    GeoJSON feed with coordinates of WorkRecords (pilot usage for MapLibre map).
+    Answers If-None-Match / If-Modified-Since with 304 based on project map revisions.
+    Every response carries a `revision` cursor; `?since=<revision>` returns only the
+    features changed after it plus `deleted` tombstones (without the project summary),
+    or 410 with `resync` when the cursor predates the pruned change log.
+    `?zoom=<z>` up to WORKRECORDS_MVT_CLUSTER_MAX_ZOOM returns grid clusters instead of
+    individual trees (ignored together with `since`). Project facets are served from
+    the workrecords_facets cache; `?facets=0` leaves them out for clients that fetch
+    them from that endpoint. `?format=columnar` (or Accept: MAP_COLUMNAR_CONTENT_TYPE)
+    returns tree features as a compact columnar payload; clusters stay GeoJSON.
+    """
+    qs, error_response = _workrecords_map_scope(request)
+    if error_response:
+        return error_response
+    since_param = request.GET.get("since")
+    since = None
+    if since_param:
+        try:
+            since = int(since_param)
+        except (TypeError, ValueError):
+            return JsonResponse({"error": "Invalid since parameter"}, status=400)
+        if since < 0:
+            return JsonResponse({"error": "Invalid since parameter"}, status=400)
+    zoom_param = request.GET.get("zoom")
+    zoom = None
+    if zoom_param:
+        try:
+            zoom = int(zoom_param)
+        except (TypeError, ValueError):
+            return JsonResponse({"error": "Invalid zoom parameter"}, status=400)
+        if not 0 <= zoom <= WORKRECORDS_MVT_MAX_ZOOM:
+            return JsonResponse({"error": "Invalid zoom parameter"}, status=400)
+    clustered = zoom is not None and zoom <= WORKRECORDS_MVT_CLUSTER_MAX_ZOOM and since is None
+    include_facets = request.GET.get("facets") != "0"
+    # Read the cursor before the features so edits made while streaming are re-sent next
+    # time; the delta below is bounded by the same cursor.
+    revision = latest_map_change_id()
+    qs = _annotate_map_fields(qs)
+
+    project_scope_qs = qs
+
+    # TODO: this pilot endpoint will be replaced by the registry-driven map feed later.
+    bbox = None
+    bbox_param = request.GET.get("bbox")
+    if bbox_param:
+        bbox = _parse_bbox_param(bbox_param)
+        if bbox is None:
+            return JsonResponse({"error": "Invalid bbox parameter"}, status=400)
+        qs = _filter_map_bbox(qs, bbox)
+
+    changed_tree_ids = None
+    if since is not None:
+        if since < map_change_horizon():
+            # The change log no longer reaches back to this cursor (prune_map_changes).
+            response = JsonResponse(
+                {"error": "Revision too old, reload the full feed", "resync": True},
+                status=410,
+            )
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        changed_qs = map_changed_tree_ids(
+            _workrecords_feed_projects(request), since, until=revision
         )
-        features.append(
-            {
+        changed_tree_ids = set(changed_qs)
+        qs = qs.filter(pk__in=changed_qs)
+
+    def features():
+        if clustered:
+            cluster_features = _workrecords_cluster_features(request, project_scope_qs, zoom)
+            for feature in cluster_features:
+                if bbox is None or _map_cluster_in_bbox(feature, bbox):
+                    yield feature
+            return
+        for wr in qs.iterator(chunk_size=GEOJSON_STREAM_CHUNK_SIZE):
+            yield {
                 "type": "Feature",
                 "id": wr.id,
                 "geometry": {
                     "type": "Point",
                     "coordinates": [wr.longitude, wr.latitude],
                 },
-                "properties": {
-                    "id": wr.id,
-                    "label": label,
-                    "map_label": wr.map_label,
-                    "vegetation_type": wr.vegetation_type,
-                    "crown_width_m": to_float(getattr(wr, "crown_width_m", None)),
-                    "hedge_line": wr.hedge_line,
-                    "shrub_width_m": shrub_width_value,
-                    "access_obstacle_level": getattr(wr, "access_obstacle_level", None),
-                    "access_obstacle_label": _access_obstacle_text(
-                        getattr(wr, "access_obstacle_level", None)
-                    ),
-                    "access_obstacle_multiplier": _access_obstacle_multiplier(
-                        getattr(wr, "access_obstacle_level", None)
-                    ),
-                    "mistletoe_level": getattr(wr, "mistletoe_level", None),
-                    "mistletoe_label": _mistletoe_text(getattr(wr, "mistletoe_level", None)),
-                    "mistletoe_multiplier": _mistletoe_multiplier(
-                        getattr(wr, "mistletoe_level", None)
-                    ),
-                    "combined_multiplier": _access_obstacle_multiplier(
-                        getattr(wr, "access_obstacle_level", None)
-                    )
-                    * _mistletoe_multiplier(getattr(wr, "mistletoe_level", None)),
-                    "intervention_stage": intervention_stage,
-                    "intervention_types": intervention_types,
-                    "intervention_statuses": intervention_statuses,
-                    "has_interventions": bool(getattr(wr, "has_interventions", False)),
-                    "has_active_intervention": bool(
-                        getattr(wr, "has_active_intervention", False)
-                    ),
-                    "has_removal_intervention": bool(
-                        getattr(wr, "has_removal_intervention", False)
-                    ),
-                },
+                "properties": _map_feature_properties(wr),
             }
+
+    def trailing_members():
+        if changed_tree_ids is not None:
+            # Changed trees that are no longer in the project scope were deleted or left the
+            # project; trees that only fall outside the bbox are still alive.
+            live_tree_ids = set(
+                project_scope_qs.filter(pk__in=changed_tree_ids).values_list("pk", flat=True)
+            )
+            return {
+                "since": since,
+                "revision": revision,
+                "deleted": sorted(changed_tree_ids - live_tree_ids),
+            }
+        members = {"revision": revision}
+        if clustered:
+            members["zoom"] = zoom
+        if include_facets:
+            members = {**_workrecords_project_facets(request, project_scope_qs), **members}
+        return members
+
+    if _wants_columnar_map_feed(request) and not clustered:
+        response = StreamingHttpResponse(
+            _iter_map_columnar_payload(features(), trailing_members=trailing_members),
+            content_type=MAP_COLUMNAR_CONTENT_TYPE,
         )
+    else:
+        # Features are streamed first; the project-level summary block closes the collection.
+        response = StreamingHttpResponse(
+            _iter_feature_collection(features(), trailing_members=trailing_members),
+            content_type="application/json",
+        )
+    patch_cache_control(response, private=True, no_cache=True)
+    patch_vary_headers(response, ["Accept"])
+    return response
 
-    project_intervention_type_counts = {
-        code: len(project_intervention_type_trees.get(code, set()))
-        for code in sorted(project_intervention_types)
-    }
-    project_intervention_status_counts = {
-        status: len(project_intervention_status_trees.get(status, set()))
-        for status in sorted_project_intervention_statuses
-    }
-    project_no_intervention_count = project_scope_qs.filter(has_interventions=False).count()
 
-    return JsonResponse(
-        {
-            "type": "FeatureCollection",
-            "features": features,
-            "project_intervention_types": sorted(project_intervention_types),
-            "project_intervention_type_labels": project_intervention_type_labels,
-            "project_intervention_type_counts": project_intervention_type_counts,
-            "project_intervention_statuses": sorted_project_intervention_statuses,
-            "project_intervention_status_labels": project_intervention_status_labels,
-            "project_intervention_status_counts": project_intervention_status_counts,
-            "project_vegetation_counts": vegetation_counts,
-            "project_no_intervention_count": project_no_intervention_count,
-        },
-        safe=False,
+# Vector tiles: clusters up to WORKRECORDS_MVT_CLUSTER_MAX_ZOOM, light attributes below
+# WORKRECORDS_MVT_DETAIL_ZOOM, full feed properties from there on.
+WORKRECORDS_MVT_LAYER = "workrecords"
+WORKRECORDS_MVT_HEDGE_LAYER = "hedges"
+WORKRECORDS_MVT_BUFFER = 64
+WORKRECORDS_MVT_CLUSTER_MAX_ZOOM = 14
+WORKRECORDS_MVT_CLUSTER_CELL = 256
+WORKRECORDS_MVT_DETAIL_ZOOM = 17
+WORKRECORDS_MVT_MAX_ZOOM = 22
+# Cluster cache entries are keyed by project revisions, so the timeout only bounds memory.
+WORKRECORDS_CLUSTER_CACHE_TIMEOUT = 60 * 60
+WORKRECORDS_MVT_LIGHT_PROPERTIES = (
+    "id",
+    "map_label",
+    "vegetation_type",
+    "crown_width_m",
+    "shrub_width_m",
+    "combined_multiplier",
+    "intervention_stage",
+    "intervention_types",
+    "intervention_statuses",
+    "has_interventions",
+    "has_active_intervention",
+    "has_removal_intervention",
+)
+
+
+def _abbreviate_count(count):
+    if count >= 1000:
+        return f"{round(count / 1000)}k" if count >= 10000 else f"{count / 1000:.1f}k"
+    return str(count)
+
+
+def _map_intervention_stage_from_flags(row):
+    if row.get("has_approved_intervention"):
+        return "approved"
+    if row.get("has_done_intervention"):
+        return "done"
+    return "none"
+
+
+def _map_cluster_properties(rows):
+    """Aggregate properties shared by vector tile and GeoJSON clusters."""
+    count = len(rows)
+    stage_counts = Counter(_map_intervention_stage_from_flags(row) for row in rows)
+    vegetation_counts = Counter(
+        row["vegetation_type"] or WorkRecord.VegetationType.TREE for row in rows
     )
+    lons = [row["longitude"] for row in rows]
+    lats = [row["latitude"] for row in rows]
+    return {
+        "cluster": True,
+        "point_count": count,
+        "point_count_abbreviated": _abbreviate_count(count),
+        "intervention_stage": stage_counts.most_common(1)[0][0],
+        "tree_count": vegetation_counts.get(WorkRecord.VegetationType.TREE, 0),
+        "shrub_count": vegetation_counts.get(WorkRecord.VegetationType.SHRUB, 0),
+        "hedge_count": vegetation_counts.get(WorkRecord.VegetationType.HEDGE, 0),
+        "bbox": f"{min(lons)},{min(lats)},{max(lons)},{max(lats)}",
+    }
+
+
+def _map_cluster_rows(rows, zoom):
+    """
+    Clusters on a world grid, shared by the GeoJSON feed and the vector tiles, so a
+    cluster keeps its identity while panning. Single trees stay plain points.
+    """
+    cells = {}
+    for row in rows:
+        world_x, world_y = mvt.lonlat_to_tile_coords(row["longitude"], row["latitude"], zoom, 0, 0)
+        key = (world_x // WORKRECORDS_MVT_CLUSTER_CELL, world_y // WORKRECORDS_MVT_CLUSTER_CELL)
+        cells.setdefault(key, []).append(row)
+
+    features = []
+    for (cell_x, cell_y), members in sorted(cells.items()):
+        if len(members) == 1:
+            row = members[0]
+            features.append(
+                {
+                    "type": "Feature",
+                    "id": row["id"],
+                    "geometry": {"type": "Point", "coordinates": [row["longitude"], row["latitude"]]},
+                    "properties": {
+                        "id": row["id"],
+                        "vegetation_type": row["vegetation_type"],
+                        "intervention_stage": _map_intervention_stage_from_flags(row),
+                    },
+                }
+            )
+            continue
+        count = len(members)
+        properties = _map_cluster_properties(members)
+        properties["cluster_id"] = f"{zoom}/{cell_x}/{cell_y}"
+        features.append(
+            {
+                "type": "Feature",
+                "geometry": {
+                    "type": "Point",
+                    "coordinates": [
+                        sum(row["longitude"] for row in members) / count,
+                        sum(row["latitude"] for row in members) / count,
+                    ],
+                },
+                "properties": properties,
+            }
+        )
+    return features
+
+
+def _map_cluster_in_bbox(feature, bbox):
+    min_lon, min_lat, max_lon, max_lat = bbox
+    extent = feature["properties"].get("bbox")
+    if extent:
+        west, south, east, north = (float(part) for part in extent.split(","))
+    else:
+        west, south = feature["geometry"]["coordinates"]
+        east, north = west, south
+    return west <= max_lon and east >= min_lon and south <= max_lat and north >= min_lat
+
+
+def _workrecords_cluster_features(request, scope_qs, zoom):
+    """
+    Clusters of the whole map scope at the zoom level, cached per project revisions
+    (the feed ETag), so panning and other users with the same scope reuse them.
+    """
+    etag = _workrecords_feed_state(request)[0].strip('"')
+    cache_key = f"workrecords-clusters:{etag}:{zoom}"
+    features = cache.get(cache_key)
+    if features is None:
+        rows = scope_qs.values(
+            "id",
+            "latitude",
+            "longitude",
+            "vegetation_type",
+            "has_approved_intervention",
+            "has_done_intervention",
+        )
+        features = _map_cluster_rows(rows.iterator(chunk_size=GEOJSON_STREAM_CHUNK_SIZE), zoom)
+        cache.set(cache_key, features, WORKRECORDS_CLUSTER_CACHE_TIMEOUT)
+    return features
+
+
+def _mvt_cluster_features(request, scope_qs, z, x, y, bounds):
+    """
+    The cached world-grid clusters of the GeoJSON feed (_workrecords_cluster_features)
+    whose point falls into the buffered tile, in tile coordinates.
+    """
+    min_lon, min_lat, max_lon, max_lat = bounds
+    features = []
+    for feature in _workrecords_cluster_features(request, scope_qs, z):
+        lon, lat = feature["geometry"]["coordinates"]
+        if not (min_lon <= lon <= max_lon and min_lat <= lat <= max_lat):
+            continue
+        features.append(
+            {
+                "id": feature.get("id"),
+                "type": mvt.GEOM_POINT,
+                "coords": [mvt.lonlat_to_tile_coords(lon, lat, z, x, y)],
+                "properties": feature["properties"],
+            }
+        )
+    return features
+
+
+def _mvt_hedge_coords(hedge_line, z, x, y):
+    if not isinstance(hedge_line, dict) or hedge_line.get("type") != "LineString":
+        return None
+    coords = []
+    for point in hedge_line.get("coordinates") or []:
+        try:
+            lon, lat = float(point[0]), float(point[1])
+        except (TypeError, ValueError, IndexError):
+            continue
+        coords.append(mvt.lonlat_to_tile_coords(lon, lat, z, x, y))
+    return coords if len(coords) >= 2 else None
+
+
+@login_required
+@require_GET
+@condition(
+    etag_func=lambda request, *args, **kwargs: _workrecords_feed_state(request)[0],
+    last_modified_func=lambda request, *args, **kwargs: _workrecords_feed_state(request)[1],
+)
+def workrecords_mvt(request, z, x, y):
+    """
+    Mapbox Vector Tile with WorkRecords for the MapLibre map.
+    Accepts the same `project` filter as workrecords_geojson and answers conditional
+    requests with the feed's project-revision ETag.
+    """
+    if z > WORKRECORDS_MVT_MAX_ZOOM or x >= 2 ** z or y >= 2 ** z:
+        return HttpResponse(status=404)
+
+    qs, error_response = _workrecords_map_scope(request)
+    if error_response:
+        return error_response
+
+    buffer_ratio = WORKRECORDS_MVT_BUFFER / mvt.DEFAULT_EXTENT
+    bounds = mvt.tile_bounds(z, x, y, buffer_ratio=buffer_ratio)
+
+    layers = {WORKRECORDS_MVT_LAYER: [], WORKRECORDS_MVT_HEDGE_LAYER: []}
+    if z <= WORKRECORDS_MVT_CLUSTER_MAX_ZOOM:
+        layers[WORKRECORDS_MVT_LAYER] = _mvt_cluster_features(
+            request, _annotate_map_fields(qs), z, x, y, bounds
+        )
+    else:
+        qs = _filter_map_bbox(qs, bounds)
+        detail = z >= WORKRECORDS_MVT_DETAIL_ZOOM
+        for wr in _annotate_map_fields(qs):
+            properties = _map_feature_properties(wr)
+            properties.pop("hedge_line")
+            if not detail:
+                properties = {key: properties[key] for key in WORKRECORDS_MVT_LIGHT_PROPERTIES}
+            layers[WORKRECORDS_MVT_LAYER].append(
+                {
+                    "id": wr.id,
+                    "type": mvt.GEOM_POINT,
+                    "coords": [mvt.lonlat_to_tile_coords(wr.longitude, wr.latitude, z, x, y)],
+                    "properties": properties,
+                }
+            )
+            if wr.vegetation_type == WorkRecord.VegetationType.HEDGE:
+                hedge_coords = _mvt_hedge_coords(wr.hedge_line, z, x, y)
+                if hedge_coords:
+                    layers[WORKRECORDS_MVT_HEDGE_LAYER].append(
+                        {
+                            "id": wr.id,
+                            "type": mvt.GEOM_LINESTRING,
+                            "coords": hedge_coords,
+                            "properties": {
+                                "id": wr.id,
+                                "shrub_width_m": properties.get("shrub_width_m"),
+                            },
+                        }
+                    )
+
+    tile = mvt.encode_tile(layers)
+    if not tile:
+        return HttpResponse(status=204)
+    response = HttpResponse(tile, content_type="application/vnd.mapbox-vector-tile")
+    # Revalidated on every use; unchanged tiles come back as 304 via the ETag.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @login_required
@@ -2778,6 +3365,11 @@ def project_tree_add(request, project_pk, workrecord_pk):
     if not user_is_foreman(request.user, project.pk):
         return JsonResponse({"ok": False, "error": "forbidden"}, status=403)
     work_record = get_object_or_404(WorkRecord, pk=workrecord_pk)
+    try:
+        # Checked up front: the same check in the m2m signal would abort the transaction.
+        check_tree_link_price_lists([project.pk], [work_record.pk])
+    except ValidationError as exc:
+        return JsonResponse({"ok": False, "error": " ".join(exc.messages)}, status=400)
     project.trees.add(work_record)
     if work_record.project_id is None:
         work_record.project = project
@@ -2916,8 +3508,11 @@ def workrecord_height_estimate_api(request, pk):
     except (TypeError, ValueError):
         return JsonResponse({"ok": False, "error": "WorkRecord má neplatné souřadnice."}, status=400)
 
+    # Single-pixel identify by default; ?method=crown opts in to crown-aware grid sampling.
+    method = "crown" if request.GET.get("method") == "crown" else "point"
+    estimate = estimate_tree_height_from_cuzk if method == "point" else estimate_crown_height_from_cuzk
     try:
-        result = estimate_tree_height_from_cuzk(lat=lat, lon=lon)
+        result = cached_tree_height_estimate(work_record, method, estimate)
     except CuzkHeightError as exc:
         logger.warning(
             "cuzk height estimate failed record_id=%s lat=%s lon=%s error=%s",
@@ -2938,9 +3533,10 @@ def workrecord_height_estimate_api(request, pk):
         return JsonResponse({"ok": False, "error": "Odhad výšky se nepodařilo spočítat."}, status=502)
 
     logger.info(
-        "cuzk height estimate record_id=%s lat=%s lon=%s transform_method=%s sjtsk_x=%s sjtsk_y=%s "
-        "dmr_m=%s dmp_m=%s estimated_height_m=%s duration_ms=%s",
+        "cuzk height estimate record_id=%s method=%s lat=%s lon=%s transform_method=%s "
+        "sjtsk_x=%s sjtsk_y=%s dmr_m=%s dmp_m=%s estimated_height_m=%s duration_ms=%s breakdown=%s",
         work_record.pk,
+        method,
         lat,
         lon,
         result["transform_method"],
@@ -2950,14 +3546,19 @@ def workrecord_height_estimate_api(request, pk):
         result["dmp_m"],
         result["estimated_height_m"],
         result["duration_ms"],
+        result["duration_ms_breakdown"],
     )
 
     response = {
         "ok": True,
+        "method": method,
         "dmr_m": result["dmr_m"],
         "dmp_m": result["dmp_m"],
         "estimated_height_m": result["estimated_height_m"],
         "duration_ms": result["duration_ms"],
+        "duration_ms_breakdown": result["duration_ms_breakdown"],
+        "cached": result["cached"],
+        "estimated_at": result["estimated_at"],
         "source": result["source"],
         "transform_method": result["transform_method"],
     }
@@ -3056,9 +3657,12 @@ def workrecord_set_location(request, pk):
     if lat is None or lon is None:
         return JsonResponse({"error": "Invalid coordinates"}, status=400)
 
+    moved = (work_record.latitude, work_record.longitude) != (lat, lon)
     work_record.latitude = lat
     work_record.longitude = lon
     work_record.save(update_fields=["latitude", "longitude"])
+    if moved:
+        invalidate_tree_height_estimates(work_record.pk)
     return JsonResponse({"id": work_record.pk, "latitude": lat, "longitude": lon})
 
 
@@ -3301,6 +3905,8 @@ def workrecord_assessment_api(request, pk):
             "stem_diameters_cm_list": assessment.stem_diameters_cm_list if assessment else "",
             "stem_circumferences_cm_list": assessment.stem_circumferences_cm_list if assessment else "",
             "height_m": assessment.height_m if assessment else None,
+            "height_m_source": assessment.height_m_source if assessment else "",
+            "height_m_is_draft": assessment.is_height_draft if assessment else False,
             "crown_width_m": str(assessment.crown_width_m) if assessment and assessment.crown_width_m is not None else None,
             "crown_area_m2": str(assessment.crown_area_m2) if assessment and assessment.crown_area_m2 is not None else None,
             "physiological_age": assessment.physiological_age if assessment else None,
@@ -3404,6 +4010,11 @@ def workrecord_assessment_api(request, pk):
     stem_diameters_cm_list = parse_cm_list(payload.get("stem_diameters_cm_list"))
     stem_circumferences_cm_list = parse_cm_list(payload.get("stem_circumferences_cm_list"))
     height_m = parse_float(payload.get("height_m"))
+    # Clients send the source back only for an estimated height nobody has confirmed;
+    # without it the height is stored as measured.
+    height_m_source = str(payload.get("height_m_source") or "").strip()[:64]
+    if height_m is None:
+        height_m_source = ""
     crown_width_m = parse_decimal(payload.get("crown_width_m"))
     physiological_age = parse_int(payload.get("physiological_age"), 1, 5)
     vitality = parse_int(payload.get("vitality"), 1, 5)
@@ -3446,6 +4057,7 @@ def workrecord_assessment_api(request, pk):
         stem_diameters_cm_list=",".join(str(val) for val in norm_diameters),
         stem_circumferences_cm_list=",".join(str(val) for val in norm_circumferences),
         height_m=height_m,
+        height_m_source=height_m_source,
         crown_width_m=crown_width_m,
         physiological_age=physiological_age,
         vitality=vitality,
@@ -3465,6 +4077,8 @@ def workrecord_assessment_api(request, pk):
         "stem_diameters_cm_list": assessment.stem_diameters_cm_list,
         "stem_circumferences_cm_list": assessment.stem_circumferences_cm_list,
         "height_m": assessment.height_m,
+        "height_m_source": assessment.height_m_source,
+        "height_m_is_draft": assessment.is_height_draft,
         "crown_width_m": str(assessment.crown_width_m) if assessment.crown_width_m is not None else None,
         "crown_area_m2": str(assessment.crown_area_m2) if assessment.crown_area_m2 is not None else None,
         "physiological_age": assessment.physiological_age,